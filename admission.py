@@ -0,0 +1,231 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""推理准入控制與優先級排程：限制同時執行的推理數，等待佇列有上限，滿了就拒絕（HTTP 429）
+
+等待中的請求按優先級分佇列（interactive / bulk / background），空出名額時以
+stride 排程（加權公平分享）挑選下一個佇列；另可保留名額只給互動式請求。
+同一佇列內預設以最短工作優先（估計成本 + 等待時間老化），並優先延續上一個
+相同形狀（image_size, max_tokens）的工作，減少小工作被 Gundam 等大工作阻塞。
+名額以單次推理（一頁 / 一幀 / 一個切塊）為單位取得，批次工作在頁與頁之間
+自然讓出名額，互動式請求最多只需等待一頁推理完成。
+"""
+
+import math
+import threading
+import time
+
+DEFAULT_WEIGHTS = {'interactive': 8, 'bulk': 2, 'background': 1}
+INTERACTIVE = 'interactive'
+ORDERINGS = ('fifo', 'sjf')
+
+
+class AdmissionRejected(Exception):
+    """佇列已滿或等待逾時；retry_after 為建議的重試秒數"""
+
+    def __init__(self, message, priority, retry_after, queue_position, queue_length):
+        super().__init__(message)
+        self.priority = priority
+        self.retry_after = retry_after
+        self.queue_position = queue_position
+        self.queue_length = queue_length
+
+    def to_dict(self):
+        return {
+            'error': str(self),
+            'priority': self.priority,
+            'retry_after': self.retry_after,
+            'queue_position': self.queue_position,
+            'queue_length': self.queue_length
+        }
+
+
+class _Ticket:
+    __slots__ = ('priority', 'cost', 'bucket', 'granted', 'enqueued_at', 'granted_at')
+
+    def __init__(self, priority, cost=1.0, bucket=None, enqueued_at=None):
+        self.priority = priority
+        self.cost = cost
+        self.bucket = bucket
+        self.granted = False
+        self.enqueued_at = time.monotonic() if enqueued_at is None else enqueued_at
+        self.granted_at = None
+
+
+def select_ticket(tickets, now, ordering='sjf', aging_rate=10.0, last_bucket=None, bucket_affinity=0.0):
+    """從同一佇列的等待者中挑出下一個，返回索引
+
+    fifo：先到先服務
+    sjf：有效成本 = cost - aging_rate × 已等待秒數，相同形狀（last_bucket）再減 bucket_affinity；
+         取最小者，同值時先到先服務。老化保證大工作最終會被執行。
+    """
+    if ordering == 'fifo' or len(tickets) == 1:
+        return 0
+
+    def effective_cost(i):
+        ticket = tickets[i]
+        cost = ticket.cost - aging_rate * (now - ticket.enqueued_at)
+        if last_bucket is not None and ticket.bucket == last_bucket:
+            cost -= bucket_affinity
+        return cost, ticket.enqueued_at
+
+    return min(range(len(tickets)), key=effective_cost)
+
+
+class AdmissionController:
+    """max_concurrent 個推理名額；每個優先級最多 max_queue 個等待者
+
+    weights：各優先級分得名額的比例（都在等待時 interactive:bulk:background = 8:2:1）
+    reserved_interactive：只保留給 interactive 的名額數，批次工作無法佔滿全部名額
+    """
+
+    def __init__(self, max_concurrent=2, max_queue=8, weights=None, queue_timeout=300.0, reserved_interactive=0,
+                 ordering='sjf', aging_rate=10.0, bucket_affinity=256.0):
+        if max_concurrent < 1:
+            raise ValueError('max_concurrent must be >= 1')
+        if not 0 <= reserved_interactive < max_concurrent:
+            raise ValueError('reserved_interactive must be between 0 and max_concurrent - 1')
+        if ordering not in ORDERINGS:
+            raise ValueError(f'Unknown ordering: {ordering}')
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.queue_timeout = queue_timeout
+        self.reserved_interactive = reserved_interactive if INTERACTIVE in self.weights else 0
+        self.ordering = ordering
+        self.aging_rate = aging_rate
+        self.bucket_affinity = bucket_affinity
+        self._cond = threading.Condition()
+        self._active = 0
+        self._active_batch = 0      # 非 interactive 佔用的名額
+        self._queues = {priority: [] for priority in self.weights}
+        self._last_bucket = {priority: None for priority in self.weights}
+        # stride 排程：每次取得名額時 pass += 1 / weight，總是挑 pass 最小的佇列
+        self._pass = {priority: 0.0 for priority in self.weights}
+        self._vtime = 0.0
+        self._avg_hold = None
+        self.rejected = {priority: 0 for priority in self.weights}
+        self.granted = {priority: 0 for priority in self.weights}
+
+    # ---------------------------------------------------------------- 名額
+
+    def acquire(self, priority, cost=1.0, bucket=None):
+        """取得一個推理名額（可能阻塞等待），返回 ticket 供 release 使用
+
+        cost：估計成本（排序用，單位任意但須一致）；bucket：形狀鍵，例如 (image_size, max_tokens)
+        """
+        if priority not in self._queues:
+            raise ValueError(f'Unknown priority: {priority}')
+        ticket = _Ticket(priority, cost, bucket)
+        with self._cond:
+            if self._has_capacity(priority) and not self._waiting():
+                self._grant(ticket)
+                return ticket
+
+            queue = self._queues[priority]
+            if len(queue) >= self.max_queue:
+                self.rejected[priority] += 1
+                raise AdmissionRejected(
+                    'Server busy: inference queue is full', priority,
+                    self._retry_after(len(queue) + 1), len(queue) + 1, len(queue)
+                )
+
+            if not queue:
+                # 閒置的佇列不累積額度，重新加入時從目前的虛擬時間開始
+                self._pass[priority] = max(self._pass[priority], self._vtime)
+            queue.append(ticket)
+            # 其他佇列的等待者可能因保留名額而無法取得，此時本請求可直接取得
+            self._dispatch()
+            deadline = ticket.enqueued_at + self.queue_timeout
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    position = queue.index(ticket) + 1
+                    queue.remove(ticket)
+                    self.rejected[priority] += 1
+                    # 排在後面的等待者可能因此可以取得名額
+                    self._dispatch()
+                    raise AdmissionRejected(
+                        'Server busy: timed out waiting for an inference slot', priority,
+                        self._retry_after(position), position, len(queue)
+                    )
+                self._cond.wait(remaining)
+        return ticket
+
+    def release(self, ticket):
+        with self._cond:
+            held = time.monotonic() - ticket.granted_at
+            self._avg_hold = held if self._avg_hold is None else 0.8 * self._avg_hold + 0.2 * held
+            self._active -= 1
+            if ticket.priority != INTERACTIVE:
+                self._active_batch -= 1
+            self._dispatch()
+
+    # ---------------------------------------------------------------- 排程
+
+    def _waiting(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _has_capacity(self, priority):
+        if self._active >= self.max_concurrent:
+            return False
+        return priority == INTERACTIVE or self._active_batch < self.max_concurrent - self.reserved_interactive
+
+    def _grant(self, ticket):
+        ticket.granted = True
+        ticket.granted_at = time.monotonic()
+        self._active += 1
+        if ticket.priority != INTERACTIVE:
+            self._active_batch += 1
+        self.granted[ticket.priority] += 1
+
+    def _next_priority(self):
+        """有等待者且有可用名額的佇列中 pass 最小者（同值時按 weights 順序）"""
+        candidates = [p for p, queue in self._queues.items() if queue and self._has_capacity(p)]
+        if not candidates:
+            return None
+        priority = min(candidates, key=lambda p: self._pass[p])
+        self._vtime = self._pass[priority]
+        self._pass[priority] += 1.0 / self.weights[priority]
+        return priority
+
+    def _dispatch(self):
+        granted = False
+        while True:
+            priority = self._next_priority()
+            if priority is None:
+                break
+            queue = self._queues[priority]
+            index = select_ticket(
+                queue, time.monotonic(), self.ordering, self.aging_rate,
+                self._last_bucket[priority], self.bucket_affinity
+            )
+            ticket = queue.pop(index)
+            self._last_bucket[priority] = ticket.bucket
+            self._grant(ticket)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _retry_after(self, position):
+        avg_hold = self._avg_hold if self._avg_hold is not None else 10.0
+        return max(1, math.ceil(avg_hold * position / self.max_concurrent))
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'active': self._active,
+                'max_queue': self.max_queue,
+                'reserved_interactive': self.reserved_interactive,
+                'weights': dict(self.weights),
+                'ordering': self.ordering,
+                'waiting': {priority: len(queue) for priority, queue in self._queues.items()},
+                'rejected': dict(self.rejected),
+                'granted': dict(self.granted),
+                'avg_inference_seconds': round(self._avg_hold, 3) if self._avg_hold is not None else None
+            }
@@ -13,42 +13,169 @@ import traceback
 import atexit
 import tempfile
 import uuid
-import fitz
 import sys
 import time
+import hashlib
 from pathlib import Path
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, render_template, send_file
+from datetime import datetime
+from flask import Flask, request, jsonify, render_template, send_file, Response, has_request_context, g, stream_with_context
 from werkzeug.utils import secure_filename
 from PIL import Image
 import threading
 import io
 import base64
 import multiprocessing
-import queue
-import cv2
 import numpy as np
 import zipfile
 import shutil
+import json
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
-import mlx.core as mx
-from mlx_vlm import load, generate
+# OpenCV / PyMuPDF 只在需要的函數內匯入，mlx 只在 ocr_worker 進程內匯入，
+# 讓伺服器快速啟動並立即回應 /api/status
+
+from task_store import TaskStore, TaskTable
+import metrics
+import tracing
+from admission import AdmissionRejected
+from worker_pool import WorkerCrashed
+from pipeline import Pipeline, Done
+import frame_store
+import layout
+import transcript
+import video_roi
+import video_decoder
+# 推理設定常數另由 ocr_cli / bench 經 app 取用
+from inference_server import (
+    InferenceClient, authkey_from_env, create_inference_service, parse_address,
+    MAX_CONCURRENT_INFERENCES, INFERENCE_QUEUE_TIMEOUT, QUEUE_AGING_RATE, QUEUE_BUCKET_AFFINITY, OCR_DRAIN_TIMEOUT
+)
 
 os.environ["HF_HOME"] = str(Path.home() / "hf_cache")
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 512 * 1024 * 1024  # 512MB limit for video uploads
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf'}
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'pdf'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
 
-model_loaded_status = multiprocessing.Value('b', False)
-pdf_tasks = {}
-preprocess_tasks = {}
-video_tasks = {}
-
 UPLOAD_FOLDER = tempfile.gettempdir()
 Path(UPLOAD_FOLDER).mkdir(exist_ok=True)
 
+# 任務狀態保存在 SQLite（WAL），重啟後仍在，並可由多個 worker 進程共用
+TASK_DB_PATH = os.environ.get('OCR_TASK_DB', str(Path(UPLOAD_FOLDER) / 'mlx_ocr_tasks.sqlite3'))
+TASK_TTL_MINUTES = 30          # 任務閒置超過此時間後由 janitor 清理
+TASK_JANITOR_INTERVAL = 300    # janitor 執行間隔（秒）
+
+task_store = TaskStore(TASK_DB_PATH)
+pdf_tasks = TaskTable(task_store, 'pdf')
+preprocess_tasks = TaskTable(task_store, 'preprocess')
+video_tasks = TaskTable(task_store, 'video')
+
+# ==============================================================================
+# 指標（/metrics）
+# ==============================================================================
+
+STAGE_LABELS = ('stage', 'endpoint', 'complexity')
+
+OCR_STAGE_SECONDS = metrics.Histogram(
+    'ocr_stage_seconds',
+    'Latency of OCR pipeline stages (upload, rasterize, preprocess, serialize, admission_wait, queue_wait, model_load, warmup, inference, response_encode)',
+    STAGE_LABELS
+)
+OCR_TIMEOUTS = metrics.Counter('ocr_timeouts_total', 'OCR inferences killed after exceeding the timeout', ('endpoint', 'complexity'))
+OCR_RETRIES = metrics.Counter('ocr_generate_retries_total', 'generate() retries inside the OCR worker', ('endpoint', 'complexity'))
+OCR_SUBPROCESS_CRASHES = metrics.Counter('ocr_subprocess_crashes_total', 'OCR workers that exited abnormally while processing a job', ('endpoint', 'complexity'))
+
+# gunicorn 的每個 HTTP worker 各有一份 registry；設定 OCR_METRICS_DIR（gunicorn.conf.py 自動建立）時
+# 各自定期寫入共用目錄，任何一個 worker 的 /metrics 都返回全部 HTTP worker 的合計
+METRICS_DIR = os.environ.get('OCR_METRICS_DIR')
+metrics_collector = metrics.MultiprocessCollector(METRICS_DIR) if METRICS_DIR else None
+
+def metric_labels(complexity='none'):
+    """目前請求的指標標籤（endpoint, complexity）"""
+    endpoint = request.endpoint if has_request_context() and request.endpoint else 'background'
+    return {'endpoint': endpoint, 'complexity': complexity}
+
+@contextmanager
+def observe_stage(stage, labels):
+    """計時一個管線階段並記錄追蹤 span：with observe_stage('rasterize', labels): ..."""
+    with tracing.span(stage, **labels), OCR_STAGE_SECONDS.time(stage=stage, **labels):
+        yield
+
+def encode_response(payload, labels):
+    """序列化 JSON 回應並記錄 response_encode 階段耗時"""
+    with observe_stage('response_encode', labels):
+        return jsonify(payload)
+
+# ==============================================================================
+# 推理准入控制與優先級排程（同時推理數上限 + 有界等待佇列）
+# ==============================================================================
+
+# 名額、佇列與排序的設定在 inference_server.py（獨立的 inference server 使用相同設定）
+
+# 優先級：單張圖片 OCR 為 interactive；PDF / 影片批次為 bulk；
+# 重新處理已完成頁面（force）與請求以外的工作為 background
+INTERACTIVE_ENDPOINTS = {'ocr'}
+BATCH_PRIORITIES = ('bulk', 'background')
+
+def estimate_inference_cost(image_size, max_tokens):
+    """估計推理成本（token 當量）：輸出 token 上限 + 視覺 token（約每 64×64 像素一個）"""
+    return max_tokens + image_size[0] * image_size[1] / 4096
+
+OCR_ADMISSION_REJECTED = metrics.Counter('ocr_admission_rejected_total', 'Inference requests rejected because the queue was full or the wait timed out', ('priority',))
+
+# 請求指定的優先級；切塊推理的執行緒以 copy_context 繼承
+_priority_override = contextvars.ContextVar('inference_priority', default=None)
+
+@app.before_request
+def reset_inference_priority():
+    _priority_override.set(None)
+
+def set_inference_priority(priority):
+    _priority_override.set(priority)
+
+def inference_priority(labels):
+    override = _priority_override.get()
+    if override:
+        return override
+    if labels['endpoint'] in INTERACTIVE_ENDPOINTS:
+        return 'interactive'
+    return 'background' if labels['endpoint'] == 'background' else 'bulk'
+
+@app.errorhandler(AdmissionRejected)
+def handle_admission_rejected(e):
+    OCR_ADMISSION_REJECTED.inc(priority=e.priority)
+    print(f"🚦 Admission rejected ({e.priority}): {e}, retry after {e.retry_after}s")
+    response = jsonify(e.to_dict())
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+# ==============================================================================
+# 追蹤（OCR_TRACE_FILE 設定時，每個請求一條 trace）
+# ==============================================================================
+
+@app.before_request
+def start_request_trace():
+    if tracing.enabled() and request.endpoint not in (None, 'static', 'metrics_endpoint', 'health_check', 'liveness_check'):
+        g.trace_span = tracing.start_span(f'{request.method} {request.path}', endpoint=request.endpoint)
+
+@app.after_request
+def add_trace_header(response):
+    trace_span = g.get('trace_span')
+    if trace_span is not None:
+        response.headers['X-Trace-Id'] = trace_span[1]['trace_id']
+        trace_span[1]['attrs']['status'] = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_trace(error=None):
+    trace_span = g.pop('trace_span', None)
+    if trace_span is not None:
+        tracing.finish_span(trace_span, error)
+
 # ==============================================================================
 # 9 分類 × 5 Complexity 的前處理配置
 # ==============================================================================
@@ -144,7 +271,8 @@ prompts = {
     'basic': '<image>\nExtract all text from the image. Keep original Traditional Chinese and formatting.',
     'table': '<image>\nConvert this table to clean Markdown format.',
     'markdown': '<image>\nConvert this document page to clean Markdown format.',
-    'formula': '<image>\nExtract all mathematical formulas using LaTeX format.'
+    'formula': '<image>\nExtract all mathematical formulas using LaTeX format.',
+    'grounding': '<image>\n<|grounding|>Convert the document to markdown.'
 }
 
 # ==============================================================================
@@ -153,6 +281,7 @@ prompts = {
 
 def remove_background_pil(image):
     """使用 rembg 去除背景"""
+    import cv2
     try:
         from rembg import remove
         result = remove(image)
@@ -174,6 +303,7 @@ def remove_background_pil(image):
 
 def auto_rotate_image(image):
     """自動旋轉圖像"""
+    import cv2
     try:
         img_array = np.array(image)
         gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
@@ -202,6 +332,7 @@ def auto_rotate_image(image):
 
 def enhance_image(image):
     """圖像增強處理"""
+    import cv2
     img_array = np.array(image)
     
     # 對比度增強
@@ -220,6 +351,7 @@ def enhance_image(image):
 
 def remove_shadows(image):
     """去除陰影"""
+    import cv2
     img_array = np.array(image)
     rgb_planes = cv2.split(img_array)
     
@@ -235,6 +367,7 @@ def remove_shadows(image):
 
 def binarize_image(image):
     """二值化處理"""
+    import cv2
     img_array = np.array(image.convert('L'))
     _, binary = cv2.threshold(img_array, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
     return Image.fromarray(binary, 'L')
@@ -336,279 +469,297 @@ def preprocess_single_image(image, settings):
 # 影片截圖功能
 # ==============================================================================
 
-def extract_frames_from_video(video_path, output_dir, method='fixed_count', interval=5, total_frames=1000, sensitivity=0.5):
-    """從影片提取幀"""
-    os.makedirs(output_dir, exist_ok=True)
-    
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise Exception("無法開啟影片檔案")
-    
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_video_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = total_video_frames / fps if fps > 0 else 0
-    
-    print(f"📹 影片資訊: {total_video_frames} 幀, {fps:.2f} FPS, {duration:.2f} 秒")
-    
-    frames = []
-    
-    if method == 'fixed_interval':
-        # 固定間隔（每秒N張）
-        frame_interval = max(1, int(fps / interval))
-        if frame_interval == 0:
-            frame_interval = 1
-        
-        for frame_idx in range(0, total_video_frames, frame_interval):
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            if ret:
-                frame_path = os.path.join(output_dir, f"frame_{len(frames):06d}.jpg")
-                cv2.imwrite(frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-                frames.append(frame_path)
-            
-            if len(frames) >= total_frames:
-                break
-    
-    elif method == 'fixed_count':
-        # 固定數量
-        frame_interval = max(1, total_video_frames // total_frames)
-        
-        for frame_idx in range(0, total_video_frames, frame_interval):
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            if ret:
-                frame_path = os.path.join(output_dir, f"frame_{len(frames):06d}.jpg")
-                cv2.imwrite(frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-                frames.append(frame_path)
-            
-            if len(frames) >= total_frames:
-                break
-    
-    elif method == 'scene_change':
-        # 場景變化檢測（簡化版）
-        prev_frame = None
-        # 將 sensitivity (0.1-1.0) 轉換為閾值：sensitivity越高，閾值越低，檢測更多變化
-        # sensitivity=0.1(低) → threshold≈0.73, sensitivity=1.0(高) → threshold≈0.40
-        # 閾值範圍：0.4~0.75（大幅提高範圍，增強鑑別度，每秒不超過5張）
-        scene_change_threshold = (1.0 - sensitivity) * 0.35 + 0.4
-        print(f"🎬 場景變化檢測：敏感度={sensitivity:.2f}, 閾值={scene_change_threshold:.3f}")
-        
-        for frame_idx in range(total_video_frames):
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            if prev_frame is not None:
-                # 計算幀間差異
-                diff = cv2.absdiff(prev_frame, frame)
-                non_zero_count = np.count_nonzero(diff)
-                total_pixels = diff.shape[0] * diff.shape[1] * diff.shape[2]
-                change_ratio = non_zero_count / total_pixels
-                
-                if change_ratio > scene_change_threshold:
-                    frame_path = os.path.join(output_dir, f"frame_{len(frames):06d}.jpg")
-                    cv2.imwrite(frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-                    frames.append(frame_path)
-            
-            prev_frame = frame.copy()
-            
-            if len(frames) >= total_frames:
-                break
+# 影片解碼（video_decoder.py）：背景執行緒解碼並預取，截圖在執行緒池中編碼，長影片分段在多個進程中並行解碼
+VIDEO_DECODE_CONFIG = {
+    'prefetch_depth': int(os.environ.get('OCR_VIDEO_PREFETCH', 8)),          # 解碼執行緒最多領先的幀數（0 為依序解碼）
+    'encode_workers': int(os.environ.get('OCR_VIDEO_ENCODE_WORKERS', 2)),    # 截圖編碼執行緒數（0 為依序編碼）
+    'processes': int(os.environ.get('OCR_VIDEO_DECODE_PROCESSES', min(4, os.cpu_count() or 1))),  # 分段並行的進程數
+    'segment_seconds': float(os.environ.get('OCR_VIDEO_SEGMENT_SECONDS', 600))  # 影片長於此秒數才分段並行解碼
+}
+
+# 截圖儲存（frame_store.py）：files 每張一個檔案；pack 截圖與縮圖寫入單一容器檔，減少小檔案數量
+VIDEO_FRAME_STORE_CONFIG = {
+    'storage': os.environ.get('OCR_VIDEO_FRAME_STORAGE', 'files'),        # files / pack
+    'image_format': os.environ.get('OCR_VIDEO_FRAME_FORMAT', 'jpeg'),     # jpeg / webp
+    'quality': int(os.environ.get('OCR_VIDEO_FRAME_QUALITY', 95))         # 1–100
+}
+
+def iter_video_frames(video_path, method='fixed_count', interval=5, total_frames=1000, sensitivity=0.5, regions=None):
+    """依截圖方式逐一產生 (幀編號, 時間戳毫秒, BGR 幀)，不寫入磁碟
     
-    cap.release()
+    regions 為文字區域（畫面比例），解碼後立即裁切；場景變化偵測也只比較區域內的變化
+    """
+    return video_decoder.iter_frames(video_path, method, interval, total_frames, sensitivity, regions)
+
+def extract_frames_from_video(video_path, output_dir, method='fixed_count', interval=5, total_frames=1000, sensitivity=0.5, regions=None):
+    """從影片提取幀（指定 regions 時只保存文字區域），返回 [{'path', 'frame_index', 'timestamp'（秒）}]"""
+    frames = video_decoder.extract_frames(
+        video_path, output_dir, method=method, interval=interval, total_frames=total_frames,
+        sensitivity=sensitivity, regions=regions, **VIDEO_DECODE_CONFIG, **VIDEO_FRAME_STORE_CONFIG
+    )
     print(f"✅ 提取完成: {len(frames)} 張幀")
     return frames
 
+def detect_video_roi(video_path):
+    """均勻取樣數幀，自動偵測固定位置的文字區域"""
+    samples = iter_video_frames(video_path, method='fixed_count', total_frames=video_roi.ROI_CONFIG['samples'])
+    regions = video_roi.detect_text_regions(frame for _, _, frame in samples)
+    print(f"🔲 ROI 自動偵測: {len(regions)} 個文字區域 {regions}")
+    return regions
+
+def parse_video_roi(task, roi):
+    """驗證 ROI 設定 {'mode': off|manual|auto, 'regions'}，返回 (mode, 區域列表)
+    
+    未指定時沿用任務上次的設定；自動模式尚未偵測過時區域為 None。設定不合法時拋出 ValueError。
+    """
+    if roi is None:
+        roi = task.get('roi') or {'mode': 'off'}
+    if not isinstance(roi, dict):
+        raise ValueError('roi must be an object')
+    mode = roi.get('mode', 'manual' if roi.get('regions') else 'off')
+    if mode not in video_roi.ROI_MODES:
+        raise ValueError(f'Invalid roi mode: {mode}')
+    
+    if mode == 'off':
+        return mode, []
+    if mode == 'manual':
+        return mode, video_roi.parse_regions(roi.get('regions'))
+    cached = task.get('roi') or {}
+    return mode, cached['regions'] if cached.get('mode') == 'auto' and cached.get('detected') else None
+
+def resolve_video_roi(task_id, task, roi):
+    """解析任務的 ROI 設定，返回區域列表（空列表為全畫面）；自動偵測的結果保存在任務中，同一支影片只偵測一次"""
+    mode, regions = parse_video_roi(task, roi)
+    if regions is None:
+        regions = detect_video_roi(task['video_path'])
+    
+    video_tasks.update_fields(task_id, roi={'mode': mode, 'regions': regions, 'detected': mode == 'auto'})
+    return regions
+
 # ==============================================================================
 # 模型載入和 OCR 相關函數
 # ==============================================================================
 
-_model_instance = None
-_processor_instance = None
-_model_instance_lock = threading.Lock()
+# 常駐 worker 進程（ocr_worker.py）各自載入一份模型，數量等於同時推理上限；
+# worker 數、回收與 canary 健康探測的設定在 inference_server.py
 
-def _load_model_for_subprocess():
-    global _model_instance, _processor_instance, _model_instance_lock
-    with _model_instance_lock:
-        if _model_instance is not None and _processor_instance is not None:
-            return True
-        try:
-            print(f"[{os.getpid()}] 🚀 Loading MLX DeepSeek-OCR model in subprocess...")
-            model_path = "mlx-community/DeepSeek-OCR-8bit"
-            _model_instance, _processor_instance = load(model_path)
-            print(f"[{os.getpid()}] ✅ Model loaded successfully in subprocess!")
-            print(f"[{os.getpid()}] 🔊 Metal available: {mx.metal.is_available()}")
-            return True
-        except Exception as e:
-            print(f"[{os.getpid()}] ❌ Error loading model in subprocess: {e}")
-            traceback.print_exc()
-            _model_instance = None
-            _processor_instance = None
-            return False
+# 模型載入 / 暖機 / canary 指標記錄在 worker pool 所在的進程，/metrics 經由 status 取得
+local_inference = create_inference_service()
+worker_pool = local_inference.pool
+admission_controller = local_inference.admission
 
-def _run_ocr_in_process(image_bytes, prompt, max_tokens, output_queue):
-    if not _load_model_for_subprocess():
-        output_queue.put({'error': 'Model load failed in subprocess'})
-        return
-    try:
-        t_load_start = time.time()
-        img = Image.open(io.BytesIO(image_bytes))
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        t_load_end = time.time()
-        print(f"[{os.getpid()}] 📸 Image loaded: {img.size}, mode: {img.mode}, time: {t_load_end - t_load_start:.2f}s")
-        
-        print(f"[{os.getpid()}] 🔍 Starting OCR in subprocess...")
-        print(f"[{os.getpid()}] 🔍 Image object type: {type(img)}")
-        print(f"[{os.getpid()}] 🔍 Image size: {img.size}, mode: {img.mode}")
-        
-        # 確保設備設置正確
-        # 確保設備設置正確
-        if mx.metal.is_available():
-            # mx.set_default_device(mx.gpu) # Default is usually GPU on Apple Silicon
-            print(f"[{os.getpid()}] 🔧 Metal available, using default device (GPU)")
-        else:
-            mx.set_default_device(mx.cpu)
-            print(f"[{os.getpid()}] 🔧 Set default device to CPU")
-        
-        print(f"[{os.getpid()}] 🔍 Prompt: {prompt[:100]}...")
-        print(f"[{os.getpid()}] 🔍 Max tokens: {max_tokens}")
-        
-        # 確保模型和處理器已正確初始化
-        if _model_instance is None or _processor_instance is None:
-            raise RuntimeError("Model or processor is None - model not properly loaded")
-        
-        t_ocr_start = time.time()
-        
-        # 修復 mlx-vlm 0.3.5 bug：stream_generate() 可能返回空生成器，導致 last_response 為 None
-        # 解決方案：使用較小的 max_tokens 值，並添加重試機制
-        
-        max_retries = 3
-        retry_tokens = [min(max_tokens, 2048), min(max_tokens, 512), 256]
-        res = None
-        
-        for attempt in range(max_retries):
-            try:
-                current_max_tokens = retry_tokens[attempt]
-                print(f"[{os.getpid()}] 🔍 嘗試 {attempt + 1}/{max_retries}: max_tokens={current_max_tokens}")
-                
-                res = generate(
-                    model=_model_instance,
-                    processor=_processor_instance,
-                    image=img,
-                    prompt=prompt,
-                    max_tokens=current_max_tokens,
-                    temperature=0.0,
-                    use_cache=False
-                )
-                
-                # 如果成功，跳出循環
-                if res is not None:
-                    break
-                    
-            except AttributeError as e:
-                if "'NoneType' object has no attribute 'token'" in str(e):
-                    print(f"[{os.getpid()}] ⚠️ 嘗試 {attempt + 1} 失敗: mlx-vlm bug (last_response=None)")
-                    if attempt < max_retries - 1:
-                        time.sleep(1)  # 等待後重試（time 已在文件開頭導入）
-                        continue
-                    else:
-                        raise RuntimeError("mlx-vlm generate() 失敗：stream_generate() 沒有產生響應。這可能是 CPU 模式下的已知問題。")
-                else:
-                    raise
-            except Exception as e:
-                print(f"[{os.getpid()}] ⚠️ 嘗試 {attempt + 1} 失敗: {type(e).__name__}: {str(e)[:100]}")
-                if attempt < max_retries - 1:
-                    time.sleep(1)  # 等待後重試（time 已在文件開頭導入）
-                    continue
-                else:
-                    raise
-        
-        t_ocr_end = time.time()
-        
-        # 檢查結果是否有效
-        if res is None:
-            raise RuntimeError("generate() 在所有重試後仍返回 None")
-        
-        text = res.text if hasattr(res, 'text') else str(res)
-        text = re.sub(r'<\|grounding\|>|\[\[.*?\]\]', '', text).strip()
-        
-        print(f"[{os.getpid()}] ✅ OCR completed in {t_ocr_end - t_ocr_start:.2f}s, text length: {len(text)}")
-        output_queue.put({'success': True, 'text': text, 'timing': {
-            'load': t_load_end - t_load_start,
-            'inference': t_ocr_end - t_ocr_start
-        }})
-    except Exception as e:
-        traceback.print_exc()
-        output_queue.put({'error': f'OCR processing failed in subprocess: {str(e)}'})
-    finally:
-        if 'img' in locals() and img is not None:
-            img.close()
-        gc.collect()
+# 設定 OCR_INFERENCE_ADDRESS 時推理交給共用的 inference_server.py 進程（Unix socket 路徑或
+# host:port；多個 HTTP worker / 機器共用同一組模型與准入佇列），否則在本進程內執行
+INFERENCE_ADDRESS = os.environ.get('OCR_INFERENCE_ADDRESS')
+
+if INFERENCE_ADDRESS:
+    # 等待回應的上限另加排隊時間，inference server 掛起時不會無限期阻塞
+    inference_backend = InferenceClient(
+        parse_address(INFERENCE_ADDRESS), authkey_from_env(), reply_margin=INFERENCE_QUEUE_TIMEOUT + 30
+    )
+else:
+    inference_backend = local_inference
+
+def generate_with_timeout_and_process(image, prompt, max_tokens=8192, timeout=160, labels=None, image_size=None, image_bytes=None,
+                                      grounding=False):
+    """推理單張圖像；image_bytes 為已序列化的 JPEG 時不再編碼 image（可為 None）
+    
+    grounding 時返回模型的原始輸出（含區塊類型與座標標記，以 layout.parse 解析）
+    """
+    labels = labels or metric_labels()
+    priority = inference_priority(labels)
+    with tracing.span('inference_call', max_tokens=max_tokens, priority=priority, **labels):
+        return _generate_in_worker(image, prompt, max_tokens, timeout, labels, priority, image_size, image_bytes, grounding)
+
+def serialize_image(image, labels):
+    """以 JPEG 編碼送往 worker 的圖像"""
+    t_serialize_start = time.time()
+    with observe_stage('serialize', labels):
+        buffered = io.BytesIO()
+        image.save(buffered, format="JPEG", quality=85)
+        image_bytes = buffered.getvalue()
+    print(f"📦 Image serialized: {len(image_bytes) / 1024:.1f}KB (JPEG), time: {time.time() - t_serialize_start:.2f}s")
+    return image_bytes
 
-def generate_with_timeout_and_process(image, prompt, max_tokens=8192, timeout=160):
+def _generate_in_worker(image, prompt, max_tokens, timeout, labels, priority, image_size=None, image_bytes=None, grounding=False):
+    # 排程以配置的 image_size 分桶（實際圖像可能因保持比例而略小）
+    image_size = tuple(image_size or image.size)
     t_serialize_start = time.time()
-    buffered = io.BytesIO()
-    image.save(buffered, format="JPEG", quality=85)
-    image_bytes = buffered.getvalue()
+    if image_bytes is None:
+        image_bytes = serialize_image(image, labels)
     t_serialize_end = time.time()
     
-    print(f"📦 Image serialized: {len(image_bytes) / 1024:.1f}KB (JPEG), time: {t_serialize_end - t_serialize_start:.2f}s")
-    
-    output_queue = multiprocessing.Queue()
+    job = {
+        'op': 'ocr',
+        'image': image_bytes,
+        'prompt': prompt,
+        'max_tokens': max_tokens,
+        'trace_context': tracing.current_context()
+    }
+    if grounding:
+        job['grounding'] = True
     t_process_start = time.time()
-    
-    process = multiprocessing.Process(
-        target=_run_ocr_in_process,
-        args=(image_bytes, prompt, max_tokens, output_queue)
-    )
-    process.start()
-    process.join(timeout=timeout)
-
-    if process.is_alive():
-        print(f"[{os.getpid()}] ⏰ OCR processing timed out. Terminating subprocess {process.pid}.")
-        process.terminate()
-        process.join(timeout=5)
-        if process.is_alive():
-            process.kill()
-        raise TimeoutError("OCR processing timeout")
-
-    if process.exitcode != 0:
-        print(f"[{os.getpid()}] ❌ OCR subprocess exited with code {process.exitcode}")
-        try:
-            result = output_queue.get_nowait()
-            if 'error' in result:
-                raise RuntimeError(result['error'])
-        except queue.Empty:
-            pass
-        raise RuntimeError(f"OCR subprocess exited unexpectedly (code {process.exitcode})")
-
     try:
-        result = output_queue.get(timeout=1)
-        t_process_end = time.time()
-        
-        if 'success' in result:
-            timing = result.get('timing', {})
-            print(f"⏱️ 總耗時: {t_process_end - t_process_start:.2f}s (序列化: {t_serialize_end - t_serialize_start:.2f}s, 推理: {timing.get('inference', 0):.2f}s)")
-            return result['text']
-        else:
-            raise RuntimeError(result.get('error', 'Unknown OCR error in subprocess'))
-    except queue.Empty:
-        raise RuntimeError("OCR subprocess finished but no result in queue.")
+        result = inference_backend.run(
+            job, priority,
+            cost=estimate_inference_cost(image_size, max_tokens),
+            bucket=(image_size, max_tokens),
+            timeout=timeout
+        )
+    except TimeoutError:
+        print(f"[{os.getpid()}] ⏰ OCR processing timed out. Restarting worker.")
+        OCR_TIMEOUTS.inc(**labels)
+        raise TimeoutError("OCR processing timeout")
+    except WorkerCrashed as e:
+        print(f"[{os.getpid()}] ❌ OCR worker crashed: {e}")
+        OCR_SUBPROCESS_CRASHES.inc(**labels)
+        raise RuntimeError(f"OCR worker exited unexpectedly: {e}")
+    t_process_end = time.time()
+    tracing.export(result.get('spans'))
+    
+    if 'success' not in result:
+        raise RuntimeError(result.get('error', 'Unknown OCR error in worker'))
+    
+    timing = result.get('timing', {})
+    OCR_STAGE_SECONDS.observe(result.get('admission_wait', 0.0), stage='admission_wait', **labels)
+    if 'queue_wait' in result:
+        OCR_STAGE_SECONDS.observe(result['queue_wait'], stage='queue_wait', **labels)
+    if 'inference' in timing:
+        OCR_STAGE_SECONDS.observe(timing['inference'], stage='inference', **labels)
+        if timing.get('retries'):
+            OCR_RETRIES.inc(timing['retries'], **labels)
+    print(f"⏱️ 總耗時: {t_process_end - t_process_start:.2f}s (序列化: {t_serialize_end - t_serialize_start:.2f}s, 推理: {timing.get('inference', 0):.2f}s)")
+    return result['text']
 
 # ==============================================================================
 # 前處理函數
 # ==============================================================================
 
 def get_preprocessing_config(content_type, subcategory, complexity):
-    """根據三維分類獲取前處理配置"""
+    """根據三維分類獲取前處理配置（Auto 返回佔位配置，實際值逐頁決定）"""
     try:
-        config = PREPROCESSING_CONFIG[content_type][subcategory][complexity]
+        levels = PREPROCESSING_CONFIG[content_type][subcategory]
+        if complexity == AUTO_COMPLEXITY:
+            return {'image_size': None, 'max_tokens': None, 'auto': True}
+        config = levels[complexity]
         return config
     except KeyError:
         return None
 
+# ==============================================================================
+# Auto 複雜度：依圖像統計逐頁選擇 image_size / max_tokens
+# ==============================================================================
+
+AUTO_COMPLEXITY = 'Auto'
+COMPLEXITY_LEVELS = ['Tiny', 'Small', 'Medium', 'Large', 'Gundam']
+
+AUTO_COMPLEXITY_CONFIG = {
+    'analysis_max_side': 1600,     # 統計分析時縮放到的最大邊長
+    'min_char_px': 12,             # 模型輸入中字元高度的下限（像素）
+    'tokens_per_component': 0.6,   # 每個字元連通元件約產生的 token 數
+    'table_token_factor': 1.5,     # 表格輸出 Markdown 分隔符的額外 token
+    'token_headroom': 1.2,         # token 預算餘量
+    'table_min_level': 'Medium'    # 偵測到表格時的最低等級
+}
+
+def measure_image_complexity(image):
+    """量測文字行數、字元高度、表格線等低成本統計"""
+    import cv2
+    gray = np.array(image.convert('L'))
+    height, width = gray.shape
+    scale = min(1.0, AUTO_COMPLEXITY_CONFIG['analysis_max_side'] / max(height, width))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    bh, bw = gray.shape
+
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    if np.count_nonzero(binary) > binary.size / 2:
+        # 深色背景（投影片、影片字幕）時反轉，讓文字成為前景
+        binary = cv2.bitwise_not(binary)
+
+    # 表格線：以長條形結構元素做開運算
+    horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(20, bw // 15), 1)))
+    vertical = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(20, bh // 15))))
+    h_lines = len(cv2.findContours(horizontal, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0])
+    v_lines = len(cv2.findContours(vertical, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0])
+    has_table = h_lines >= 3 and v_lines >= 2
+
+    # 去除表格線後估計字元高度
+    text_mask = cv2.subtract(binary, cv2.bitwise_or(horizontal, vertical))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(text_mask, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    keep = (heights >= 3) & (heights <= bh * 0.2) & (areas >= 4)
+    components = int(np.count_nonzero(keep))
+    char_height = float(np.median(heights[keep])) / scale if components else 0.0
+
+    # 文字行數：水平投影中連續有墨水的行帶
+    rows = np.count_nonzero(text_mask, axis=1) > max(1, int(bw * 0.002))
+    text_lines = int(np.count_nonzero(rows[1:] & ~rows[:-1]) + (1 if rows[0] else 0))
+
+    return {
+        'width': width,
+        'height': height,
+        'text_lines': text_lines,
+        'char_height': round(char_height, 1),
+        'components': components,
+        'table_lines': {'horizontal': h_lines, 'vertical': v_lines},
+        'has_table': has_table
+    }
+
+def choose_auto_complexity(content_type, subcategory, stats):
+    """根據統計選出能容納字元解析度與 token 需求的最低等級"""
+    cfg = AUTO_COMPLEXITY_CONFIG
+    levels = PREPROCESSING_CONFIG[content_type][subcategory]
+
+    long_side = max(stats['width'], stats['height'])
+    if stats['char_height'] > 0:
+        needed_side = min(long_side, cfg['min_char_px'] * long_side / stats['char_height'])
+    else:
+        needed_side = 0
+
+    needed_tokens = stats['components'] * cfg['tokens_per_component'] * cfg['token_headroom']
+    if stats['has_table']:
+        needed_tokens *= cfg['table_token_factor']
+
+    min_index = COMPLEXITY_LEVELS.index(cfg['table_min_level']) if stats['has_table'] else 0
+    for level in COMPLEXITY_LEVELS[min_index:]:
+        config = levels[level]
+        if max(config['image_size']) >= needed_side and config['max_tokens'] >= needed_tokens:
+            return level, int(needed_side), int(needed_tokens)
+
+    # 沒有等級能同時滿足：優先滿足 token 需求，其次選解析度最高者
+    best = max(
+        COMPLEXITY_LEVELS[min_index:],
+        key=lambda l: (levels[l]['max_tokens'] >= needed_tokens, max(levels[l]['image_size']), levels[l]['max_tokens'])
+    )
+    return best, int(needed_side), int(needed_tokens)
+
+def batch_config_sizes(config):
+    """批次回應 config 中的 image_size / max_tokens；Auto 逐頁決定（見各頁結果的 auto_complexity），不列出"""
+    if config.get('auto'):
+        return {}
+    return {'image_size': config['image_size'], 'max_tokens': config['max_tokens']}
+
+def resolve_page_config(config, content_type, subcategory, image):
+    """Auto 配置時依圖像統計決定實際配置，返回 (config, auto_choice)"""
+    if not config.get('auto'):
+        return config, None
+
+    stats = measure_image_complexity(image)
+    level, needed_side, needed_tokens = choose_auto_complexity(content_type, subcategory, stats)
+    chosen = PREPROCESSING_CONFIG[content_type][subcategory][level]
+    auto_choice = {
+        'complexity': level,
+        'image_size': chosen['image_size'],
+        'max_tokens': chosen['max_tokens'],
+        'needed_side': needed_side,
+        'needed_tokens': needed_tokens,
+        'stats': stats
+    }
+    print(f"🤖 Auto complexity → {level} (lines={stats['text_lines']}, char_h={stats['char_height']}, table={stats['has_table']})")
+    return chosen, auto_choice
+
 def preprocess_image_by_config(image, image_size):
     """調整圖像到指定尺寸"""
     img_processed = image.copy()
@@ -616,6 +767,327 @@ def preprocess_image_by_config(image, image_size):
     print(f"🖼️ Image preprocessed to {image_size}, actual size: {img_processed.size}")
     return img_processed
 
+# ==============================================================================
+# 空白頁偵測（推理前過濾）
+# ==============================================================================
+
+BLANK_DETECTION_CONFIG = {
+    'analysis_size': 512,       # 降採樣後的最大邊長（過小會抹掉單行小字）
+    'ink_delta': 48,            # 與背景灰階差異超過此值視為墨水像素
+    'ink_ratio': 0.0001,        # 墨水像素比例低於此值視為低墨水量
+    'edge_density': 0.0002,     # Canny 邊緣像素比例低於此值視為無內容
+    'min_std': 1.0              # 灰階標準差低於此值視為純色頁（空白頁、黑幀）
+}
+
+def parse_blank_thresholds(overrides):
+    """解析請求中的空白偵測閾值覆寫，未知鍵或非數值時拋出 ValueError"""
+    if not overrides:
+        return {}
+    if not isinstance(overrides, dict):
+        raise ValueError('blank_thresholds must be an object')
+    thresholds = {}
+    for key, value in overrides.items():
+        if key not in BLANK_DETECTION_CONFIG:
+            raise ValueError(f'Unknown blank threshold: {key}')
+        thresholds[key] = float(value)
+    return thresholds
+
+def detect_blank_page(image, thresholds=None):
+    """在降採樣灰階圖上快速判斷頁面是否空白，返回 (is_blank, stats)"""
+    import cv2
+    cfg = {**BLANK_DETECTION_CONFIG, **(thresholds or {})}
+    size = int(cfg['analysis_size'])
+
+    gray = image.convert('L')
+    gray.thumbnail((size, size), Image.Resampling.BILINEAR)
+    arr = np.asarray(gray)
+    gray.close()
+
+    std = float(arr.std())
+    background = float(np.median(arr))
+    ink_ratio = float(np.mean(np.abs(arr.astype(np.int16) - background) > cfg['ink_delta']))
+    edge_density = float(np.count_nonzero(cv2.Canny(arr, 50, 150))) / arr.size
+
+    is_blank = std < cfg['min_std'] or (ink_ratio < cfg['ink_ratio'] and edge_density < cfg['edge_density'])
+    stats = {
+        'std': round(std, 2),
+        'ink_ratio': round(ink_ratio, 5),
+        'edge_density': round(edge_density, 5)
+    }
+    return is_blank, stats
+
+def is_pdf_page_empty(page):
+    """PDF 頁面無文字、無圖片、無向量圖形時，無需渲染即可判定為空白"""
+    return not page.get_text().strip() and not page.get_images() and not page.get_drawings()
+
+# ==============================================================================
+# 大頁面區域切塊 OCR
+# ==============================================================================
+
+TILING_MODES = ('off', 'on', 'auto')
+
+TILING_CONFIG = {
+    'overlap': 64,               # 相鄰切塊重疊像素，避免切斷文字行
+    'max_workers': 2,            # 同時推理的切塊數
+    'min_block_area': 0.0005,    # 文字區塊最小面積（佔全圖比例）
+    'analysis_max_side': 2000,   # 版面分析時縮放到的最大邊長
+    'auto_ratio': 1.5,           # auto 模式：圖像超過 image_size 多少倍才切塊
+    'pdf_base_scale': 1.5,       # PDF 預設渲染倍率
+    'pdf_render_scale': 3.0      # 切塊頁面的 PDF 渲染倍率
+}
+
+def _exceeds_tile_size(width, height, image_size):
+    ratio = TILING_CONFIG['auto_ratio']
+    return width > image_size[0] * ratio or height > image_size[1] * ratio
+
+def should_tile_image(image, image_size, tiling):
+    """判斷圖像是否需要切塊 OCR"""
+    if tiling == 'on':
+        return True
+    if tiling == 'auto':
+        return _exceeds_tile_size(image.width, image.height, image_size)
+    return False
+
+def tiling_reference_size(config, content_type, subcategory):
+    """auto 切塊在渲染前判斷所用的 image_size；Auto 複雜度逐頁決定等級，以最大等級判斷"""
+    if config.get('image_size'):
+        return config['image_size']
+    return max((level['image_size'] for level in PREPROCESSING_CONFIG[content_type][subcategory].values()), key=max)
+
+def pdf_page_render_scale(page, image_size, tiling):
+    """PDF 頁面渲染倍率：on 一律以切塊倍率渲染；auto 依預設倍率下的頁面尺寸判斷，只有會切塊的頁面提高倍率"""
+    base = TILING_CONFIG['pdf_base_scale']
+    if tiling == 'on':
+        return TILING_CONFIG['pdf_render_scale']
+    if tiling == 'auto' and _exceeds_tile_size(page.rect.width * base, page.rect.height * base, image_size):
+        return TILING_CONFIG['pdf_render_scale']
+    return base
+
+def _group_blocks_by_gap(blocks, axis):
+    """沿指定軸（0: x, 1: y）按空白間隙分組，返回 (分組列表, 各間隙寬度)"""
+    ordered = sorted(blocks, key=lambda b: b[axis])
+    groups = [[ordered[0]]]
+    gaps = []
+    end = ordered[0][axis] + ordered[0][axis + 2]
+    for block in ordered[1:]:
+        if block[axis] > end:
+            gaps.append(block[axis] - end)
+            groups.append([block])
+        else:
+            groups[-1].append(block)
+        end = max(end, block[axis] + block[axis + 2])
+    return groups, gaps
+
+def _xy_cut(blocks, ordered):
+    """遞迴 XY-cut：優先按縱向空白分欄，否則在最大橫向空白處切分"""
+    if len(blocks) <= 1:
+        ordered.extend(blocks)
+        return
+
+    columns, _ = _group_blocks_by_gap(blocks, 0)
+    if len(columns) > 1:
+        for column in columns:
+            _xy_cut(column, ordered)
+        return
+
+    rows, gaps = _group_blocks_by_gap(blocks, 1)
+    if len(rows) > 1:
+        # 只在最寬的橫向空白切一刀，讓標題下方的多欄內容仍能被分欄
+        cut = gaps.index(max(gaps)) + 1
+        _xy_cut([b for row in rows[:cut] for b in row], ordered)
+        _xy_cut([b for row in rows[cut:] for b in row], ordered)
+        return
+
+    ordered.extend(sorted(blocks, key=lambda b: (b[1], b[0])))
+
+def sort_blocks_reading_order(blocks):
+    """按閱讀順序排序區塊（多欄版面先左欄後右欄）"""
+    ordered = []
+    _xy_cut(list(blocks), ordered)
+    return ordered
+
+def detect_text_blocks(image):
+    """以形態學版面分析偵測文字區塊，返回原圖座標的 (x, y, w, h) 列表"""
+    import cv2
+    gray = np.array(image.convert('L'))
+    height, width = gray.shape
+    scale = min(1.0, TILING_CONFIG['analysis_max_side'] / max(height, width))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    # 形態學梯度 + Otsu 取得筆畫邊緣
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    # 橫向連接字元成行，再縱向連接成段落
+    kernel_w = max(9, gray.shape[1] // 60)
+    kernel_h = max(3, gray.shape[0] // 200)
+    connected = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_w, 1)))
+    connected = cv2.dilate(connected, cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_w // 2, kernel_h * 3)))
+
+    contours, _ = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = TILING_CONFIG['min_block_area'] * gray.shape[0] * gray.shape[1]
+
+    blocks = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w * h < min_area:
+            continue
+        x0, y0 = int(x / scale), int(y / scale)
+        x1, y1 = min(width, int((x + w) / scale) + 1), min(height, int((y + h) / scale) + 1)
+        blocks.append((x0, y0, x1 - x0, y1 - y0))
+
+    return sort_blocks_reading_order(blocks)
+
+def _split_region_into_tiles(x0, y0, x1, y1, tile_w, tile_h, overlap):
+    """將超出切塊尺寸的區域切成帶重疊的網格（逐行排列）"""
+    step_x = max(1, tile_w - overlap)
+    step_y = max(1, tile_h - overlap)
+    tiles = []
+    top = y0
+    while True:
+        bottom = min(top + tile_h, y1)
+        left = x0
+        while True:
+            right = min(left + tile_w, x1)
+            tiles.append((left, top, right, bottom))
+            if right >= x1:
+                break
+            left += step_x
+        if bottom >= y1:
+            break
+        top += step_y
+    return tiles
+
+def plan_ocr_tiles(image, image_size):
+    """根據文字區塊規劃切塊：小區塊合併、大區塊按網格切分，保持閱讀順序"""
+    width, height = image.size
+    tile_w, tile_h = image_size
+    overlap = TILING_CONFIG['overlap']
+    margin = overlap // 2
+
+    blocks = detect_text_blocks(image)
+    if not blocks:
+        return _split_region_into_tiles(0, 0, width, height, tile_w, tile_h, overlap)
+
+    tiles = []
+    current = None
+    for x, y, w, h in blocks:
+        x0, y0 = max(0, x - margin), max(0, y - margin)
+        x1, y1 = min(width, x + w + margin), min(height, y + h + margin)
+
+        if x1 - x0 > tile_w or y1 - y0 > tile_h:
+            if current:
+                tiles.append(current)
+                current = None
+            tiles.extend(_split_region_into_tiles(x0, y0, x1, y1, tile_w, tile_h, overlap))
+            continue
+
+        if current is None:
+            current = (x0, y0, x1, y1)
+            continue
+
+        merged = (min(current[0], x0), min(current[1], y0), max(current[2], x1), max(current[3], y1))
+        if merged[2] - merged[0] <= tile_w and merged[3] - merged[1] <= tile_h:
+            current = merged
+        else:
+            tiles.append(current)
+            current = (x0, y0, x1, y1)
+
+    if current:
+        tiles.append(current)
+
+    return tiles
+
+def stitch_tile_texts(texts, max_overlap_lines=5):
+    """按順序拼接切塊文字，去除重疊區域造成的重複行"""
+    merged_lines = []
+    for text in texts:
+        lines = text.splitlines()
+        if merged_lines and lines:
+            for n in range(min(max_overlap_lines, len(merged_lines), len(lines)), 0, -1):
+                tail = [l.strip() for l in merged_lines[-n:]]
+                head = [l.strip() for l in lines[:n]]
+                if tail == head and any(tail):
+                    lines = lines[n:]
+                    break
+            if lines:
+                merged_lines.append('')
+        merged_lines.extend(lines)
+    return '\n'.join(merged_lines).strip()
+
+def ocr_image_tiled(image, prompt, config, timeout=160, labels=None):
+    """大頁面切塊並行 OCR，按閱讀順序拼接結果"""
+    labels = labels or metric_labels()
+    with tracing.span('tiled_ocr', width=image.width, height=image.height):
+        return _ocr_tiles(image, prompt, config, timeout, labels)
+
+def ocr_image_tiled_layout(image, prompt, config, timeout=160, labels=None):
+    """切塊 grounding OCR，返回 (拼接的文字, 整頁座標的區塊列表)"""
+    labels = labels or metric_labels()
+    with tracing.span('tiled_ocr', width=image.width, height=image.height):
+        tiles, outputs = _ocr_tile_outputs(image, prompt, config, timeout, labels, grounding=True)
+    tile_blocks = [layout.parse(raw) for raw in outputs]
+    blocks = layout.merge_tiles(
+        layout.offset(blocks, box, image.size) for blocks, box in zip(tile_blocks, tiles)
+    )
+    return stitch_tile_texts([layout.to_text(blocks) for blocks in tile_blocks]), blocks
+
+def _ocr_tiles(image, prompt, config, timeout, labels):
+    _, texts = _ocr_tile_outputs(image, prompt, config, timeout, labels)
+    return stitch_tile_texts(texts)
+
+def _ocr_tile_outputs(image, prompt, config, timeout, labels, grounding=False):
+    """規劃切塊並行推理，返回 (切塊框列表, 各切塊的輸出)"""
+    with observe_stage('preprocess', labels):
+        tiles = plan_ocr_tiles(image, config['image_size'])
+        crops = [preprocess_image_by_config(image.crop(box), config['image_size']) for box in tiles]
+    print(f"🧩 Tiled OCR: {len(tiles)} tiles for image {image.size}, tile size {config['image_size']}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=TILING_CONFIG['max_workers']) as executor:
+            # 每個切塊複製一份 context，讓 span 掛在目前的追蹤之下
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    generate_with_timeout_and_process,
+                    image=crop,
+                    prompt=prompt,
+                    max_tokens=config['max_tokens'],
+                    timeout=timeout,
+                    labels=labels,
+                    image_size=config['image_size'],
+                    grounding=grounding
+                )
+                for crop in crops
+            ]
+            texts = [future.result() for future in futures]
+    finally:
+        for crop in crops:
+            crop.close()
+
+    return tiles, texts
+
+def ocr_image_with_config(image, prompt, config, tiling='off', timeout=160, labels=None):
+    """依配置對單張圖像執行 OCR（必要時切塊）"""
+    labels = labels or metric_labels()
+    if should_tile_image(image, config['image_size'], tiling):
+        return ocr_image_tiled(image, prompt, config, timeout=timeout, labels=labels)
+
+    with observe_stage('preprocess', labels):
+        img_processed = preprocess_image_by_config(image, config['image_size'])
+    try:
+        return generate_with_timeout_and_process(
+            image=img_processed,
+            prompt=prompt,
+            max_tokens=config['max_tokens'],
+            timeout=timeout,
+            labels=labels,
+            image_size=config['image_size']
+        )
+    finally:
+        img_processed.close()
+
 # ==============================================================================
 # 路由和主應用程式邏輯
 # ==============================================================================
@@ -626,20 +1098,29 @@ def allowed_file(filename):
 def allowed_video_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_VIDEO_EXTENSIONS
 
+def parse_bool(value, default):
+    """解析請求中的布林參數：true / false 或 'true' / 'false' / '1' / '0'（未提供時為 default），其他值拋出 ValueError"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('true', '1'):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ('false', '0'):
+        return False
+    raise ValueError(f'expected a boolean, got {value!r}')
+
 def is_model_healthy():
-    return model_loaded_status.value
+    """至少一個 worker 已載入並暖機完成（且最近的 canary 沒有失敗）"""
+    return inference_backend.status()['pool']['health'] == 'ready'
 
 def preload_model_main_process():
-    print("🔧 Setting model preloaded status for main process...")
+    print("🔧 Starting OCR workers (model loads and warms up in the background)...")
     try:
-        if not mx.metal.is_available():
-            print("WARNING: Metal is not available, MLX might not perform well.")
-        
-        model_loaded_status.value = True
-        print("✅ Model preloaded status set successfully for main process.")
+        inference_backend.start()
         return True
     except Exception as e:
-        print(f"❌ Failed to set model preloaded status: {e}")
+        print(f"❌ Failed to start OCR workers: {e}")
         return False
 
 @app.route('/')
@@ -648,21 +1129,53 @@ def index():
 
 @app.route('/api/status')
 def status():
+    backend = inference_backend.status()
+    ready = backend['pool']['health'] == 'ready'
     return jsonify({
-        'model_loaded': model_loaded_status.value,
-        'model_healthy': is_model_healthy()
+        'model_loaded': ready,
+        'model_healthy': ready,
+        'ready': ready,
+        'workers': backend['pool'],
+        'admission': backend['admission'],
+        'inference_server': INFERENCE_ADDRESS
     })
 
+HEALTH_STATUS = {'ready': 'healthy', 'starting': 'starting', 'unavailable': 'unhealthy'}
+
 @app.route('/api/health')
 def health_check():
+    """就緒探測：沒有可用的 worker 時返回 503，讓負載平衡器繞過此實例"""
+    backend = inference_backend.status()
+    pool = backend['pool']
+    # 關閉中的實例不再接受新工作，同樣回報不可用
+    healthy = pool['health'] == 'ready' and not backend['draining']
     return jsonify({
-        'status': 'healthy',
-        'model_loaded': model_loaded_status.value,
-        'model_healthy': is_model_healthy(),
+        'status': 'draining' if backend['draining'] else HEALTH_STATUS[pool['health']],
+        'model_loaded': healthy,
+        'model_healthy': healthy,
+        'workers_ready': pool['ready'],
+        'workers_total': pool['size'],
+        'canary_baseline_seconds': pool['canary_baseline_seconds'],
+        'workers': [
+            {key: worker[key] for key in ('id', 'state', 'canary_seconds', 'canary_age_seconds', 'restarts', 'last_restart_reason')}
+            for worker in pool['workers']
+        ],
         'active_tasks': len(pdf_tasks),
         'preprocess_tasks': len(preprocess_tasks),
         'video_tasks': len(video_tasks)
-    })
+    }), 200 if healthy else 503
+
+@app.route('/api/health/live')
+def liveness_check():
+    """存活探測：進程可回應即為 200（模型仍在載入時不應重啟實例）"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 文字格式指標：本進程（或全部 HTTP worker）的請求指標 + worker pool 所在進程的 worker 指標"""
+    states = metrics_collector.states() if metrics_collector else [metrics.REGISTRY.state()]
+    states.append(inference_backend.status().get('metrics') or {})
+    return Response(metrics.render_state(metrics.merge(states)), content_type=metrics.CONTENT_TYPE)
 
 # ==============================================================================
 # 照片前處理 API
@@ -692,7 +1205,8 @@ def preprocess_upload():
         if allowed_file(file.filename):
             filename = secure_filename(file.filename)
             raw_path = raw_dir / filename
-            file.save(raw_path)
+            with observe_stage('upload', metric_labels()):
+                file.save(raw_path)
             
             img = None
             try:
@@ -752,7 +1266,6 @@ def preprocess_process():
         return jsonify({'error': 'Task not found'}), 404
     
     task = preprocess_tasks[task_id]
-    task['settings'] = settings
     
     processed_dir = Path(task['task_dir']) / "processed"
     
@@ -769,7 +1282,8 @@ def preprocess_process():
             
             # 處理圖片
             original_img = Image.open(raw_path)
-            processed_img = preprocess_single_image(original_img, settings)
+            with observe_stage('preprocess', metric_labels()):
+                processed_img = preprocess_single_image(original_img, settings)
             
             # 保存處理後的圖片
             output_path = processed_dir / filename
@@ -827,6 +1341,8 @@ def preprocess_process():
                 except:
                     pass
     
+    preprocess_tasks.update_fields(task_id, settings=settings, images=task['images'])
+    
     return jsonify({
         'success': True,
         'results': results
@@ -895,6 +1411,7 @@ def preprocess_to_ocr():
 @app.route('/api/video/upload', methods=['POST'])
 def video_upload():
     """上傳影片進行截圖"""
+    import cv2
     if 'file' not in request.files:
         return jsonify({'error': 'No file'}), 400
     
@@ -912,7 +1429,8 @@ def video_upload():
     # 保存影片
     video_filename = secure_filename(file.filename)
     video_path = task_dir / video_filename
-    file.save(video_path)
+    with observe_stage('upload', metric_labels()):
+        file.save(video_path)
     
     # 獲取影片資訊
     cap = cv2.VideoCapture(str(video_path))
@@ -948,18 +1466,163 @@ def video_upload():
         'video_info': video_tasks[task_id]['video_info']
     })
 
+# 背景截圖：請求立即返回 202，進度、已完成的幀與取消旗標都保存在任務中（多進程部署時任一進程都能查詢與取消）
+VIDEO_EXTRACT_JOBS = int(os.environ.get('OCR_VIDEO_EXTRACT_JOBS', 2))   # 同時在背景截圖的影片數，其餘排隊
+VIDEO_EXTRACT_FLUSH_SECONDS = 0.5    # 把進度與新完成的幀寫入任務的間隔
+VIDEO_EXTRACT_STALE_SECONDS = 60     # 排隊或執行中的截圖超過此時間沒有更新，視為處理它的進程已結束
+_video_extract_slots = threading.Semaphore(VIDEO_EXTRACT_JOBS)
+
+def frame_preview(frame):
+    """任務中的幀記錄加上縮圖預覽（data URL，容器中已存的縮圖直接使用，否則產生 PNG）；讀取失敗時 thumb_b64 為 None"""
+    preview = dict(frame, thumb_b64=None)
+    stored = frame_store.read(frame['path'], thumbnail=True)
+    if stored is not None:
+        thumb, mime = stored
+        preview['thumb_b64'] = f"data:{mime};base64,{base64.b64encode(thumb).decode()}"
+        return preview
+    img = None
+    try:
+        img = frame_store.open_image(frame['path'])
+        img.thumbnail((150, 150), Image.Resampling.LANCZOS)
+        buffered = io.BytesIO()
+        img.save(buffered, format="PNG")
+        thumb_b64 = base64.b64encode(buffered.getvalue()).decode()
+        preview['thumb_b64'] = f"data:image/png;base64,{thumb_b64}"
+    except Exception as e:
+        print(f"⚠️ Error generating thumbnail for frame {frame['index']}: {e}")
+    finally:
+        if img:
+            try:
+                img.close()
+            except:
+                pass
+    return preview
+
+def extraction_running(task):
+    extraction = task.get('extraction') or {}
+    return (
+        extraction.get('status') in ('queued', 'running')
+        and time.time() - extraction.get('heartbeat', 0) < VIDEO_EXTRACT_STALE_SECONDS
+    )
+
+def start_video_extraction(task_id, settings):
+    """以 daemon 執行緒排隊執行背景截圖（結束程式時不等待截圖完成）"""
+    def run():
+        # 排隊時定期更新 heartbeat，讓其他進程知道任務仍在等待
+        while not _video_extract_slots.acquire(timeout=VIDEO_EXTRACT_FLUSH_SECONDS * 10):
+            task = video_tasks.get(task_id)
+            if task is None:
+                return
+            video_tasks.update_fields(task_id, extraction=dict(task['extraction'], heartbeat=time.time()))
+        try:
+            run_video_extraction(task_id, settings)
+        finally:
+            _video_extract_slots.release()
+    
+    threading.Thread(target=run, name=f'video-extract-{task_id[:8]}', daemon=True).start()
+
+def run_video_extraction(task_id, settings):
+    """背景截圖：每 VIDEO_EXTRACT_FLUSH_SECONDS 把進度與新完成的幀寫入任務，任務被標記取消時停止解碼"""
+    task = video_tasks.get(task_id)
+    if task is None:
+        return
+    
+    progress = video_decoder.DecodeProgress()
+    frames = []
+    frames_lock = threading.Lock()
+    span = {'frames': 0}
+    started = time.time()
+    
+    def on_frame(record):
+        with frames_lock:
+            frames.append({
+                'index': len(frames) + 1, 'path': record['path'],
+                'timestamp': record['timestamp'], 'selected': True
+            })
+    
+    def flush(status, **extra):
+        with frames_lock:
+            snapshot = list(frames)
+        decoded = progress.decoded if status != 'completed' else span['frames']
+        decoded = min(decoded, span['frames'])
+        elapsed = time.time() - started
+        remaining = span['frames'] - decoded
+        updated = video_tasks.update_fields(task_id, frames=snapshot, extraction={
+            'status': status,
+            'frames_decoded': decoded,
+            'video_frames': span['frames'],
+            'frames_kept': len(snapshot),
+            'progress': round(decoded / span['frames'], 3) if span['frames'] else (1.0 if status == 'completed' else 0.0),
+            'elapsed_seconds': round(elapsed, 1),
+            'eta_seconds': round(elapsed * remaining / decoded, 1) if status == 'running' and decoded else None,
+            'heartbeat': time.time(),
+            **extra
+        })
+        # 任務已刪除或被要求取消
+        if updated is None or updated.get('extract_cancel'):
+            progress.cancel()
+    
+    stop_monitor = threading.Event()
+    
+    def monitor():
+        while not stop_monitor.wait(VIDEO_EXTRACT_FLUSH_SECONDS):
+            flush('running')
+    
+    if task.get('extract_cancel'):
+        flush('cancelled')
+        return
+    
+    monitor_thread = None
+    outcome = {}
+    try:
+        regions = resolve_video_roi(task_id, task, settings.get('roi'))
+        method = settings.get('method', 'fixed_count')
+        interval = settings.get('interval', 5)
+        total_frames = settings.get('total_frames', 1000)
+        cap, fps, total_video_frames = video_decoder.open_video(task['video_path'])
+        cap.release()
+        span['frames'] = video_decoder.decode_span(method, fps, total_video_frames, interval, total_frames)
+        
+        flush('running', roi=regions)
+        monitor_thread = threading.Thread(target=monitor, name='video-extract-progress', daemon=True)
+        monitor_thread.start()
+        
+        frames_dir = Path(task['task_dir']) / "frames"
+        video_decoder.extract_frames(
+            task['video_path'], str(frames_dir), method=method, interval=interval, total_frames=total_frames,
+            sensitivity=settings.get('sensitivity', 0.5), regions=regions,
+            progress=progress, on_frame=on_frame, **VIDEO_DECODE_CONFIG, **VIDEO_FRAME_STORE_CONFIG
+        )
+        outcome = {'status': 'cancelled' if progress.cancelled() else 'completed', 'roi': regions}
+    except Exception as e:
+        print(f"❌ Background video extraction failed: {e}")
+        traceback.print_exc()
+        outcome = {'status': 'failed', 'error': f'Frame extraction failed: {str(e)}'}
+    finally:
+        stop_monitor.set()
+        if monitor_thread is not None:
+            monitor_thread.join()
+    
+    flush(**outcome)
+    print(f"✅ Background extraction {outcome['status']}: {len(frames)} frames ({task_id})")
+
 @app.route('/api/video/extract', methods=['POST'])
 def video_extract():
-    """從影片提取幀"""
+    """從影片提取幀；background=true 時在背景執行，立即返回 202，以 /api/video/extract-status 查詢進度"""
     data = request.get_json()
     task_id = data.get('task_id')
     settings = data.get('settings', {})
+    try:
+        background = parse_bool(data.get('background'), False)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid background: {str(e)}'}), 400
     
     if task_id not in video_tasks:
         return jsonify({'error': 'Task not found'}), 404
     
     task = video_tasks[task_id]
-    task['settings'] = settings
+    if extraction_running(task):
+        return jsonify({'error': 'Frame extraction already in progress'}), 409
     
     frames_dir = Path(task['task_dir']) / "frames"
     frames_dir.mkdir(exist_ok=True)
@@ -970,53 +1633,52 @@ def video_extract():
     sensitivity = settings.get('sensitivity', 0.5)
     output_format = settings.get('format', 'jpg')
     
+    if background:
+        # 只驗證 ROI；自動偵測在背景執行
+        try:
+            parse_video_roi(task, settings.get('roi'))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid ROI: {str(e)}'}), 400
+        video_tasks.update_fields(
+            task_id, settings=settings, frames=[], extract_cancel=False,
+            extraction={'status': 'queued', 'frames_decoded': 0, 'frames_kept': 0, 'progress': 0.0, 'heartbeat': time.time()}
+        )
+        start_video_extraction(task_id, settings)
+        return jsonify({'success': True, 'task_id': task_id, 'status': 'queued'}), 202
+    
     try:
-        frames = extract_frames_from_video(
+        regions = resolve_video_roi(task_id, task, settings.get('roi'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid ROI: {str(e)}'}), 400
+    
+    try:
+        frames = extract_frames_from_video(
             task['video_path'],
             str(frames_dir),
             method=method,
             interval=interval,
             total_frames=total_frames,
-            sensitivity=sensitivity
+            sensitivity=sensitivity,
+            regions=regions
         )
         
         # 生成幀的縮圖預覽
-        frame_previews = []
-        for i, frame_path in enumerate(frames):
-            img = None
-            try:
-                img = Image.open(frame_path)
-                img.thumbnail((150, 150), Image.Resampling.LANCZOS)
-                buffered = io.BytesIO()
-                img.save(buffered, format="PNG")
-                thumb_b64 = base64.b64encode(buffered.getvalue()).decode()
-                
-                frame_previews.append({
-                    'index': i + 1,
-                    'path': frame_path,
-                    'thumb_b64': f"data:image/png;base64,{thumb_b64}",
-                    'selected': True
-                })
-            except Exception as e:
-                print(f"⚠️ Error generating thumbnail for frame {i}: {e}")
-                frame_previews.append({
-                    'index': i + 1,
-                    'path': frame_path,
-                    'thumb_b64': None,
-                    'selected': True
-                })
-            finally:
-                if img:
-                    try:
-                        img.close()
-                    except:
-                        pass
-        
-        task['frames'] = frame_previews
+        frame_previews = [
+            frame_preview({'index': i + 1, 'path': frame['path'], 'timestamp': frame['timestamp'], 'selected': True})
+            for i, frame in enumerate(frames)
+        ]
+        
+        # 任務中只保存路徑與索引，縮圖只隨回應返回
+        video_tasks.update_fields(
+            task_id,
+            settings=settings,
+            frames=[{k: v for k, v in f.items() if k != 'thumb_b64'} for f in frame_previews]
+        )
         
         return jsonify({
             'success': True,
             'total_frames': len(frames),
+            'roi': regions,
             'frames': frame_previews
         })
     
@@ -1024,7 +1686,46 @@ def video_extract():
         print(f"❌ Video extraction failed: {e}")
         traceback.print_exc()
         return jsonify({'error': f'Frame extraction failed: {str(e)}'}), 500
+
+@app.route('/api/video/extract-status', methods=['POST'])
+def video_extract_status():
+    """背景截圖的進度（已解碼幀數、保留幀數、預估剩餘秒數）與 since 之後新完成的幀（含縮圖）"""
+    data = request.get_json()
+    task = video_tasks.get(data.get('task_id'))
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+    extraction = task.get('extraction')
+    if not extraction:
+        return jsonify({'error': 'No background extraction for this task'}), 404
+    try:
+        since = max(0, int(data.get('since', 0)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid since'}), 400
     
+    status = dict(extraction)
+    status.pop('heartbeat', None)
+    if status['status'] in ('queued', 'running') and not extraction_running(task):
+        status.update(status='failed', error='Frame extraction stopped unexpectedly')
+    
+    frames = task.get('frames', [])
+    return jsonify({
+        'success': True,
+        **status,
+        'total_frames': len(frames),
+        'frames': [frame_preview(frame) for frame in frames[since:]]
+    })
+
+@app.route('/api/video/extract-cancel', methods=['POST'])
+def video_extract_cancel():
+    """取消背景截圖；已完成的幀保留，可下載或送去 OCR"""
+    data = request.get_json()
+    task_id = data.get('task_id')
+    if task_id not in video_tasks:
+        return jsonify({'error': 'Task not found'}), 404
+    task = video_tasks.update_fields(task_id, extract_cancel=True)
+    print(f"⏹️ Video extraction cancel requested: {task_id}")
+    return jsonify({'success': True, 'status': (task.get('extraction') or {}).get('status')})
+
 @app.route('/api/video/download', methods=['POST'])
 def video_download():
     """下載影片截圖"""
@@ -1042,9 +1743,9 @@ def video_download():
     with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
         for frame_info in task['frames']:
             if frame_info['index'] in selected_frames or not selected_frames:
-                frame_path = Path(frame_info['path'])
-                if frame_path.exists():
-                    zip_file.write(frame_path, frame_path.name)
+                stored = frame_store.read(frame_info['path'])
+                if stored is not None:
+                    zip_file.writestr(Path(frame_info['path']).name, stored[0])
     
     zip_buffer.seek(0)
     
@@ -1055,6 +1756,265 @@ def video_download():
         mimetype='application/zip'
     )
 
+# ==============================================================================
+# 影片串流 OCR：解碼的幀在記憶體中經過選擇、去重、前處理與推理，不寫入中間 JPEG
+# ==============================================================================
+
+VIDEO_STREAM_CONFIG = {
+    'pipeline_depth': int(os.environ.get('OCR_VIDEO_PIPELINE_DEPTH', 4)),  # 各階段之間最多暫存的幀數
+    'fingerprint_size': 64,       # 去重比較用的灰階縮圖邊長
+    'cell_threshold': 0.3,        # 標準化後的縮圖像素差異超過此值（標準差單位）視為改變
+    'dedup_threshold': 0.005      # 改變像素比例低於此值視為與上一張辨識的幀重複（0 停用）
+}
+
+def frame_fingerprint(frame):
+    """亮度與對比標準化的灰階縮圖，忽略淡入淡出、曝光等整體變化"""
+    import cv2
+    size = VIDEO_STREAM_CONFIG['fingerprint_size']
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    # 近乎純色的幀標準差很小，以 8 個灰階為下限避免放大雜訊
+    return (small - small.mean()) / max(float(small.std()), 8.0)
+
+def frame_change_ratio(fingerprint, previous):
+    """兩張縮圖中明顯改變的像素比例"""
+    return float(np.mean(np.abs(fingerprint - previous) > VIDEO_STREAM_CONFIG['cell_threshold']))
+
+def ndjson_line(payload):
+    return json.dumps(payload, ensure_ascii=False) + '\n'
+
+@app.route('/api/video/ocr-stream', methods=['POST'])
+def video_ocr_stream():
+    """影片直接 OCR，逐幀以 NDJSON 串流返回結果（keep_frames=true 時才保存截圖供下載）"""
+    import cv2
+    data = request.get_json()
+    task_id = data.get('task_id')
+    settings = data.get('settings', {})
+    content_type = data.get('content_type', 'Document')
+    subcategory = data.get('subcategory', 'Academic')
+    complexity = data.get('complexity', 'Medium')
+    tiling = data.get('tiling', 'off')
+    preprocess_settings = data.get('preprocess') or {}
+    
+    task = video_tasks.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+    if extraction_running(task):
+        return jsonify({'error': 'Frame extraction in progress'}), 409
+    
+    config = get_preprocessing_config(content_type, subcategory, complexity)
+    if not config:
+        return jsonify({'error': f'Invalid configuration: {content_type}/{subcategory}/{complexity}'}), 400
+    
+    if tiling not in TILING_MODES:
+        return jsonify({'error': f'Invalid tiling mode: {tiling}'}), 400
+    
+    try:
+        keep_frames = parse_bool(data.get('keep_frames'), False)
+        skip_blank = parse_bool(data.get('skip_blank'), True)
+        blank_thresholds = parse_blank_thresholds(data.get('blank_thresholds'))
+        dedup_threshold = float(data.get('dedup_threshold', VIDEO_STREAM_CONFIG['dedup_threshold']))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    
+    priority = data.get('priority', 'bulk')
+    if priority not in BATCH_PRIORITIES:
+        return jsonify({'error': f'Invalid priority: {priority}'}), 400
+    
+    if not is_model_healthy():
+        return jsonify({'error': 'Model not ready. Please check server status.'}), 500
+    
+    try:
+        regions = resolve_video_roi(task_id, task, settings.get('roi'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid ROI: {str(e)}'}), 400
+    
+    prompt = prompts.get('basic', '<image>\nExtract all text from the image.')
+    labels = metric_labels(complexity)
+    frames_dir = Path(task['task_dir']) / "frames"
+    saved_frames = []
+    state = {'page': 0, 'fingerprint': None, 'last_page': None, 'frame_writer': None, 'pipeline': None}
+    
+    def prepare(item):
+        """去重、轉換、前處理、空白幀過濾、尺寸調整與序列化（依幀順序執行）"""
+        frame_idx, timestamp_ms, frame = item
+        state['page'] += 1
+        record = {'page': state['page'], 'frame_index': frame_idx, 'timestamp': round(timestamp_ms / 1000, 3)}
+        
+        with observe_stage('preprocess', labels):
+            fingerprint = frame_fingerprint(frame)
+            if dedup_threshold > 0 and state['fingerprint'] is not None:
+                change = frame_change_ratio(fingerprint, state['fingerprint'])
+                if change < dedup_threshold:
+                    return Done({**record, 'text': '', 'skipped': 'duplicate', 'duplicate_of': state['last_page']})
+            state['fingerprint'], state['last_page'] = fingerprint, record['page']
+            
+            if keep_frames:
+                if state['frame_writer'] is None:
+                    state['frame_writer'] = frame_store.open_store(str(frames_dir), 'frame', **VIDEO_FRAME_STORE_CONFIG)
+                state['frame_writer'].write(len(saved_frames), frame)
+                saved_frames.append({'index': record['page'], 'path': state['frame_writer'].path(len(saved_frames)), 'selected': True})
+            
+            img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            del frame
+            if preprocess_settings:
+                processed = preprocess_single_image(img, preprocess_settings)
+                img.close()
+                img = processed
+        
+        # 推理前過濾空白幀（黑幀、轉場、純色投影片）
+        if skip_blank:
+            with observe_stage('preprocess', labels):
+                is_blank, blank_stats = detect_blank_page(img, blank_thresholds)
+            if is_blank:
+                img.close()
+                return Done({**record, 'text': '', 'skipped': 'blank'})
+        
+        with observe_stage('preprocess', labels):
+            page_config, auto_choice = resolve_page_config(config, content_type, subcategory, img)
+        record.update(config=page_config, auto_choice=auto_choice, image=img, image_bytes=None)
+        if not should_tile_image(img, page_config['image_size'], tiling):
+            with observe_stage('preprocess', labels):
+                img_processed = preprocess_image_by_config(img, page_config['image_size'])
+            record['image_bytes'] = serialize_image(img_processed, labels)
+            img_processed.close()
+            img.close()
+            record['image'] = None
+        return record
+    
+    def infer(record):
+        page_config, auto_choice = record.pop('config'), record.pop('auto_choice')
+        image, image_bytes = record.pop('image'), record.pop('image_bytes')
+        # 准入重試以 INFERENCE_QUEUE_TIMEOUT 為上限，串流關閉（客戶端斷線）時立即放棄
+        deadline = time.monotonic() + INFERENCE_QUEUE_TIMEOUT
+        try:
+            while True:
+                try:
+                    if image is not None:
+                        text = ocr_image_tiled(image, prompt, page_config, timeout=160, labels=labels)
+                    else:
+                        text = generate_with_timeout_and_process(
+                            image=None, prompt=prompt, max_tokens=page_config['max_tokens'], timeout=160,
+                            labels=labels, image_size=page_config['image_size'], image_bytes=image_bytes
+                        )
+                    break
+                except AdmissionRejected as e:
+                    # 串流已開始，無法再返回 429；依建議時間重試
+                    OCR_ADMISSION_REJECTED.inc(priority=e.priority)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or state['pipeline'].wait_closed(min(e.retry_after, remaining)):
+                        print(f"⚠️ Frame {record['page']} admission rejected, giving up")
+                        return {**record, 'text': '', 'error': 'admission rejected'}
+        except (TimeoutError, RuntimeError) as e:
+            print(f"⚠️ Frame {record['page']} OCR failed: {e}")
+            return {**record, 'text': '', 'error': str(e)}
+        finally:
+            if image is not None:
+                image.close()
+        
+        record['text'] = text
+        if auto_choice:
+            record['auto_complexity'] = auto_choice
+        return record
+    
+    def generate():
+        set_inference_priority(priority)
+        counts = {'frames': 0, 'ocr': 0, 'duplicate': 0, 'blank': 0, 'errors': 0}
+        frames = iter_video_frames(
+            task['video_path'],
+            method=settings.get('method', 'fixed_count'),
+            interval=settings.get('interval', 5),
+            total_frames=settings.get('total_frames', 1000),
+            sensitivity=settings.get('sensitivity', 0.5),
+            regions=regions
+        )
+        frame_pipeline = Pipeline(
+            [('preprocess', prepare), ('inference', infer)],
+            depth=VIDEO_STREAM_CONFIG['pipeline_depth'], source='decode'
+        )
+        state['pipeline'] = frame_pipeline
+        frame_results = []
+        yield ndjson_line({'type': 'start', 'task_id': task_id, 'video_info': task['video_info'], 'roi': regions})
+        try:
+            with frame_pipeline:
+                for record in frame_pipeline.run(frames):
+                    frame_results.append(record)
+                    counts['frames'] += 1
+                    if 'error' in record:
+                        counts['errors'] += 1
+                    elif record.get('skipped'):
+                        counts[record['skipped']] += 1
+                    else:
+                        counts['ocr'] += 1
+                    yield ndjson_line({'type': 'frame', **record})
+        except Exception as e:
+            traceback.print_exc()
+            yield ndjson_line({'type': 'error', 'error': f'Video OCR failed: {str(e)}'})
+        finally:
+            # 逐幀結果保存在任務中，之後可由 /api/video/transcript 匯出字幕
+            fields = {'settings': settings, 'ocr_results': frame_results}
+            if state['frame_writer'] is not None:
+                state['frame_writer'].close()
+            if keep_frames:
+                fields['frames'] = saved_frames
+            video_tasks.update_fields(task_id, **fields)
+        
+        report = frame_pipeline.report()
+        record_pipeline_stats('video', report)
+        segments = transcript.merge_segments(frame_results, duration=task['video_info'].get('duration'))
+        print(f"✅ Video OCR stream completed: {counts}, {len(segments)} transcript segments")
+        yield ndjson_line({
+            'type': 'done', **counts, 'kept_frames': len(saved_frames),
+            'segments': segments, 'pipeline': report
+        })
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['X-Accel-Buffering'] = 'no'   # 反向代理不要緩衝，逐行送出
+    return response
+
+@app.route('/api/video/transcript', methods=['POST'])
+def video_transcript():
+    """把逐幀 OCR 結果合併為時間區段，匯出 SRT / WebVTT / JSON 字幕
+    
+    results 為 /api/video/process-batch 或 /api/video/ocr-stream 的逐幀結果（含 timestamp）；
+    未提供時使用 task_id 對應任務中 ocr-stream 保存的結果
+    """
+    data = request.get_json()
+    task_id = data.get('task_id')
+    results = data.get('results')
+    fmt = data.get('format', 'srt')
+    
+    if fmt not in transcript.FORMATS:
+        return jsonify({'error': f'Invalid format: {fmt}'}), 400
+    try:
+        similarity = float(data.get('similarity', transcript.DEFAULT_SIMILARITY))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid similarity'}), 400
+    
+    task = video_tasks.get(task_id) if task_id else None
+    duration = data.get('duration')
+    if task is not None and duration is None:
+        duration = task['video_info'].get('duration')
+    if results is None:
+        if task is None:
+            return jsonify({'error': 'Task not found'}), 404
+        results = task.get('ocr_results')
+        if not results:
+            return jsonify({'error': 'No OCR results for this task'}), 400
+    
+    if not any(r.get('timestamp') is not None for r in results):
+        return jsonify({'error': 'Results have no timestamps'}), 400
+    
+    segments = transcript.merge_segments(results, similarity=similarity, duration=duration)
+    print(f"📝 Transcript: {len(results)} frames → {len(segments)} segments ({fmt})")
+    
+    return send_file(
+        io.BytesIO(transcript.render(segments, fmt).encode('utf-8')),
+        as_attachment=True,
+        download_name=f"transcript_{task_id or 'video'}.{fmt}",
+        mimetype=transcript.MIME_TYPES[fmt]
+    )
+
 # ==============================================================================
 # OCR 路由 (保持不變)
 # ==============================================================================
@@ -1088,13 +2048,18 @@ def ocr():
     if not config:
         return jsonify({'error': f'Invalid configuration: {content_type}/{subcategory}/{complexity}'}), 400
     
+    tiling = request.form.get('tiling', 'off')
+    if tiling not in TILING_MODES:
+        return jsonify({'error': f'Invalid tiling mode: {tiling}'}), 400
+    
     if not is_model_healthy():
         return jsonify({'error': 'Model not ready. Please check server status.'}), 500
     
+    labels = metric_labels(complexity)
     tmp_path = None
     img = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        with observe_stage('upload', labels), tempfile.NamedTemporaryFile(delete=False) as tmp:
             file.save(tmp.name)
             tmp_path = tmp.name
         
@@ -1103,38 +2068,39 @@ def ocr():
         
         img = Image.open(tmp_path).convert('RGB')
         
-        # 根據配置進行前處理
-        img_processed = preprocess_image_by_config(img, config['image_size'])
-        
         # 使用舊 mode 的 prompt（如果提供了）
         if old_mode and old_mode in prompts:
             prompt = prompts[old_mode]
         else:
             prompt = prompts['basic']
         
-        print(f"📋 Processing with: content_type={content_type}, subcategory={subcategory}, complexity={complexity}")
-        print(f"   Image size: {config['image_size']}, max_tokens: {config['max_tokens']}")
+        # Auto 複雜度依圖像統計決定實際配置
+        with observe_stage('preprocess', labels):
+            page_config, auto_choice = resolve_page_config(config, content_type, subcategory, img)
         
-        text = generate_with_timeout_and_process(
-            image=img_processed,
-            prompt=prompt,
-            max_tokens=config['max_tokens'],
-            timeout=160
-        )
+        print(f"📋 Processing with: content_type={content_type}, subcategory={subcategory}, complexity={complexity}, tiling={tiling}")
+        print(f"   Image size: {page_config['image_size']}, max_tokens: {page_config['max_tokens']}")
+        
+        # 根據配置進行前處理（必要時切塊）並推理
+        text = ocr_image_with_config(img, prompt, page_config, tiling=tiling, timeout=160, labels=labels)
         
         print(f"✅ OCR completed, text length: {len(text)}")
-        return jsonify({
+        return encode_response({
             'success': True,
             'text': text,
             'config': {
                 'content_type': content_type,
                 'subcategory': subcategory,
                 'complexity': complexity,
-                'image_size': config['image_size'],
-                'max_tokens': config['max_tokens']
+                'image_size': page_config['image_size'],
+                'max_tokens': page_config['max_tokens'],
+                'tiling': tiling,
+                'auto_complexity': auto_choice
             }
-        })
+        }, labels)
     
+    except AdmissionRejected:
+        raise
     except TimeoutError:
         return jsonify({'error': 'OCR processing timeout'}), 500
     except Exception as e:
@@ -1151,51 +2117,83 @@ def ocr():
 # PDF 處理 (保持不變)
 # ==============================================================================
 
-def cleanup_old_tasks():
-    now = datetime.now()
-    
-    # 清理 PDF 任務
-    expired = [tid for tid, t in pdf_tasks.items() if now - t['created_at'] > timedelta(minutes=30)]
-    for tid in expired:
-        pdf_file_path = pdf_tasks[tid].get('pdf_path')
-        if pdf_file_path and os.path.exists(pdf_file_path):
-            try:
-                os.remove(pdf_file_path)
-                print(f"🗑️ Removed expired PDF file: {pdf_file_path}")
-            except Exception as e:
-                print(f"❌ Error removing expired PDF file {pdf_file_path}: {e}")
-        del pdf_tasks[tid]
-    
-    # 清理前處理任務
-    expired = [tid for tid, t in preprocess_tasks.items() if now - t['created_at'] > timedelta(minutes=30)]
-    for tid in expired:
-        task_dir = preprocess_tasks[tid].get('task_dir')
+def remove_task_files(task):
+    """刪除任務相關的目錄與檔案"""
+    for key in ('task_dir', 'extract_dir'):
+        task_dir = task.get(key)
         if task_dir and os.path.exists(task_dir):
             try:
                 shutil.rmtree(task_dir)
-                print(f"🗑️ Removed expired preprocess task: {task_dir}")
+                print(f"🗑️ Removed task directory: {task_dir}")
             except Exception as e:
-                print(f"❌ Error removing preprocess task {task_dir}: {e}")
-        del preprocess_tasks[tid]
+                print(f"❌ Error removing task directory {task_dir}: {e}")
     
-    # 清理影片任務
-    expired = [tid for tid, t in video_tasks.items() if now - t['created_at'] > timedelta(minutes=30)]
-    for tid in expired:
-        task_dir = video_tasks[tid].get('task_dir')
-        if task_dir and os.path.exists(task_dir):
-            try:
-                shutil.rmtree(task_dir)
-                print(f"🗑️ Removed expired video task: {task_dir}")
-            except Exception as e:
-                print(f"❌ Error removing video task {task_dir}: {e}")
-        del video_tasks[tid]
-    
-    if expired:
-        print(f"🧹 Cleaned up {len(expired)} expired tasks")
+    pdf_file_path = task.get('pdf_path')
+    if pdf_file_path and os.path.exists(pdf_file_path):
+        try:
+            os.remove(pdf_file_path)
+            print(f"🗑️ Removed PDF file: {pdf_file_path}")
+        except Exception as e:
+            print(f"❌ Error removing PDF file {pdf_file_path}: {e}")
+
+def cleanup_old_tasks():
+    """清理閒置過久的 PDF / 前處理 / 影片任務"""
+    idle_seconds = TASK_TTL_MINUTES * 60
+    expired_count = 0
+    
+    for tasks in (pdf_tasks, preprocess_tasks, video_tasks):
+        for tid, task in tasks.pop_expired(idle_seconds):
+            remove_task_files(task)
+            expired_count += 1
+    
+    if expired_count:
+        print(f"🧹 Cleaned up {expired_count} expired tasks")
+    
+    if PDF_PAGE_CACHE_DAYS > 0:
+        pruned = task_store.prune_page_cache(PDF_PAGE_CACHE_DAYS * 86400)
+        if pruned:
+            print(f"🧹 Pruned {pruned} unused cached page results")
+
+_janitor_stop = threading.Event()
+_janitor_lock_file = None
+
+def _acquire_janitor_lock():
+    """共用任務儲存的多個 HTTP worker 中只有持有檔案鎖的進程清理；持有者結束時鎖自動釋放，其他進程下一輪接手"""
+    global _janitor_lock_file
+    if _janitor_lock_file is not None:
+        return True
+    import fcntl
+    lock_file = open(TASK_DB_PATH + '.janitor.lock', 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _janitor_lock_file = lock_file
+    print(f"🧹 Task janitor running in this process (pid {os.getpid()})")
+    return True
+
+def _run_task_janitor():
+    try:
+        if _acquire_janitor_lock():
+            cleanup_old_tasks()
+    except Exception as e:
+        print(f"❌ Task janitor failed: {e}")
+
+def _task_janitor_loop():
+    while not _janitor_stop.wait(TASK_JANITOR_INTERVAL):
+        _run_task_janitor()
+
+def start_task_janitor():
+    """啟動背景 janitor 執行緒，定期清理過期任務（每個進程都可呼叫，同時只有一個進程實際清理）"""
+    _run_task_janitor()
+    thread = threading.Thread(target=_task_janitor_loop, name='task-janitor', daemon=True)
+    thread.start()
+    return thread
 
 @app.route('/api/pdf/init', methods=['POST'])
 def init_pdf_task():
-    cleanup_old_tasks()
+    import fitz
     if 'file' not in request.files:
         return jsonify({'error': 'No file'}), 400
     file = request.files['file']
@@ -1214,6 +2212,11 @@ def init_pdf_task():
         subcategory = request.form.get('subcategory', 'Academic')
         complexity = request.form.get('complexity', 'Medium')
     
+    tiling = request.form.get('tiling', 'off')
+    if tiling not in TILING_MODES:
+        return jsonify({'error': f'Invalid tiling mode: {tiling}'}), 400
+    
+    labels = metric_labels(complexity)
     pdf_save_path = None
     thumbnails = []
     
@@ -1221,16 +2224,21 @@ def init_pdf_task():
         task_id = str(uuid.uuid4())
         pdf_filename = secure_filename(file.filename)
         pdf_save_path = Path(UPLOAD_FOLDER) / f"{task_id}_{pdf_filename}"
-        file.save(pdf_save_path)
+        with observe_stage('upload', labels):
+            file.save(pdf_save_path)
         print(f"📄 Saved PDF for task {task_id} to: {pdf_save_path}")
         
         doc = fitz.open(pdf_save_path)
         total_pages = len(doc)
         print(f"📄 Processing PDF with {total_pages} pages for thumbnails")
         
+        fingerprints = []
+        shared_objects = {}
         for page_num in range(total_pages):
             page = doc[page_num]
-            pix = page.get_pixmap(matrix=fitz.Matrix(1, 1))
+            fingerprints.append(pdf_page_fingerprint(doc, page, shared_objects))
+            with observe_stage('rasterize', labels):
+                pix = page.get_pixmap(matrix=fitz.Matrix(1, 1))
             img_thumb = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
             
             img_thumb.thumbnail((200, 200), Image.Resampling.LANCZOS)
@@ -1248,20 +2256,27 @@ def init_pdf_task():
         
         pdf_tasks[task_id] = {
             'pdf_path': str(pdf_save_path),
-            'thumbnails': thumbnails,
+            'task_dir': str(get_pdf_task_dir(task_id)),
             'content_type': content_type,
             'subcategory': subcategory,
             'complexity': complexity,
+            'tiling': tiling,
             'created_at': datetime.now(),
-            'total_pages': total_pages
+            'total_pages': total_pages,
+            'page_fingerprints': fingerprints
         }
         
-        print(f"✅ PDF task initialized: {task_id}, pages: {total_pages}")
+        # 先前上傳過的相同頁面（例如修訂版中未改動的頁面），處理時直接沿用結果
+        cached = task_store.cached_fingerprints(fingerprints) if PDF_PAGE_CACHE_DAYS > 0 else set()
+        unchanged_pages = sum(1 for fingerprint in fingerprints if fingerprint in cached)
+        
+        print(f"✅ PDF task initialized: {task_id}, pages: {total_pages}, unchanged from earlier uploads: {unchanged_pages}")
         
         return jsonify({
             'success': True,
             'task_id': task_id,
             'total_pages': total_pages,
+            'unchanged_pages': unchanged_pages,
             'thumbnails': thumbnails
         })
     except Exception as e:
@@ -1275,6 +2290,7 @@ def init_pdf_task():
 @app.route('/api/pdf/extract-pages', methods=['POST'])
 def extract_pdf_pages():
     """提取PDF所有頁面為圖片文件，供前處理使用"""
+    import fitz
     data = request.get_json()
     task_id = data.get('task_id')
     
@@ -1318,7 +2334,8 @@ def extract_pdf_pages():
         for page_num in range(total_pages):
             try:
                 page = doc[page_num]
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False)
+                with observe_stage('rasterize', metric_labels()):
+                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False)
                 img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
                 
                 # 保存為PNG文件
@@ -1365,9 +2382,12 @@ def extract_pdf_pages():
             doc.close()
             doc = None
         
-        # 保存提取的文件路徑到task中
-        task['extracted_images'] = image_files
-        task['extract_dir'] = str(extract_dir)
+        # 保存提取的文件路徑到task中（不含縮圖）
+        pdf_tasks.update_fields(
+            task_id,
+            extracted_images=[{k: v for k, v in f.items() if k != 'thumb_b64'} for f in image_files],
+            extract_dir=str(extract_dir)
+        )
         
         if len(image_files) == 0:
             return jsonify({'success': False, 'error': 'No pages were extracted successfully'}), 500
@@ -1407,8 +2427,12 @@ def serve_file(filepath):
         except ValueError:
             return jsonify({'error': 'Access denied: File outside upload folder'}), 403
         
-        if not file_path.exists() or not file_path.is_file():
-            return jsonify({'error': 'File not found'}), 404
+        if not file_path.is_file():
+            # 容器檔中的截圖（虛擬路徑 frames/frame.pack/frame_NNNNNN.jpg）
+            stored = frame_store.read(file_path)
+            if stored is None:
+                return jsonify({'error': 'File not found'}), 404
+            return send_file(io.BytesIO(stored[0]), mimetype=stored[1], download_name=file_path.name)
         
         return send_file(file_path)
     except Exception as e:
@@ -1417,6 +2441,7 @@ def serve_file(filepath):
 
 @app.route('/api/pdf/preview-page', methods=['POST'])
 def preview_page():
+    import fitz
     data = request.get_json()
     task_id = data.get('task_id')
     page_number = data.get('page_number', 1)
@@ -1458,8 +2483,288 @@ def preview_page():
             doc.close()
         gc.collect()
 
+# ==============================================================================
+# PDF 逐頁檢查點與渲染快取（中斷後續跑）
+# ==============================================================================
+
+def get_pdf_task_dir(task_id, task=None):
+    """PDF 任務的工作目錄（檢查點與渲染快取）"""
+    if task and task.get('task_dir'):
+        return Path(task['task_dir'])
+    return Path(UPLOAD_FOLDER) / f"pdf_{task_id}"
+
+def pdf_checkpoint_signature(content_type, subcategory, complexity, tiling, skip_blank, grounding=False):
+    """檢查點簽名：配置改變時不沿用舊結果（grounding 只在啟用時加入，既有檢查點仍然有效）"""
+    signature = {
+        'content_type': content_type,
+        'subcategory': subcategory,
+        'complexity': complexity,
+        'tiling': tiling,
+        'skip_blank': skip_blank
+    }
+    if grounding:
+        signature['grounding'] = True
+    return signature
+
+# 頁面結果另依內容指紋保存在任務儲存中，重新上傳修訂版 PDF 時未改變的頁面不再渲染與推理
+PDF_PAGE_CACHE_DAYS = float(os.environ.get('OCR_PDF_PAGE_CACHE_DAYS', 7))  # 未使用超過此天數的頁面結果清除（0 停用）
+
+def pdf_page_fingerprint(doc, page, shared):
+    """頁面內容指紋：頁面尺寸與旋轉、內容串流、引用的圖片 / Form XObject 原始資料、字型與註解
+    
+    shared 保存同一文件中多頁共用物件的雜湊。物件編號改變（例如整份重新產生）只會讓指紋不符而重新辨識。
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(page.rect), page.rotation]).encode())
+    digest.update(page.read_contents())
+    
+    def object_hash(xref):
+        if xref not in shared:
+            raw = doc.xref_stream_raw(xref) if doc.xref_is_stream(xref) else None
+            shared[xref] = hashlib.sha256(raw if raw is not None else doc.xref_object(xref).encode()).hexdigest()
+        return shared[xref]
+    
+    for xref, smask, *_, name, _, _ in page.get_images(full=True):
+        digest.update(f"image {name} {object_hash(xref)} {object_hash(smask) if smask else ''}".encode())
+    for xref, name, *_ in page.get_xobjects():
+        digest.update(f"form {name} {object_hash(xref)}".encode())
+    for _, ext, font_type, basefont, name, encoding, *_ in page.get_fonts(full=True):
+        digest.update(f"font {name} {basefont} {font_type} {ext} {encoding}".encode())
+    for annot in page.annots() or []:
+        digest.update(doc.xref_object(annot.xref).encode())
+    return digest.hexdigest()
+
+def pdf_page_cache_config(signature):
+    """頁面結果快取的設定鍵：檢查點簽名、模型後端與 prompt 任一改變都不沿用"""
+    config = {
+        'signature': signature,
+        'backend': os.environ.get('OCR_MODEL_BACKEND', 'mlx'),
+        'prompt': prompts.get('basic')
+    }
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+def _pdf_checkpoint_path(task_dir, page_num):
+    return Path(task_dir) / "checkpoints" / f"page_{page_num:05d}.json"
+
+# 檢查點記錄頁面圖像的來源：直接渲染 PDF，或客戶端前處理過的圖片
+PDF_PAGE_SOURCE = 'pdf'
+
+def processed_page_source(path):
+    """前處理圖片的來源標記（路徑 + 修改時間 + 大小），重新前處理後不沿用舊結果"""
+    stat = os.stat(path)
+    return f"processed:{path}:{stat.st_mtime_ns}:{stat.st_size}"
+
+def save_page_checkpoint(task_dir, page_num, result, signature, source=PDF_PAGE_SOURCE):
+    """以「寫入暫存檔再改名」的方式原子保存單頁結果"""
+    path = _pdf_checkpoint_path(task_dir, page_num)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'signature': signature, 'source': source, 'result': result, 'saved_at': time.time()}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def load_page_checkpoint(task_dir, page_num, signature=None, source=None):
+    """讀取單頁檢查點；不存在、損毀、簽名或圖像來源（source 為 None 時不比對）不符時返回 None"""
+    path = _pdf_checkpoint_path(task_dir, page_num)
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable checkpoint for page {page_num}: {e}")
+        return None
+    if signature is not None and checkpoint.get('signature') != signature:
+        return None
+    if source is not None and checkpoint.get('source', PDF_PAGE_SOURCE) != source:
+        return None
+    return checkpoint.get('result')
+
+def render_pdf_page(page, task_dir, page_num, render_scale):
+    """渲染 PDF 頁面，已渲染過的頁面直接從快取讀取（task_dir 為 None 時不使用快取）"""
+    import fitz
+    if task_dir is None:
+        pix = page.get_pixmap(matrix=fitz.Matrix(render_scale, render_scale), alpha=False)
+        return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    
+    cache_path = Path(task_dir) / "pages" / f"page_{page_num:05d}@{render_scale:g}x.png"
+    if cache_path.exists():
+        try:
+            img = Image.open(cache_path).convert('RGB')
+            print(f"♻️ Reusing rendered page {page_num}: {cache_path}")
+            return img
+        except Exception as e:
+            print(f"⚠️ Failed to read rendered page cache {cache_path}: {e}")
+    
+    pix = page.get_pixmap(matrix=fitz.Matrix(render_scale, render_scale), alpha=False)
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    del pix
+    
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        img.save(cache_path, 'PNG', compress_level=1)
+    except Exception as e:
+        print(f"⚠️ Failed to cache rendered page {page_num}: {e}")
+    return img
+
+# ==============================================================================
+# PDF 批次管線：渲染 → 前處理 → 推理，階段之間以有界佇列連接
+# ==============================================================================
+
+# 推理第 N 頁時同時渲染 / 前處理後面的頁面；佇列深度限制預先準備的頁數（記憶體上限），0 為逐頁依序執行
+PDF_PIPELINE_DEPTH = int(os.environ.get('OCR_PDF_PIPELINE_DEPTH', 2))
+
+OCR_PIPELINE_BUSY = metrics.Counter('ocr_pipeline_busy_seconds_total', 'Time each pipeline stage spent working (utilization = rate / rate of ocr_pipeline_seconds_total)', ('pipeline', 'stage'))
+OCR_PIPELINE_SECONDS = metrics.Counter('ocr_pipeline_seconds_total', 'Wall-clock time spent running staged pipelines', ('pipeline',))
+
+def record_pipeline_stats(name, report):
+    OCR_PIPELINE_SECONDS.inc(report['wall_seconds'], pipeline=name)
+    for stage, stats in report['stages'].items():
+        OCR_PIPELINE_BUSY.inc(stats['busy_seconds'], pipeline=name, stage=stage)
+    utilization = ', '.join(f"{stage} {stats['utilization']:.0%}" for stage, stats in report['stages'].items())
+    print(f"📊 {name} pipeline utilization over {report['wall_seconds']:.2f}s (depth {report['depth']}): {utilization}")
+
+def record_pdf_page_result(task_id, task_dir, result, signature, fingerprint=None, source=PDF_PAGE_SOURCE):
+    """逐頁保存結果：磁碟檢查點 + 任務儲存中的頁面狀態（+ 依內容指紋的頁面結果快取）"""
+    save_page_checkpoint(task_dir, result['page'], result, signature, source)
+    task_store.set_page(task_id, result['page'], 'completed', result)
+    if fingerprint and PDF_PAGE_CACHE_DAYS > 0:
+        cached = {k: v for k, v in result.items() if k not in ('page', 'cached')}
+        task_store.put_cached_page(fingerprint, pdf_page_cache_config(signature), cached)
+    return result
+
+@app.route('/api/pdf/resume', methods=['POST'])
+def resume_pdf_task():
+    """返回已完成頁面的檢查點結果，以及從第一個未完成頁面繼續的批次位置"""
+    data = request.get_json()
+    task_id = data.get('task_id')
+    batch_size = data.get('batch_size', 2)
+    
+    task = pdf_tasks.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found or expired'}), 404
+    
+    if not isinstance(batch_size, int) or batch_size <= 0:
+        return jsonify({'error': 'Invalid batch_size'}), 400
+    
+    # 依任務上次批次處理的設定重建簽名，客戶端不必重送 skip_blank / grounding
+    task_dir = get_pdf_task_dir(task_id, task)
+    signature = pdf_checkpoint_signature(
+        task['content_type'], task['subcategory'], task['complexity'],
+        task.get('tiling', 'off'), task.get('skip_blank', True), task.get('grounding', False)
+    )
+    
+    results = []
+    next_page = None
+    for page_num in range(1, task['total_pages'] + 1):
+        result = load_page_checkpoint(task_dir, page_num, signature)
+        if result is None:
+            if next_page is None:
+                next_page = page_num
+            continue
+        results.append(result)
+    
+    failed_pages = sorted(task_store.get_pages(task_id, status='failed').keys())
+    task_store.touch(task_id)
+    
+    print(f"♻️ Resume PDF task {task_id}: {len(results)}/{task['total_pages']} pages checkpointed, next page: {next_page}")
+    
+    return jsonify({
+        'success': True,
+        'task_id': task_id,
+        'total_pages': task['total_pages'],
+        'completed_pages': len(results),
+        'results': results,
+        'failed_pages': failed_pages,
+        'has_more': next_page is not None,
+        'next_page': next_page,
+        'next_batch_index': (next_page - 1) // batch_size if next_page is not None else None
+    })
+
+def parse_block_query(data):
+    """區塊查詢的共用參數：pages（頁碼列表）、types（區塊類型列表）；不合法時拋出 ValueError"""
+    pages = data.get('pages')
+    if pages is not None and (not isinstance(pages, list) or not all(isinstance(p, int) and p > 0 for p in pages)):
+        raise ValueError('pages must be a list of page numbers')
+    types = data.get('types')
+    if types is not None and (not isinstance(types, list) or not all(isinstance(t, str) for t in types)):
+        raise ValueError('types must be a list of block types')
+    return pages, types
+
+def completed_page_results(task_id, pages=None):
+    """已完成頁面的結果 {page: result}（依頁碼排序，可限定頁碼）"""
+    results = task_store.get_pages(task_id, status='completed')
+    return {
+        page: info['result'] for page, info in results.items()
+        if info['result'] is not None and (pages is None or page in pages)
+    }
+
+@app.route('/api/pdf/blocks', methods=['POST'])
+def pdf_blocks():
+    """返回已辨識頁面的版面區塊（可限定頁碼、區域 [x, y, w, h] 與類型），不重新推理"""
+    data = request.get_json() or {}
+    task_id = data.get('task_id')
+    if task_id not in pdf_tasks:
+        return jsonify({'error': 'Task not found or expired'}), 404
+    try:
+        pages, types = parse_block_query(data)
+        region = video_roi.parse_regions([data['region']])[0] if data.get('region') is not None else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    
+    results = completed_page_results(task_id, pages)
+    page_blocks = []
+    without_layout = []
+    for page, result in results.items():
+        if 'blocks' not in result and not result.get('skipped'):
+            # 未以 grounding 模式辨識的頁面只有純文字
+            without_layout.append(page)
+            continue
+        blocks = layout.select(result.get('blocks', []), region, types)
+        page_blocks.append({'page': page, 'blocks': blocks, 'text': layout.to_text(blocks)})
+    
+    task_store.touch(task_id)
+    return jsonify({
+        'success': True,
+        'task_id': task_id,
+        'pages': page_blocks,
+        'without_layout': without_layout,
+        'pending_pages': [page for page in pages or [] if page not in results]
+    })
+
+@app.route('/api/pdf/search', methods=['POST'])
+def pdf_search():
+    """在已辨識頁面中搜尋文字，返回符合的區塊與位置（沒有版面資訊的頁面返回符合的行，bbox 為 null）"""
+    data = request.get_json() or {}
+    task_id = data.get('task_id')
+    query = data.get('query')
+    if task_id not in pdf_tasks:
+        return jsonify({'error': 'Task not found or expired'}), 404
+    if not isinstance(query, str) or not query.strip():
+        return jsonify({'error': 'query is required'}), 400
+    try:
+        pages, types = parse_block_query(data)
+        limit = int(data.get('limit', 100))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    
+    hits = []
+    for page, result in completed_page_results(task_id, pages).items():
+        blocks = result['blocks'] if 'blocks' in result else layout.lines(result.get('text'))
+        hits.extend({'page': page, **block} for block in layout.search(layout.select(blocks, types=types), query))
+    
+    task_store.touch(task_id)
+    return jsonify({
+        'success': True,
+        'task_id': task_id,
+        'query': query,
+        'total_hits': len(hits),
+        'hits': hits[:max(limit, 0)]
+    })
+
 @app.route('/api/pdf/process-batch', methods=['POST'])
 def process_pdf_batch():
+    import fitz
     data = request.get_json()
     task_id = data.get('task_id')
     batch_index = data.get('batch_index', 0)
@@ -1475,14 +2780,32 @@ def process_pdf_batch():
     subcategory = task['subcategory']
     complexity = task['complexity']
     total_pages = task['total_pages']
+    tiling = data.get('tiling', task.get('tiling', 'off'))
     
     # 獲取前處理配置
     config = get_preprocessing_config(content_type, subcategory, complexity)
     if not config:
         return jsonify({'error': f'Invalid configuration: {content_type}/{subcategory}/{complexity}'}), 400
     
-    # 使用預設 prompt
-    prompt = prompts.get('basic', '<image>\nExtract all text from the image.')
+    if tiling not in TILING_MODES:
+        return jsonify({'error': f'Invalid tiling mode: {tiling}'}), 400
+    
+    try:
+        skip_blank = parse_bool(data.get('skip_blank'), True)
+        grounding = parse_bool(data.get('grounding'), False)
+        force = parse_bool(data.get('force'), False)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    try:
+        blank_thresholds = parse_blank_thresholds(data.get('blank_thresholds'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid blank_thresholds: {str(e)}'}), 400
+    
+    # 切塊的頁面以較高倍率渲染，保留大頁面細節（auto 模式逐頁判斷）
+    tile_size = tiling_reference_size(config, content_type, subcategory)
+    
+    # grounding 模式保留模型輸出的區塊類型與座標，結果附 blocks，之後可依區域 / 關鍵字查詢而不必重新推理
+    prompt = prompts['grounding'] if grounding else prompts.get('basic', '<image>\nExtract all text from the image.')
     
     start_page_idx = batch_index * batch_size
     end_page_idx = min(start_page_idx + batch_size, total_pages)
@@ -1490,83 +2813,188 @@ def process_pdf_batch():
     if not is_model_healthy():
         return jsonify({'error': 'Model not ready. Please check server status.'}), 500
     
+    labels = metric_labels(complexity)
+    
+    # 已有相同配置檢查點的頁面直接沿用（force=true 時重新辨識）
+    # 批次推理優先級：重新辨識預設為 background，不與新工作搶名額
+    priority = data.get('priority', 'background' if force else 'bulk')
+    if priority not in BATCH_PRIORITIES:
+        return jsonify({'error': f'Invalid priority: {priority}'}), 400
+    set_inference_priority(priority)
+    task_dir = get_pdf_task_dir(task_id, task)
+    signature = pdf_checkpoint_signature(content_type, subcategory, complexity, tiling, skip_blank, grounding)
+    fingerprints = task.get('page_fingerprints') or []
+    
+    # 記錄檢查點使用的設定，/api/pdf/resume 依此找回已完成的頁面
+    if (task.get('tiling'), task.get('skip_blank', True), task.get('grounding', False)) != (tiling, skip_blank, grounding):
+        pdf_tasks.update_fields(task_id, tiling=tiling, skip_blank=skip_blank, grounding=grounding)
+    cache_config = pdf_page_cache_config(signature)
+    
     results = []
     doc = None
+    page_num = None
+    
+    # ===== 修正：如果有處理後的圖片，使用處理後的圖片；否則使用原始PDF =====
+    use_processed_images = bool(processed_images)
+    
+    def rasterize(page_num):
+        """檢查點 / 空頁判斷與渲染（PyMuPDF 只在此執行緒中使用）"""
+        nonlocal doc
+        # 前處理過的圖片與原始頁面不同：檢查點須來自同一張圖片，且只有直接渲染 PDF 的頁面使用內容指紋快取
+        from_processed = use_processed_images and str(page_num) in processed_images
+        source = PDF_PAGE_SOURCE
+        if from_processed:
+            try:
+                source = processed_page_source(processed_images[str(page_num)])
+            except OSError:
+                pass  # 圖片不存在，下面回退到原始 PDF
+        if not force:
+            checkpoint = load_page_checkpoint(task_dir, page_num, signature, source)
+            if checkpoint is not None:
+                print(f"♻️ Page {page_num} restored from checkpoint")
+                return Done({**checkpoint, 'cached': True})
+        
+        fingerprint = fingerprints[page_num - 1] if page_num <= len(fingerprints) and not from_processed else None
+        if fingerprint and not force and PDF_PAGE_CACHE_DAYS > 0:
+            cached = task_store.get_cached_page(fingerprint, cache_config)
+            if cached is not None:
+                print(f"♻️ Page {page_num} unchanged (content fingerprint), reusing earlier result")
+                result = record_pdf_page_result(task_id, task_dir, {'page': page_num, **cached}, signature)
+                return Done({**result, 'cached': True})
+        
+        if from_processed:
+            # ===== 使用處理後的圖片 =====
+            processed_path = processed_images[str(page_num)]
+            print(f"📄 Loading PREPROCESSED page {page_num}/{total_pages} for OCR...")
+            
+            # 載入處理後的圖片（processed_path 是完整路徑）
+            try:
+                file_path = Path(processed_path)
+                if not file_path.exists():
+                    raise FileNotFoundError(f"Processed image not found: {processed_path}")
+                
+                img = Image.open(file_path).convert('RGB')
+                print(f"✅ Loaded preprocessed image for page {page_num}: {file_path}")
+                return {'page': page_num, 'image': img, 'fingerprint': None, 'source': source}
+            except Exception as e:
+                print(f"⚠️ Failed to load preprocessed image for page {page_num}: {e}")
+                # 回退到原始PDF
+        
+        # ===== 使用原始PDF =====
+        if doc is None:
+            doc = fitz.open(pdf_path)
+        print(f"📄 Loading page {page_num}/{total_pages} for OCR...")
+        page = doc[page_num - 1]
+        
+        # 無內容的頁面不必渲染
+        if skip_blank and is_pdf_page_empty(page):
+            print(f"⏭️ Page {page_num} has no content, skipping render and inference")
+            return Done(record_pdf_page_result(
+                task_id, task_dir, {'page': page_num, 'text': '', 'skipped': 'blank'}, signature, fingerprint
+            ))
+        
+        with observe_stage('rasterize', labels):
+            img = render_pdf_page(page, task_dir, page_num, pdf_page_render_scale(page, tile_size, tiling))
+        return {'page': page_num, 'image': img, 'fingerprint': fingerprint, 'source': PDF_PAGE_SOURCE}
+    
+    def preprocess(item):
+        """空白頁過濾、逐頁配置、尺寸調整與序列化"""
+        page_num, img = item['page'], item['image']
+        
+        # 推理前過濾空白頁
+        if skip_blank:
+            with observe_stage('preprocess', labels):
+                is_blank, blank_stats = detect_blank_page(img, blank_thresholds)
+            if is_blank:
+                print(f"⏭️ Page {page_num} is blank, skipping inference: {blank_stats}")
+                img.close()
+                return Done(record_pdf_page_result(
+                    task_id, task_dir, {'page': page_num, 'text': '', 'skipped': 'blank'}, signature,
+                    item['fingerprint'], item['source']
+                ))
+        
+        # Auto 複雜度逐頁決定配置
+        with observe_stage('preprocess', labels):
+            page_config, auto_choice = resolve_page_config(config, content_type, subcategory, img)
+        item.update(config=page_config, auto_choice=auto_choice)
+        
+        # 切塊頁面在推理階段切塊；其餘在此調整尺寸並編碼，推理階段只需送出
+        if not should_tile_image(img, page_config['image_size'], tiling):
+            with observe_stage('preprocess', labels):
+                img_processed = preprocess_image_by_config(img, page_config['image_size'])
+            item['image_bytes'] = serialize_image(img_processed, labels)
+            img_processed.close()
+            img.close()
+            item['image'] = None
+        return item
+    
+    def infer(item):
+        page_num, page_config = item['page'], item['config']
+        task_store.set_page(task_id, page_num, 'processing')
+        
+        print(f"📄 Processing page {page_num} with: {content_type}/{subcategory}/{complexity}")
+        blocks = None
+        if item['image'] is not None:
+            if grounding:
+                text, blocks = ocr_image_tiled_layout(item['image'], prompt, page_config, timeout=160, labels=labels)
+            else:
+                text = ocr_image_tiled(item['image'], prompt, page_config, timeout=160, labels=labels)
+            item['image'].close()
+        else:
+            text = generate_with_timeout_and_process(
+                image=None,
+                prompt=prompt,
+                max_tokens=page_config['max_tokens'],
+                timeout=160,
+                labels=labels,
+                image_size=page_config['image_size'],
+                image_bytes=item['image_bytes'],
+                grounding=grounding
+            )
+            if grounding:
+                blocks = layout.parse(text)
+                text = layout.to_text(blocks)
+        
+        page_result = {'page': page_num, 'text': text}
+        if blocks is not None:
+            page_result['blocks'] = blocks
+        if item['auto_choice']:
+            page_result['auto_complexity'] = item['auto_choice']
+        record_pdf_page_result(task_id, task_dir, page_result, signature, item['fingerprint'], item['source'])
+        
+        # 清理資源
+        item.clear()
+        gc.collect()
+        
+        print(f"✅ Page {page_num} completed, text length: {len(text)}")
+        return page_result
+    
+    page_pipeline = Pipeline(
+        [('rasterize', rasterize), ('preprocess', preprocess), ('inference', infer)],
+        depth=PDF_PIPELINE_DEPTH
+    )
     
     try:
-        # ===== 修正：如果有處理後的圖片，使用處理後的圖片；否則使用原始PDF =====
-        use_processed_images = bool(processed_images)
-        
         if use_processed_images:
             print(f"🔍 Processing batch {batch_index + 1} with PREPROCESSED images, pages {start_page_idx + 1}-{end_page_idx}")
             print(f"📋 Received processed_images keys: {list(processed_images.keys())}")
         else:
-            doc = fitz.open(pdf_path)
             print(f"🔍 Processing batch {batch_index + 1}, pages {start_page_idx + 1}-{end_page_idx}")
         
-        for i in range(start_page_idx, end_page_idx):
-            page_num = i + 1
-            pix = None  # 初始化 pix 變數
-            
-            if use_processed_images and str(page_num) in processed_images:
-                # ===== 使用處理後的圖片 =====
-                processed_path = processed_images[str(page_num)]
-                print(f"📄 Loading PREPROCESSED page {page_num}/{total_pages} for OCR...")
-                
-                # 載入處理後的圖片（processed_path 是完整路徑）
-                try:
-                    file_path = Path(processed_path)
-                    if not file_path.exists():
-                        raise FileNotFoundError(f"Processed image not found: {processed_path}")
-                    
-                    img = Image.open(file_path).convert('RGB')
-                    print(f"✅ Loaded preprocessed image for page {page_num}: {file_path}")
-                except Exception as e:
-                    print(f"⚠️ Failed to load preprocessed image for page {page_num}: {e}")
-                    # 回退到原始PDF
-                    if doc is None:
-                        doc = fitz.open(pdf_path)
-                    page = doc[page_num - 1]
-                    pix = page.get_pixmap(matrix=fitz.Matrix(1.5, 1.5), alpha=False)
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            else:
-                # ===== 使用原始PDF =====
-                if doc is None:
-                    doc = fitz.open(pdf_path)
-                print(f"📄 Loading page {page_num}/{total_pages} for OCR...")
-                page = doc[page_num - 1]
-                
-                pix = page.get_pixmap(matrix=fitz.Matrix(1.5, 1.5), alpha=False)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # 根據配置進行前處理（尺寸調整）
-            img_processed = preprocess_image_by_config(img, config['image_size'])
-            
-            print(f"📄 Processing page {page_num} with: {content_type}/{subcategory}/{complexity}")
-            text = generate_with_timeout_and_process(
-                image=img_processed,
-                prompt=prompt,
-                max_tokens=config['max_tokens'],
-                timeout=160
-            )
-            
-            results.append({'page': page_num, 'text': text})
-            
-            # 清理資源
-            img.close()
-            if pix is not None:
-                del pix
-            del img
-            gc.collect()
-
-            print(f"✅ Page {page_num} completed, text length: {len(text)}")
+        # 結果依頁碼順序產生；失敗時例外在失敗頁的位置拋出，page_num 即為失敗頁
+        outputs = page_pipeline.run(range(start_page_idx + 1, end_page_idx + 1))
+        for page_num in range(start_page_idx + 1, end_page_idx + 1):
+            results.append(next(outputs))
+        page_pipeline.close()
+        pipeline_stats = page_pipeline.report()
+        record_pipeline_stats('pdf', pipeline_stats)
         
         has_more = end_page_idx < total_pages
         next_batch = batch_index + 1 if has_more else None
         
         print(f"✅ Batch {batch_index + 1} completed, processed: {end_page_idx}/{total_pages}")
         
-        return jsonify({
+        return encode_response({
             'success': True,
             'results': results,
             'has_more': has_more,
@@ -1576,16 +3004,29 @@ def process_pdf_batch():
                 'content_type': content_type,
                 'subcategory': subcategory,
                 'complexity': complexity,
-                'image_size': config['image_size'],
-                'max_tokens': config['max_tokens']
-            }
-        })
+                **batch_config_sizes(config),
+                'tiling': tiling,
+                'skip_blank': skip_blank,
+                'grounding': grounding,
+                'priority': priority
+            },
+            'pipeline': pipeline_stats
+        }, labels)
+    except AdmissionRejected:
+        # 未開始推理，頁面回到待處理，客戶端依 Retry-After 重送同一批次即可
+        task_store.set_page(task_id, page_num, 'pending')
+        raise
     except TimeoutError:
+        task_store.set_page(task_id, page_num, 'failed', {'page': page_num, 'error': 'OCR processing timeout'})
         return jsonify({'error': 'OCR processing timeout'}), 500
     except Exception as e:
         traceback.print_exc()
+        if page_num is not None:
+            task_store.set_page(task_id, page_num, 'failed', {'page': page_num, 'error': str(e)})
         return jsonify({'error': f'Batch processing failed: {str(e)}'}), 500
     finally:
+        # 先等渲染執行緒結束再關閉文件
+        page_pipeline.close()
         if doc:
             doc.close()
         gc.collect()
@@ -1597,9 +3038,11 @@ def process_video_batch():
     batch_index = data.get('batch_index', 0)
     batch_size = data.get('batch_size', 2)
     processed_images = data.get('processed_images', {})  # 處理後的圖片路徑映射
+    timestamps = data.get('timestamps') or {}  # 截圖編號 → 影片時間（秒），來自 /api/video/extract
     content_type = data.get('content_type', 'Document')
     subcategory = data.get('subcategory', 'Academic')
     complexity = data.get('complexity', 'Medium')
+    tiling = data.get('tiling', 'off')
     
     if not processed_images:
         return jsonify({'error': 'No processed images provided'}), 400
@@ -1609,6 +3052,23 @@ def process_video_batch():
     if not config:
         return jsonify({'error': f'Invalid configuration: {content_type}/{subcategory}/{complexity}'}), 400
     
+    if tiling not in TILING_MODES:
+        return jsonify({'error': f'Invalid tiling mode: {tiling}'}), 400
+    
+    try:
+        skip_blank = parse_bool(data.get('skip_blank'), True)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid skip_blank: {str(e)}'}), 400
+    try:
+        blank_thresholds = parse_blank_thresholds(data.get('blank_thresholds'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid blank_thresholds: {str(e)}'}), 400
+    
+    priority = data.get('priority', 'bulk')
+    if priority not in BATCH_PRIORITIES:
+        return jsonify({'error': f'Invalid priority: {priority}'}), 400
+    set_inference_priority(priority)
+    
     # 使用預設 prompt
     prompt = prompts.get('basic', '<image>\nExtract all text from the image.')
     
@@ -1622,6 +3082,7 @@ def process_video_batch():
     if not is_model_healthy():
         return jsonify({'error': 'Model not ready. Please check server status.'}), 500
     
+    labels = metric_labels(complexity)
     results = []
     
     try:
@@ -1633,34 +3094,47 @@ def process_video_batch():
                 
             frame_num = frame_numbers[i]
             processed_path = processed_images[str(frame_num)]
+            frame_record = {'page': frame_num}
+            if timestamps.get(str(frame_num)) is not None:
+                frame_record['timestamp'] = timestamps[str(frame_num)]
             
             print(f"📄 Loading PREPROCESSED frame {frame_num}/{total_frames} for OCR...")
             
             # 載入處理後的圖片
             try:
                 file_path = Path(processed_path)
-                if not file_path.exists():
+                if not frame_store.exists(file_path):
                     raise FileNotFoundError(f"Processed image not found: {processed_path}")
                 
-                img = Image.open(file_path).convert('RGB')
+                img = frame_store.open_image(file_path).convert('RGB')
                 print(f"✅ Loaded preprocessed image for frame {frame_num}: {file_path}")
             except Exception as e:
                 print(f"⚠️ Failed to load preprocessed image for frame {frame_num}: {e}")
-                results.append({'page': frame_num, 'text': '', 'error': str(e)})
+                results.append({**frame_record, 'text': '', 'error': str(e)})
                 continue
             
-            # 根據配置進行前處理（尺寸調整）
-            img_processed = preprocess_image_by_config(img, config['image_size'])
+            # 推理前過濾空白幀（黑幀、轉場、純色投影片）
+            if skip_blank:
+                with observe_stage('preprocess', labels):
+                    is_blank, blank_stats = detect_blank_page(img, blank_thresholds)
+                if is_blank:
+                    print(f"⏭️ Frame {frame_num} is blank, skipping inference: {blank_stats}")
+                    results.append({**frame_record, 'text': '', 'skipped': 'blank'})
+                    img.close()
+                    continue
+            
+            # Auto 複雜度逐幀決定配置
+            with observe_stage('preprocess', labels):
+                page_config, auto_choice = resolve_page_config(config, content_type, subcategory, img)
             
+            # 根據配置進行前處理（尺寸調整或切塊）並推理
             print(f"📄 Processing frame {frame_num} with: {content_type}/{subcategory}/{complexity}")
-            text = generate_with_timeout_and_process(
-                image=img_processed,
-                prompt=prompt,
-                max_tokens=config['max_tokens'],
-                timeout=160
-            )
+            text = ocr_image_with_config(img, prompt, page_config, tiling=tiling, timeout=160, labels=labels)
             
-            results.append({'page': frame_num, 'text': text})
+            page_result = {**frame_record, 'text': text}
+            if auto_choice:
+                page_result['auto_complexity'] = auto_choice
+            results.append(page_result)
             
             # 清理資源
             img.close()
@@ -1674,7 +3148,7 @@ def process_video_batch():
         
         print(f"✅ Video batch {batch_index + 1} completed, processed: {end_idx}/{total_frames}")
         
-        return jsonify({
+        return encode_response({
             'success': True,
             'results': results,
             'has_more': has_more,
@@ -1684,10 +3158,14 @@ def process_video_batch():
                 'content_type': content_type,
                 'subcategory': subcategory,
                 'complexity': complexity,
-                'image_size': config['image_size'],
-                'max_tokens': config['max_tokens']
+                **batch_config_sizes(config),
+                'tiling': tiling,
+                'skip_blank': skip_blank,
+                'priority': priority
             }
-        })
+        }, labels)
+    except AdmissionRejected:
+        raise
     except TimeoutError:
         return jsonify({'error': 'OCR processing timeout'}), 500
     except Exception as e:
@@ -1700,14 +3178,9 @@ def process_video_batch():
 def cancel_pdf_task():
     data = request.get_json()
     task_id = data.get('task_id')
-    if task_id in pdf_tasks:
-        pdf_file_path = pdf_tasks[task_id].get('pdf_path')
-        if pdf_file_path and os.path.exists(pdf_file_path):
-            try:
-                os.remove(pdf_file_path)
-                print(f"🗑️ Removed PDF file for cancelled task: {pdf_file_path}")
-            except Exception as e:
-                print(f"❌ Error removing PDF file for cancelled task {pdf_file_path}: {e}")
+    task = pdf_tasks.get(task_id)
+    if task is not None:
+        remove_task_files(task)
         del pdf_tasks[task_id]
         gc.collect()
         print(f"❌ PDF task cancelled: {task_id}")
@@ -1716,30 +3189,12 @@ def cancel_pdf_task():
 
 def cleanup():
     print("🧹 Cleaning up resources on application exit...")
-    model_loaded_status.value = False
-    
-    # 清理所有任務
-    for task_dict in [pdf_tasks, preprocess_tasks, video_tasks]:
-        for task_id in list(task_dict.keys()):
-            task = task_dict[task_id]
-            task_dir = task.get('task_dir')
-            pdf_path = task.get('pdf_path')
-            
-            if task_dir and os.path.exists(task_dir):
-                try:
-                    shutil.rmtree(task_dir)
-                    print(f"🗑️ Removed task directory: {task_dir}")
-                except Exception as e:
-                    print(f"❌ Error removing task directory {task_dir}: {e}")
-            
-            if pdf_path and os.path.exists(pdf_path):
-                try:
-                    os.remove(pdf_path)
-                    print(f"🗑️ Removed PDF file: {pdf_path}")
-                except Exception as e:
-                    print(f"❌ Error removing PDF file {pdf_path}: {e}")
-            
-            del task_dict[task_id]
+    
+    # 先等待進行中的推理完成（不再接受新推理），再關閉 worker 與任務儲存
+    # 任務保存在 SQLite 中，重啟後可繼續使用；過期任務交由 janitor 清理
+    inference_backend.shutdown(drain_timeout=OCR_DRAIN_TIMEOUT)
+    _janitor_stop.set()
+    task_store.close()
     
     gc.collect()
     print("✅ All resources cleaned up.")
@@ -1754,6 +3209,8 @@ if __name__ == '__main__':
         print("❌ CRITICAL: Model preload status setting failed. Cannot start application.")
         sys.exit(1)
     
+    start_task_janitor()
+    
     print("✅ Application starting on http://0.0.0.0:5001")
     print("\n📊 Enhanced Features:")
     print("   - 📄 OCR 辨識 (現有功能)")
@@ -0,0 +1,8 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""離線基準測試：以確定性的替身模型跑完整 OCR 管線（python -m bench.run）"""
@@ -0,0 +1,70 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""合成測試資料：文字圖片、多頁 PDF、字幕影片（固定亂數種子，每次產生相同內容）"""
+
+import io
+import random
+
+import cv2
+import fitz
+import numpy as np
+from PIL import Image
+
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit',
+         'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna')
+
+
+def _sentence(rng, words=8):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_text_image(width=1600, height=1200, lines=30, seed=0):
+    """白底黑字的文字頁面（PNG bytes）"""
+    rng = random.Random(seed)
+    canvas = np.full((height, width, 3), 255, dtype=np.uint8)
+    line_height = max(1, (height - 80) // lines)
+    scale = max(0.4, line_height / 40)
+    for i in range(lines):
+        y = 60 + i * line_height
+        cv2.putText(canvas, _sentence(rng, 10), (40, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 2, cv2.LINE_AA)
+    buffered = io.BytesIO()
+    Image.fromarray(canvas).save(buffered, format='PNG')
+    return buffered.getvalue()
+
+
+def make_pdf(pages=4, lines=40, seed=0):
+    """多頁文字 PDF（bytes）"""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    try:
+        for _ in range(pages):
+            page = doc.new_page()
+            for i in range(lines):
+                page.insert_text((48, 60 + i * 17), _sentence(rng, 9), fontsize=11)
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def make_video(path, seconds=10, fps=10, width=640, height=360, seed=0):
+    """每秒換一行字幕的影片，寫入 path（mp4v 編碼）"""
+    rng = random.Random(seed)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError('OpenCV VideoWriter cannot encode mp4v on this system')
+    try:
+        for second in range(seconds):
+            caption = _sentence(rng, 5)
+            for frame_idx in range(fps):
+                frame = np.full((height, width, 3), 40 + (frame_idx * 3) % 30, dtype=np.uint8)
+                cv2.putText(frame, caption, (20, height - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2, cv2.LINE_AA)
+                cv2.putText(frame, f'{second:02d}s', (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (200, 200, 0), 2, cv2.LINE_AA)
+                writer.write(frame)
+    finally:
+        writer.release()
+    return path
@@ -0,0 +1,139 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""啟動時間基準：模組匯入耗時與 worker 暖機完成時間
+
+用法：
+    python -m bench.import_time
+    python -m bench.import_time --repeat 10 --output import_time.json
+
+每次量測都在全新的 Python 進程中執行（python -X importtime），報告：
+    - app / ocr_worker 匯入的中位數耗時，以及匯入後已載入的重量級模組
+    - 匯入耗時最多的前幾個模組
+    - 從 preload_model_main_process() 到第一個 worker 就緒的時間（替身模型）
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ('cv2', 'fitz', 'numpy', 'mlx', 'mlx_vlm', 'flask')
+
+_PROBE = '''
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+_READY_PROBE = '''
+import json, time
+t0 = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.preload_model_main_process()
+while not app.worker_pool.is_ready():
+    time.sleep(0.01)
+ready = time.perf_counter()
+print(json.dumps({'import_seconds': imported - t0, 'first_worker_ready_seconds': ready - imported}))
+app.worker_pool.shutdown()
+'''
+
+
+def _env(workdir):
+    return dict(
+        os.environ,
+        OCR_TASK_DB=os.path.join(workdir, 'tasks.sqlite3'),
+        OCR_MODEL_BACKEND='stub',
+        PYTHONPATH=str(REPO_ROOT)
+    )
+
+
+def _run(args, workdir):
+    completed = subprocess.run(
+        [sys.executable] + args, cwd=REPO_ROOT, env=_env(workdir),
+        capture_output=True, text=True, check=True
+    )
+    return completed
+
+
+def _last_json_line(stdout):
+    return json.loads([line for line in stdout.splitlines() if line.startswith('{')][-1])
+
+
+def measure_import(module, repeat, workdir):
+    samples = []
+    loaded = []
+    for _ in range(repeat):
+        result = _last_json_line(_run(['-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)], workdir).stdout)
+        samples.append(result['seconds'])
+        loaded = result['loaded']
+    return {
+        'median_seconds': round(statistics.median(samples), 4),
+        'min_seconds': round(min(samples), 4),
+        'heavy_modules_loaded': loaded
+    }
+
+
+def top_imports(module, workdir, limit=10):
+    """-X importtime 的累計耗時排行（只列頂層套件）"""
+    stderr = _run(['-X', 'importtime', '-c', f'import {module}'], workdir).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = [part.strip() for part in line[len('import time:'):].split('|')]
+        if not parts[1].isdigit():
+            continue
+        name = parts[2]
+        if name.startswith(' ') or '.' in name:
+            continue
+        totals[name] = max(totals.get(name, 0), int(parts[1]))
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+    return [{'module': name, 'cumulative_ms': round(us / 1000, 1)} for name, us in ranked]
+
+
+def measure_ready(repeat, workdir):
+    samples = [_last_json_line(_run(['-c', _READY_PROBE], workdir).stdout) for _ in range(repeat)]
+    return {
+        'import_median_seconds': round(statistics.median(s['import_seconds'] for s in samples), 4),
+        'first_worker_ready_median_seconds': round(statistics.median(s['first_worker_ready_seconds'] for s in samples), 4)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure server import time and worker warm-up time')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='JSON 報告輸出路徑（預設 stdout）')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='bench_import_') as workdir:
+        report = {
+            'python': sys.version.split()[0],
+            'repeat': args.repeat,
+            'imports': {module: measure_import(module, args.repeat, workdir) for module in ('app', 'ocr_worker')},
+            'top_imports': {module: top_imports(module, workdir) for module in ('app', 'ocr_worker')},
+            'startup': measure_ready(max(1, args.repeat // 2), workdir)
+        }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n', encoding='utf-8')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,577 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""完整 OCR 管線的離線基準測試
+
+用法：
+    python -m bench.run                              # 執行全部情境，JSON 輸出到 stdout
+    python -m bench.run --scenarios ocr_image pdf_batch --iterations 10 --output bench.json
+
+每個情境在獨立的 spawn 進程中以 Flask test client 執行（OCR worker 以 OCR_MODEL_BACKEND=stub
+使用替身模型取代 mlx_vlm.generate），等 worker 暖機完成後才開始計時，
+報告吞吐量、p50/p95 延遲與峰值 RSS（情境進程本身與其 OCR worker 進程分開統計）。
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from bench import fixtures
+
+# OCR worker 進程繼承此環境變數，載入替身模型
+os.environ['OCR_MODEL_BACKEND'] = 'stub'
+
+SCENARIOS = ('ocr_image', 'pdf_batch', 'pdf_pipeline', 'pdf_reupload', 'preprocess', 'video_extract', 'video_decode', 'video_ocr', 'mixed')
+
+
+# ==============================================================================
+# 統計
+# ==============================================================================
+
+def percentile(values, pct):
+    """線性插值百分位數"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def _maxrss_mb(who):
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux 單位為 KB，macOS 為 bytes
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def summarize(name, latencies, units, unit_name, wall, errors):
+    return {
+        'scenario': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'units': units,
+        'unit': unit_name,
+        'wall_seconds': round(wall, 4),
+        'throughput_per_second': round(units / wall, 4) if wall > 0 else None,
+        'latency_p50_seconds': round(percentile(latencies, 50), 4) if latencies else None,
+        'latency_p95_seconds': round(percentile(latencies, 95), 4) if latencies else None,
+        'latency_mean_seconds': round(sum(latencies) / len(latencies), 4) if latencies else None,
+        'peak_rss_mb': round(_maxrss_mb(resource.RUSAGE_SELF), 1),
+        'peak_child_rss_mb': round(_maxrss_mb(resource.RUSAGE_CHILDREN), 1)
+    }
+
+
+class Timer:
+    """累計每個請求的延遲與錯誤數"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    def call(self, fn, *args, **kwargs):
+        start = time.perf_counter()
+        response = fn(*args, **kwargs)
+        self.latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            self.errors += 1
+            print(f"⚠️ {response.status_code}: {response.get_data(as_text=True)[:200]}", file=sys.stderr)
+        return response
+
+
+# ==============================================================================
+# 情境
+# ==============================================================================
+
+def bench_ocr_image(client, options):
+    image_bytes = fixtures.make_text_image(seed=1)
+    timer = Timer()
+    start = time.perf_counter()
+    for _ in range(options['iterations']):
+        timer.call(client.post, '/api/ocr', data={
+            'file': (io.BytesIO(image_bytes), 'page.png'),
+            'content_type': 'Document',
+            'subcategory': 'Academic',
+            'complexity': 'Medium'
+        })
+    wall = time.perf_counter() - start
+    return summarize('ocr_image', timer.latencies, options['iterations'], 'images', wall, timer.errors)
+
+
+def bench_pdf_batch(client, options):
+    pages = options['pdf_pages']
+    pdf_bytes = fixtures.make_pdf(pages=pages, seed=2)
+    timer = Timer()
+    units = 0
+    start = time.perf_counter()
+    for _ in range(options['iterations']):
+        init = timer.call(client.post, '/api/pdf/init', data={
+            'file': (io.BytesIO(pdf_bytes), 'doc.pdf'),
+            'complexity': 'Small'
+        })
+        task_id = init.get_json().get('task_id')
+        batch_index = 0
+        while batch_index is not None:
+            response = timer.call(client.post, '/api/pdf/process-batch', json={
+                'task_id': task_id,
+                'batch_index': batch_index,
+                'batch_size': 2
+            })
+            data = response.get_json() or {}
+            units += len(data.get('results', []))
+            batch_index = data.get('next_batch_index')
+        client.post('/api/pdf/cancel', json={'task_id': task_id})
+    wall = time.perf_counter() - start
+    return summarize('pdf_batch', timer.latencies, units, 'pages', wall, timer.errors)
+
+
+def _run_pdf_pipeline(client, pdf_bytes, iterations, timer):
+    """每次建立新任務（不沿用檢查點 / 渲染快取；頁面結果快取在情境進程中停用），整份 PDF 一個批次；返回頁數與各階段利用率"""
+    pages = 0
+    utilization = {}
+    for _ in range(iterations):
+        init = timer.call(client.post, '/api/pdf/init', data={
+            'file': (io.BytesIO(pdf_bytes), 'doc.pdf'),
+            'complexity': 'Small'
+        })
+        task_id = init.get_json().get('task_id')
+        response = timer.call(client.post, '/api/pdf/process-batch', json={
+            'task_id': task_id,
+            'batch_index': 0,
+            'batch_size': init.get_json().get('total_pages', 1)
+        })
+        data = response.get_json() or {}
+        pages += len(data.get('results', []))
+        for stage, stats in (data.get('pipeline') or {}).get('stages', {}).items():
+            utilization.setdefault(stage, []).append(stats['utilization'])
+        client.post('/api/pdf/cancel', json={'task_id': task_id})
+    return pages, {stage: round(sum(values) / len(values), 3) for stage, values in utilization.items()}
+
+
+def bench_pdf_pipeline(client, options):
+    """同一份 PDF 分別以逐頁依序（深度 0）與管線化（渲染 / 前處理 / 推理重疊）處理，比較吞吐量"""
+    import app as ocr_app
+    pdf_bytes = fixtures.make_pdf(pages=options['pipeline_pages'], seed=6)
+    depth = ocr_app.PDF_PIPELINE_DEPTH or 2
+
+    ocr_app.PDF_PIPELINE_DEPTH = 0
+    sequential_timer = Timer()
+    start = time.perf_counter()
+    sequential_pages, sequential_utilization = _run_pdf_pipeline(client, pdf_bytes, options['iterations'], sequential_timer)
+    sequential_wall = time.perf_counter() - start
+
+    ocr_app.PDF_PIPELINE_DEPTH = depth
+    timer = Timer()
+    start = time.perf_counter()
+    units, pipelined_utilization = _run_pdf_pipeline(client, pdf_bytes, options['iterations'], timer)
+    wall = time.perf_counter() - start
+
+    result = summarize('pdf_pipeline', timer.latencies, units, 'pages', wall, timer.errors + sequential_timer.errors)
+    sequential_throughput = sequential_pages / sequential_wall if sequential_wall > 0 else None
+    result.update({
+        'pipeline_depth': depth,
+        'sequential_throughput_per_second': round(sequential_throughput, 4) if sequential_throughput else None,
+        'speedup': round(result['throughput_per_second'] / sequential_throughput, 3) if sequential_throughput and result['throughput_per_second'] else None,
+        'stage_utilization': {'sequential': sequential_utilization, 'pipelined': pipelined_utilization}
+    })
+    return result
+
+
+def bench_pdf_reupload(client, options):
+    """頁面結果快取：每次上傳一份新的 PDF，再重新上傳相同內容，比較兩次處理的吞吐量"""
+    import app as ocr_app
+    ocr_app.PDF_PAGE_CACHE_DAYS = 7  # 其他情境停用快取，只有此情境刻意量測命中
+
+    timers = {'first': Timer(), 'reupload': Timer()}
+    walls = {'first': 0.0, 'reupload': 0.0}
+    pages = {'first': 0, 'reupload': 0}
+    unchanged = 0
+    cached = 0
+    for i in range(options['iterations']):
+        pdf_bytes = fixtures.make_pdf(pages=options['pipeline_pages'], seed=100 + i)
+        for upload in ('first', 'reupload'):
+            timer = timers[upload]
+            start = time.perf_counter()
+            init = timer.call(client.post, '/api/pdf/init', data={
+                'file': (io.BytesIO(pdf_bytes), 'doc.pdf'),
+                'complexity': 'Small'
+            })
+            init_data = init.get_json() or {}
+            task_id = init_data.get('task_id')
+            response = timer.call(client.post, '/api/pdf/process-batch', json={
+                'task_id': task_id,
+                'batch_index': 0,
+                'batch_size': init_data.get('total_pages', 1)
+            })
+            walls[upload] += time.perf_counter() - start
+            results = (response.get_json() or {}).get('results', [])
+            pages[upload] += len(results)
+            if upload == 'reupload':
+                unchanged += init_data.get('unchanged_pages', 0)
+                cached += sum(1 for result in results if result.get('cached'))
+            client.post('/api/pdf/cancel', json={'task_id': task_id})
+
+    result = summarize('pdf_reupload', timers['reupload'].latencies, pages['reupload'], 'pages', walls['reupload'],
+                       timers['first'].errors + timers['reupload'].errors)
+    first_throughput = pages['first'] / walls['first'] if walls['first'] > 0 else None
+    result.update({
+        'first_upload_throughput_per_second': round(first_throughput, 4) if first_throughput else None,
+        'speedup': round(result['throughput_per_second'] / first_throughput, 3) if first_throughput and result['throughput_per_second'] else None,
+        'unchanged_pages': unchanged,
+        'cached_pages': cached
+    })
+    return result
+
+
+def bench_preprocess(client, options):
+    images = [fixtures.make_text_image(1200, 900, lines=20, seed=10 + i) for i in range(options['preprocess_images'])]
+    settings = {'auto_rotate': True, 'enhance': True, 'remove_shadows': True, 'binarize': True}
+    timer = Timer()
+    units = 0
+    start = time.perf_counter()
+    for _ in range(options['iterations']):
+        upload = timer.call(client.post, '/api/preprocess/upload', data={
+            'files': [(io.BytesIO(b), f'img_{i}.png') for i, b in enumerate(images)]
+        })
+        task_id = upload.get_json().get('task_id')
+        response = timer.call(client.post, '/api/preprocess/process', json={'task_id': task_id, 'settings': settings})
+        units += sum(1 for r in (response.get_json() or {}).get('results', []) if r.get('status') == 'completed')
+    wall = time.perf_counter() - start
+    return summarize('preprocess', timer.latencies, units, 'images', wall, timer.errors)
+
+
+def bench_video_extract(client, options):
+    video_path = fixtures.make_video(Path(tempfile.gettempdir()) / 'bench_video.mp4', seconds=options['video_seconds'], seed=3)
+    video_bytes = Path(video_path).read_bytes()
+    timer = Timer()
+    units = 0
+    start = time.perf_counter()
+    for _ in range(options['iterations']):
+        upload = timer.call(client.post, '/api/video/upload', data={'file': (io.BytesIO(video_bytes), 'clip.mp4')})
+        task_id = upload.get_json().get('task_id')
+        response = timer.call(client.post, '/api/video/extract', json={
+            'task_id': task_id,
+            'settings': {'method': 'fixed_count', 'total_frames': options['video_frames']}
+        })
+        units += (response.get_json() or {}).get('total_frames', 0)
+    wall = time.perf_counter() - start
+    return summarize('video_extract', timer.latencies, units, 'frames', wall, timer.errors)
+
+
+def bench_video_decode(client, options):
+    """截圖解碼吞吐量：逐張 seek + 依序編碼（原本的做法）對比背景解碼 + 編碼執行緒池、分段多進程"""
+    import video_decoder
+    seconds = options['decode_seconds']
+    video_path = fixtures.make_video(
+        Path(tempfile.gettempdir()) / 'bench_video_decode.mp4', seconds=seconds, fps=30, width=1280, height=720, seed=11
+    )
+    cases = {
+        'fixed_interval': {'method': 'fixed_interval', 'interval': 5},
+        'scene_change': {'method': 'scene_change', 'sensitivity': 0.5}
+    }
+    modes = {
+        'sequential': {'seek_gap': 0, 'prefetch_depth': 0, 'encode_workers': 0, 'processes': 1},
+        'threaded': {'prefetch_depth': 8, 'encode_workers': 2, 'processes': 1},
+        'segmented': {'prefetch_depth': 8, 'encode_workers': 2, 'processes': options['decode_processes'], 'segment_seconds': 0}
+    }
+    by_mode = {}
+    result = None
+    for mode, config in modes.items():
+        latencies = []
+        frames = 0
+        start = time.perf_counter()
+        case_fps = {}
+        for case, settings in cases.items():
+            case_start = time.perf_counter()
+            case_frames = 0
+            for _ in range(options['iterations']):
+                output_dir = tempfile.mkdtemp(prefix='bench_frames_')
+                call_start = time.perf_counter()
+                extracted = video_decoder.extract_frames(video_path, output_dir, **settings, **config)
+                latencies.append(time.perf_counter() - call_start)
+                case_frames += len(extracted)
+                shutil.rmtree(output_dir, ignore_errors=True)
+            case_wall = time.perf_counter() - case_start
+            case_fps[case] = {
+                'frames_per_second': round(case_frames / case_wall, 2),
+                'video_seconds_per_second': round(seconds * options['iterations'] / case_wall, 2)
+            }
+            frames += case_frames
+        wall = time.perf_counter() - start
+        by_mode[mode] = dict(case_fps, wall_seconds=round(wall, 4))
+        if mode == 'threaded':
+            result = summarize('video_decode', latencies, frames, 'frames', wall, 0)
+    # 截圖儲存方式：檔案數、磁碟用量與截圖時間（背景解碼 + 編碼執行緒池，固定間隔）
+    by_storage = {}
+    for name, store in {
+        'files_jpeg': {'storage': 'files', 'image_format': 'jpeg', 'quality': 95},
+        'pack_jpeg': {'storage': 'pack', 'image_format': 'jpeg', 'quality': 95},
+        'pack_webp': {'storage': 'pack', 'image_format': 'webp', 'quality': options['frame_quality']}
+    }.items():
+        output_dir = tempfile.mkdtemp(prefix='bench_frames_')
+        call_start = time.perf_counter()
+        extracted = video_decoder.extract_frames(video_path, output_dir, **cases['fixed_interval'], **modes['threaded'], **store)
+        elapsed = time.perf_counter() - call_start
+        paths = [os.path.join(output_dir, entry) for entry in os.listdir(output_dir)]
+        by_storage[name] = {
+            'frames': len(extracted),
+            'files': len(paths),
+            'bytes': sum(os.path.getsize(path) for path in paths),
+            'wall_seconds': round(elapsed, 4)
+        }
+        shutil.rmtree(output_dir, ignore_errors=True)
+    result.update({
+        'cpu_count': os.cpu_count(),
+        'by_mode': by_mode,
+        'by_storage': by_storage,
+        'speedup_vs_sequential': {
+            mode: round(by_mode['sequential']['wall_seconds'] / by_mode[mode]['wall_seconds'], 3)
+            for mode in ('threaded', 'segmented')
+        }
+    })
+    return result
+
+
+def _video_ocr_legacy(client, task_id, settings, timer):
+    """截圖寫入 JPEG → 依路徑分批 OCR（網頁端原本的流程，不含瀏覽器上傳）"""
+    response = timer.call(client.post, '/api/video/extract', json={'task_id': task_id, 'settings': settings})
+    frames = (response.get_json() or {}).get('frames', [])
+    processed_images = {str(frame['index']): frame['path'] for frame in frames}
+    frames_done = 0
+    batch_index = 0
+    while batch_index is not None:
+        response = timer.call(client.post, '/api/video/process-batch', json={
+            'batch_index': batch_index, 'batch_size': 2, 'complexity': 'Small',
+            'processed_images': processed_images
+        })
+        data = response.get_json() or {}
+        frames_done += len(data.get('results', []))
+        batch_index = data.get('next_batch_index')
+    return frames_done, len(frames)
+
+
+def _video_ocr_stream(client, task_id, settings, timer, dedup_threshold=None):
+    body = {'task_id': task_id, 'settings': settings, 'complexity': 'Small'}
+    if dedup_threshold is not None:
+        body['dedup_threshold'] = dedup_threshold
+
+    def post_stream(*args, **kwargs):
+        # 串流回應在讀取時才產生，計時包含整個回應本體
+        response = client.post(*args, **kwargs)
+        response.get_data()
+        return response
+
+    response = timer.call(post_stream, '/api/video/ocr-stream', json=body)
+    done = json.loads(response.get_data(as_text=True).splitlines()[-1])
+    return done.get('frames', 0), done.get('ocr', 0)
+
+
+def bench_video_ocr(client, options):
+    """影片 OCR 端到端：中間 JPEG + 分批（legacy）對比記憶體串流（不去重 / 去重 / 去重 + 自動文字區域）"""
+    video_path = fixtures.make_video(Path(tempfile.gettempdir()) / 'bench_video_ocr.mp4', seconds=options['video_seconds'], seed=7)
+    video_bytes = Path(video_path).read_bytes()
+    settings = {'method': 'fixed_count', 'total_frames': options['video_frames']}
+    modes = {
+        'legacy': lambda task_id, timer: _video_ocr_legacy(client, task_id, settings, timer),
+        'stream': lambda task_id, timer: _video_ocr_stream(client, task_id, settings, timer, dedup_threshold=0),
+        'stream_dedup': lambda task_id, timer: _video_ocr_stream(client, task_id, settings, timer),
+        'stream_roi': lambda task_id, timer: _video_ocr_stream(client, task_id, dict(settings, roi={'mode': 'auto'}), timer)
+    }
+    walls = {}
+    ocr_frames = {}
+    result = None
+    for mode, run in modes.items():
+        timer = Timer()
+        frames = 0
+        inferred = 0
+        start = time.perf_counter()
+        for _ in range(options['iterations']):
+            upload = timer.call(client.post, '/api/video/upload', data={'file': (io.BytesIO(video_bytes), 'clip.mp4')})
+            task_id = upload.get_json().get('task_id')
+            done, ocr = run(task_id, timer)
+            frames += done
+            inferred += ocr
+        walls[mode] = time.perf_counter() - start
+        ocr_frames[mode] = inferred
+        if mode == 'stream_dedup':
+            result = summarize('video_ocr', timer.latencies, frames, 'frames', walls[mode], timer.errors)
+    result.update({
+        'wall_seconds_by_mode': {mode: round(wall, 4) for mode, wall in walls.items()},
+        'ocr_frames_by_mode': ocr_frames,
+        'speedup_vs_legacy': {mode: round(walls['legacy'] / walls[mode], 3) for mode in ('stream', 'stream_dedup', 'stream_roi')}
+    })
+    return result
+
+def bench_mixed(client, options):
+    """大型 PDF 以 bulk 優先級持續處理時，量測互動式 /api/ocr 的延遲"""
+    pdf_bytes = fixtures.make_pdf(pages=options['mixed_pdf_pages'], seed=4)
+    image_bytes = fixtures.make_text_image(seed=5)
+    stop = threading.Event()
+    bulk_started = threading.Event()
+    bulk = {'pages': 0, 'errors': 0}
+
+    def run_bulk():
+        bulk_client = client.application.test_client()
+        init = bulk_client.post('/api/pdf/init', data={'file': (io.BytesIO(pdf_bytes), 'bulk.pdf'), 'complexity': 'Small'})
+        task_id = init.get_json().get('task_id')
+        batch_index = 0
+        while batch_index is not None and not stop.is_set():
+            bulk_started.set()
+            response = bulk_client.post('/api/pdf/process-batch', json={
+                'task_id': task_id, 'batch_index': batch_index, 'batch_size': 2
+            })
+            data = response.get_json() or {}
+            if response.status_code != 200:
+                bulk['errors'] += 1
+            bulk['pages'] += len(data.get('results', []))
+            batch_index = data.get('next_batch_index')
+        bulk_started.set()
+
+    bulk_thread = threading.Thread(target=run_bulk, daemon=True)
+    bulk_thread.start()
+    bulk_started.wait()
+    time.sleep(0.5)
+
+    timer = Timer()
+    start = time.perf_counter()
+    for _ in range(options['iterations']):
+        timer.call(client.post, '/api/ocr', data={'file': (io.BytesIO(image_bytes), 'page.png'), 'complexity': 'Small'})
+    wall = time.perf_counter() - start
+    stop.set()
+    bulk_thread.join()
+
+    result = summarize('mixed', timer.latencies, options['iterations'], 'images', wall, timer.errors)
+    result.update({'bulk_pages': bulk['pages'], 'bulk_errors': bulk['errors']})
+    return result
+
+
+SCENARIO_FUNCS = {
+    'ocr_image': bench_ocr_image,
+    'pdf_batch': bench_pdf_batch,
+    'pdf_pipeline': bench_pdf_pipeline,
+    'pdf_reupload': bench_pdf_reupload,
+    'preprocess': bench_preprocess,
+    'video_extract': bench_video_extract,
+    'video_decode': bench_video_decode,
+    'video_ocr': bench_video_ocr,
+    'mixed': bench_mixed
+}
+
+
+def _run_scenario(name, options, workdir, result_queue):
+    """在獨立進程中執行單一情境，使峰值 RSS 互不影響"""
+    os.environ['TMPDIR'] = workdir
+    os.environ['OCR_TASK_DB'] = os.path.join(workdir, 'tasks.sqlite3')
+    # 每次迭代上傳相同的 PDF，頁面結果快取會讓後續迭代全部命中；只在 pdf_reupload 情境中啟用
+    os.environ['OCR_PDF_PAGE_CACHE_DAYS'] = '0'
+    tempfile.tempdir = None
+    if not options['verbose']:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+    try:
+        import app as ocr_app
+        ocr_app.preload_model_main_process()
+        deadline = time.monotonic() + options['timeout']
+        while ocr_app.worker_pool.snapshot()['ready'] < ocr_app.worker_pool.size:
+            if time.monotonic() > deadline:
+                raise TimeoutError('OCR workers did not become ready')
+            time.sleep(0.05)
+        client = ocr_app.app.test_client()
+        result = SCENARIO_FUNCS[name](client, options)
+        result_queue.put(result)
+    except Exception as e:
+        result_queue.put({'scenario': name, 'error': f'{type(e).__name__}: {e}'})
+
+
+def run_benchmarks(scenarios, options):
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for name in scenarios:
+        workdir = tempfile.mkdtemp(prefix=f'bench_{name}_')
+        result_queue = ctx.Queue()
+        process = ctx.Process(target=_run_scenario, args=(name, options, workdir, result_queue))
+        process.start()
+        try:
+            result = result_queue.get(timeout=options['timeout'])
+        except Exception:
+            result = {'scenario': name, 'error': 'timed out'}
+            process.terminate()
+        process.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+        print(f"{name}: {json.dumps(result, ensure_ascii=False)}", file=sys.stderr)
+        results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='MLX DeepSeek-OCR offline pipeline benchmark')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--pdf-pages', type=int, default=4)
+    parser.add_argument('--pipeline-pages', type=int, default=12, help='pdf_pipeline / pdf_reupload 情境每份 PDF 的頁數（單一批次）')
+    parser.add_argument('--preprocess-images', type=int, default=4)
+    parser.add_argument('--video-seconds', type=int, default=10)
+    parser.add_argument('--video-frames', type=int, default=20)
+    parser.add_argument('--decode-seconds', type=int, default=30, help='video_decode 情境的影片長度（720p、30 FPS）')
+    parser.add_argument('--frame-quality', type=int, default=80, help='video_decode 情境中 WebP 容器的截圖品質')
+    parser.add_argument('--decode-processes', type=int, default=min(4, os.cpu_count() or 1), help='video_decode 情境分段並行的進程數')
+    parser.add_argument('--mixed-pdf-pages', type=int, default=200, help='mixed 情境背景 PDF 的頁數')
+    parser.add_argument('--timeout', type=float, default=1800, help='每個情境的最長秒數')
+    parser.add_argument('--output', help='JSON 報告輸出路徑（預設 stdout）')
+    parser.add_argument('--verbose', action='store_true', help='保留應用程式的 stdout 日誌')
+    args = parser.parse_args(argv)
+
+    options = {
+        'iterations': args.iterations,
+        'pdf_pages': args.pdf_pages,
+        'pipeline_pages': args.pipeline_pages,
+        'preprocess_images': args.preprocess_images,
+        'video_seconds': args.video_seconds,
+        'video_frames': args.video_frames,
+        'decode_seconds': args.decode_seconds,
+        'decode_processes': args.decode_processes,
+        'frame_quality': args.frame_quality,
+        'mixed_pdf_pages': args.mixed_pdf_pages,
+        'timeout': args.timeout,
+        'verbose': args.verbose
+    }
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'stub_model': {
+            name: os.environ.get(name)
+            for name in ('BENCH_STUB_SECONDS_PER_MEGAPIXEL', 'BENCH_STUB_SECONDS_PER_TOKEN', 'BENCH_STUB_LOAD_SECONDS')
+        },
+        'admission': {
+            name: os.environ.get(name)
+            for name in ('OCR_MAX_CONCURRENT_INFERENCES', 'OCR_INTERACTIVE_RESERVED')
+        },
+        'options': options,
+        'results': run_benchmarks(args.scenarios, options)
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n', encoding='utf-8')
+    else:
+        print(output)
+    return 1 if any('error' in r or r.get('errors') for r in report['results']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
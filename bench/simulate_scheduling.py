@@ -0,0 +1,185 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""推理佇列排序的離散事件模擬：FIFO vs 依形狀分桶的最短工作優先
+
+用法：
+    python -m bench.simulate_scheduling
+    python -m bench.simulate_scheduling --jobs 2000 --utilization 0.95 --servers 2 --output sim.json
+
+工作形狀取自 PREPROCESSING_CONFIG（Tiny ~ Gundam），排程使用與伺服器相同的
+admission.select_ticket 與 app.estimate_inference_cost；實際服務時間依實際輸出
+token 數（max_tokens 的 30%~100%）計算，因此排程只能看到估計值。
+"""
+
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import tempfile
+import types
+
+# app 匯入與結束時的日誌改寫到 stderr，stdout 只輸出 JSON 報告
+_report_stream = sys.stdout
+sys.stdout = sys.stderr
+os.environ.setdefault('OCR_TASK_DB', os.path.join(tempfile.mkdtemp(prefix='bench_sim_'), 'tasks.sqlite3'))
+
+import app as ocr_app
+from admission import select_ticket
+from bench.run import percentile
+
+# 各等級在工作負載中的比例
+DEFAULT_MIX = {'Tiny': 0.3, 'Small': 0.3, 'Medium': 0.2, 'Large': 0.1, 'Gundam': 0.1}
+
+# 服務時間模型（秒）：啟動 + 每個輸出 token + 每個視覺 token
+SERVICE_BASE = 0.5
+SERVICE_PER_OUTPUT_TOKEN = 0.02
+SERVICE_PER_VISION_TOKEN = 0.002
+
+POLICIES = {
+    'fifo': {'ordering': 'fifo', 'aging_rate': 0.0, 'bucket_affinity': 0.0},
+    'sjf': {'ordering': 'sjf', 'aging_rate': 0.0, 'bucket_affinity': 0.0},
+    'sjf_bucketed': {'ordering': 'sjf', 'aging_rate': ocr_app.QUEUE_AGING_RATE, 'bucket_affinity': ocr_app.QUEUE_BUCKET_AFFINITY}
+}
+
+
+def service_time(image_size, output_tokens):
+    vision_tokens = image_size[0] * image_size[1] / 4096
+    return SERVICE_BASE + SERVICE_PER_OUTPUT_TOKEN * output_tokens + SERVICE_PER_VISION_TOKEN * vision_tokens
+
+
+def make_workload(jobs, utilization, servers, content_type, subcategory, mix, seed):
+    """產生到達時間（Poisson）與形狀；到達率依目標使用率換算"""
+    rng = random.Random(seed)
+    levels = ocr_app.PREPROCESSING_CONFIG[content_type][subcategory]
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    workload = []
+    for i in range(jobs):
+        level = rng.choices(names, weights)[0]
+        config = levels[level]
+        output_tokens = int(config['max_tokens'] * rng.uniform(0.3, 1.0))
+        workload.append({
+            'id': i,
+            'level': level,
+            'image_size': tuple(config['image_size']),
+            'max_tokens': config['max_tokens'],
+            'service': service_time(config['image_size'], output_tokens)
+        })
+
+    mean_service = sum(job['service'] for job in workload) / jobs
+    arrival_rate = utilization * servers / mean_service
+    now = 0.0
+    for job in workload:
+        now += rng.expovariate(arrival_rate)
+        job['arrival'] = now
+    return workload
+
+
+def simulate(workload, servers, policy):
+    """k 個伺服器的非搶佔式排隊模擬，返回每個工作的完成時間與形狀切換次數"""
+    arrivals = sorted(workload, key=lambda job: job['arrival'])
+    waiting = []
+    running = []        # heap: (finish_time, server_id, job)
+    free_servers = list(range(servers))
+    last_bucket = None
+    switches = 0
+    finished = {}
+    i = 0
+    now = 0.0
+
+    while i < len(arrivals) or waiting or running:
+        next_arrival = arrivals[i]['arrival'] if i < len(arrivals) else float('inf')
+        next_finish = running[0][0] if running else float('inf')
+
+        if next_arrival <= next_finish:
+            now = next_arrival
+            job = arrivals[i]
+            i += 1
+            bucket = (job['image_size'], job['max_tokens'])
+            waiting.append(types.SimpleNamespace(
+                job=job, bucket=bucket, enqueued_at=job['arrival'],
+                cost=ocr_app.estimate_inference_cost(job['image_size'], job['max_tokens'])
+            ))
+        else:
+            now, server_id, job = heapq.heappop(running)
+            finished[job['id']] = now
+            free_servers.append(server_id)
+
+        while free_servers and waiting:
+            index = select_ticket(
+                waiting, now, policy['ordering'], policy['aging_rate'], last_bucket, policy['bucket_affinity']
+            )
+            ticket = waiting.pop(index)
+            if last_bucket is not None and ticket.bucket != last_bucket:
+                switches += 1
+            last_bucket = ticket.bucket
+            heapq.heappush(running, (now + ticket.job['service'], free_servers.pop(), ticket.job))
+
+    return finished, switches
+
+
+def summarize(workload, finished, switches):
+    sojourn = [finished[job['id']] - job['arrival'] for job in workload]
+    by_level = {}
+    for job, seconds in zip(workload, sojourn):
+        by_level.setdefault(job['level'], []).append(seconds)
+
+    def stats(values):
+        return {
+            'count': len(values),
+            'mean_seconds': round(sum(values) / len(values), 3),
+            'p50_seconds': round(percentile(values, 50), 3),
+            'p95_seconds': round(percentile(values, 95), 3),
+            'max_seconds': round(max(values), 3)
+        }
+
+    return {
+        'completion': stats(sojourn),
+        'by_level': {level: stats(values) for level, values in sorted(by_level.items())},
+        'shape_switches': switches,
+        'makespan_seconds': round(max(finished.values()), 3)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate FIFO vs bucketed shortest-job-first inference ordering')
+    parser.add_argument('--jobs', type=int, default=1000)
+    parser.add_argument('--servers', type=int, default=ocr_app.MAX_CONCURRENT_INFERENCES)
+    parser.add_argument('--utilization', type=float, default=0.9)
+    parser.add_argument('--content-type', default='Document')
+    parser.add_argument('--subcategory', default='Academic')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON 報告輸出路徑（預設 stdout）')
+    args = parser.parse_args(argv)
+
+    workload = make_workload(
+        args.jobs, args.utilization, args.servers, args.content_type, args.subcategory, DEFAULT_MIX, args.seed
+    )
+    report = {
+        'options': vars(args),
+        'mix': DEFAULT_MIX,
+        'policies': {}
+    }
+    for name, policy in POLICIES.items():
+        finished, switches = simulate(workload, args.servers, policy)
+        report['policies'][name] = dict(summarize(workload, finished, switches), **policy)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output, file=_report_stream)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""確定性的替身模型：取代 mlx / mlx_vlm，讓基準測試可在無 Apple Silicon 的 Linux 上執行
+
+OCR worker 以 OCR_MODEL_BACKEND=stub 啟動時會呼叫 install()。
+
+generate() 的耗時只取決於輸入像素數與 max_tokens，可用環境變數調整
+（prompt 含 <|grounding|> 時輸出帶區塊類型與座標的格式）：
+    BENCH_STUB_SECONDS_PER_MEGAPIXEL   每百萬像素的編碼耗時（預設 0.05）
+    BENCH_STUB_SECONDS_PER_TOKEN       每個輸出 token 的解碼耗時（預設 0.00005）
+    BENCH_STUB_LOAD_SECONDS            模型載入耗時（預設 0）
+"""
+
+import hashlib
+import os
+import sys
+import time
+import types
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+class StubResult:
+    def __init__(self, text):
+        self.text = text
+
+
+def load(model_path):
+    time.sleep(_env_float('BENCH_STUB_LOAD_SECONDS', 0))
+    return object(), object()
+
+
+def generate(model, processor, image, prompt, max_tokens, **kwargs):
+    width, height = image.size
+    time.sleep(
+        width * height / 1e6 * _env_float('BENCH_STUB_SECONDS_PER_MEGAPIXEL', 0.05)
+        + max_tokens * _env_float('BENCH_STUB_SECONDS_PER_TOKEN', 0.00005)
+    )
+    digest = hashlib.sha1(image.tobytes()).hexdigest()[:12]
+    text = f"stub {width}x{height} max_tokens={max_tokens} digest={digest}"
+    if '<|grounding|>' in prompt:
+        return StubResult(
+            f"<|ref|>title<|/ref|><|det|>[[50, 30, 950, 80]]<|/det|>\n# stub {width}x{height}\n\n"
+            f"<|ref|>text<|/ref|><|det|>[[50, 100, 950, 600]]<|/det|>\nmax_tokens={max_tokens} digest={digest}"
+        )
+    return StubResult(text)
+
+
+def install():
+    """把替身模組放入 sys.modules；必須在 import mlx / mlx_vlm 之前呼叫"""
+    if getattr(sys.modules.get('mlx_vlm'), '__bench_stub__', False):
+        return
+
+    class _Metal:
+        @staticmethod
+        def is_available():
+            return False
+
+    mlx = types.ModuleType('mlx')
+    core = types.ModuleType('mlx.core')
+    core.metal = _Metal()
+    core.cpu = 'cpu'
+    core.gpu = 'gpu'
+    core.set_default_device = lambda device: None
+    mlx.core = core
+
+    vlm = types.ModuleType('mlx_vlm')
+    vlm.__bench_stub__ = True
+    vlm.load = load
+    vlm.generate = generate
+
+    sys.modules.update({'mlx': mlx, 'mlx.core': core, 'mlx_vlm': vlm})
@@ -0,0 +1,227 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""截圖儲存：每張一個檔案（預設），或所有截圖與縮圖寫入同一個只追加的容器檔
+
+    - files：<dir>/<prefix>_NNNNNN.jpg|webp，與原本相同
+    - pack：<dir>/<prefix>.pack 依序追加圖片與縮圖，<dir>/<prefix>.pack.idx 每行一筆
+      {'name', 'offset', 'length', 'thumb': [offset, length]}（JSON）；索引在資料寫入後才追加，
+      讀取端不會看到未寫完的圖片
+容器中的截圖以虛擬路徑 <dir>/<prefix>.pack/<name> 表示，與檔案路徑一樣可放入任務、由
+/api/files/ 提供及打包 ZIP；read() 依索引定位後隨機讀取，索引只讀取新追加的部分。
+"""
+
+import io
+import json
+import os
+import threading
+
+STORAGE_MODES = ('files', 'pack')
+IMAGE_FORMATS = {
+    'jpeg': ('jpg', 'image/jpeg'),
+    'webp': ('webp', 'image/webp')
+}
+PACK_MAGIC = b'MLXFRMPK'
+THUMBNAIL_SIZE = 150
+THUMBNAIL_QUALITY = 80
+
+
+def _encode(frame, image_format, quality):
+    import cv2
+    extension, _ = IMAGE_FORMATS[image_format]
+    flag = cv2.IMWRITE_JPEG_QUALITY if image_format == 'jpeg' else cv2.IMWRITE_WEBP_QUALITY
+    ok, data = cv2.imencode(f'.{extension}', frame, [flag, quality])
+    if not ok:
+        raise IOError(f'Cannot encode frame as {image_format}')
+    return data.tobytes()
+
+
+def _thumbnail(frame):
+    import cv2
+    height, width = frame.shape[:2]
+    scale = min(1.0, THUMBNAIL_SIZE / max(height, width))
+    if scale < 1.0:
+        frame = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+class FrameFiles:
+    """每張截圖一個檔案"""
+
+    def __init__(self, directory, prefix, image_format='jpeg', quality=95):
+        self.directory = directory
+        self.prefix = prefix
+        self.image_format = image_format
+        self.quality = quality
+        self.extension = IMAGE_FORMATS[image_format][0]
+
+    def path(self, index):
+        return os.path.join(self.directory, f"{self.prefix}_{index:06d}.{self.extension}")
+
+    def write(self, index, frame):
+        """編碼 BGR 幀並寫入（可在多個執行緒中同時呼叫）"""
+        with open(self.path(index), 'wb') as f:
+            f.write(_encode(frame, self.image_format, self.quality))
+
+    def adopt(self, index, source):
+        """把另一個儲存區（分段進程）的截圖移入為第 index 張"""
+        os.replace(source, self.path(index))
+
+    def close(self):
+        pass
+
+
+class FramePack:
+    """所有截圖與縮圖追加到同一個容器檔（建立時取代同名的舊容器）"""
+
+    def __init__(self, directory, prefix, image_format='jpeg', quality=95):
+        self.image_format = image_format
+        self.quality = quality
+        self.prefix = prefix
+        self.extension = IMAGE_FORMATS[image_format][0]
+        self.pack_path = os.path.join(directory, f"{prefix}.pack")
+        # 先刪除再建立，讓讀取端依 inode 發現容器已被取代
+        for path in (self.pack_path, self.pack_path + '.idx'):
+            if os.path.exists(path):
+                os.remove(path)
+        self._data = open(self.pack_path, 'wb')
+        self._data.write(PACK_MAGIC)
+        self._data.flush()
+        self._index = open(self.pack_path + '.idx', 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def path(self, index):
+        return os.path.join(self.pack_path, f"{self.prefix}_{index:06d}.{self.extension}")
+
+    def _append(self, name, image, thumb):
+        with self._lock:
+            offset = self._data.tell()
+            self._data.write(image)
+            self._data.write(thumb)
+            self._data.flush()
+            entry = {'name': name, 'offset': offset, 'length': len(image), 'thumb': [offset + len(image), len(thumb)]}
+            self._index.write(json.dumps(entry) + '\n')
+            self._index.flush()
+
+    def write(self, index, frame):
+        """編碼 BGR 幀與縮圖後追加（編碼在呼叫的執行緒中並行，只有追加需要排隊）"""
+        image = _encode(frame, self.image_format, self.quality)
+        thumb = _encode(_thumbnail(frame), self.image_format, THUMBNAIL_QUALITY)
+        self._append(os.path.basename(self.path(index)), image, thumb)
+
+    def adopt(self, index, source):
+        """複製另一個容器（分段進程）中的截圖與縮圖為第 index 張"""
+        self._append(os.path.basename(self.path(index)), read(source)[0], read(source, thumbnail=True)[0])
+
+    def close(self):
+        if not self._data.closed:
+            self._data.close()
+            self._index.close()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def open_store(directory, prefix, storage='files', image_format='jpeg', quality=95):
+    """依儲存方式建立寫入端；設定不合法時拋出 ValueError"""
+    if storage not in STORAGE_MODES:
+        raise ValueError(f'Unsupported frame storage: {storage}')
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f'Unsupported frame format: {image_format}')
+    if not 1 <= quality <= 100:
+        raise ValueError(f'Frame quality must be 1-100: {quality}')
+    os.makedirs(directory, exist_ok=True)
+    store = FramePack if storage == 'pack' else FrameFiles
+    return store(directory, prefix, image_format, quality)
+
+
+def remove_store(directory, prefix, storage='files', image_format='jpeg', quality=None):
+    """刪除儲存區剩下的截圖（分段進程合併後的暫存檔）"""
+    if storage == 'pack':
+        pack_path = os.path.join(directory, f"{prefix}.pack")
+        with _indexes_lock:
+            _indexes.pop(pack_path, None)
+        names = [f"{prefix}.pack", f"{prefix}.pack.idx"]
+    else:
+        extension = IMAGE_FORMATS[image_format][0]
+        names = [n for n in os.listdir(directory) if n.startswith(f"{prefix}_") and n.endswith(f".{extension}")]
+    for name in names:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _lookup(pack_path, name):
+    """容器索引中的一筆（各進程快取，只解析新追加的行）"""
+    index_path = pack_path + '.idx'
+    try:
+        stat = os.stat(index_path)
+    except FileNotFoundError:
+        return None
+    with _indexes_lock:
+        cached = _indexes.get(pack_path)
+        if cached is None or cached['inode'] != stat.st_ino or stat.st_size < cached['position']:
+            cached = _indexes[pack_path] = {'inode': stat.st_ino, 'position': 0, 'entries': {}}
+        if name not in cached['entries'] and stat.st_size > cached['position']:
+            with open(index_path, 'rb') as f:
+                f.seek(cached['position'])
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # 寫入中的最後一行下次再讀
+                    entry = json.loads(line)
+                    cached['entries'][entry['name']] = entry
+                    cached['position'] += len(line)
+        return cached['entries'].get(name)
+
+
+def _mime(path):
+    extension = os.path.splitext(str(path))[1].lstrip('.').lower()
+    for ext, mime in IMAGE_FORMATS.values():
+        if extension == ext or (ext == 'jpg' and extension == 'jpeg'):
+            return mime
+    return 'application/octet-stream'
+
+
+def is_packed(path):
+    parent = os.path.dirname(str(path))
+    return parent.endswith('.pack') and os.path.isfile(parent)
+
+
+def exists(path):
+    if is_packed(path):
+        return _lookup(os.path.dirname(str(path)), os.path.basename(str(path))) is not None
+    return os.path.isfile(path)
+
+
+def read(path, thumbnail=False):
+    """讀取截圖，返回 (bytes, mime)；找不到時為 None。縮圖只存在於容器中"""
+    path = str(path)
+    if not is_packed(path):
+        if thumbnail or not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read(), _mime(path)
+    pack_path = os.path.dirname(path)
+    entry = _lookup(pack_path, os.path.basename(path))
+    if entry is None:
+        return None
+    offset, length = entry['thumb'] if thumbnail else (entry['offset'], entry['length'])
+    with open(pack_path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length), _mime(path)
+
+
+def open_image(path):
+    """以 PIL 開啟截圖（檔案或容器中的虛擬路徑）"""
+    from PIL import Image
+    if not is_packed(path):
+        return Image.open(path)
+    stored = read(path)
+    if stored is None:
+        raise FileNotFoundError(f'Frame not found: {path}')
+    return Image.open(io.BytesIO(stored[0]))
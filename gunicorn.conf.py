@@ -0,0 +1,80 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""Gunicorn 正式部署設定：gunicorn -c gunicorn.conf.py
+
+master 啟動時先啟動一個 inference_server.py 進程（持有 worker pool、模型與准入佇列），
+所有 HTTP worker 經由本機 Unix socket 共用它。SIGTERM 時 HTTP worker 先完成進行中的
+請求（graceful_timeout），全部結束後 inference server 再等待剩餘推理完成並關閉。
+SIGHUP 重新載入 HTTP worker 時模型不需要重新載入。
+
+環境變數：
+    OCR_BIND              監聽位址（預設 0.0.0.0:5001）
+    OCR_HTTP_WORKERS      HTTP worker 進程數（預設 2）
+    OCR_HTTP_THREADS      每個 HTTP worker 的執行緒數（預設 8）
+    OCR_DRAIN_TIMEOUT     關閉時等待進行中請求 / 推理的秒數（預設 300）
+    OCR_INFERENCE_ADDRESS 已設定時使用外部的 inference server，不另外啟動
+    OCR_METRICS_DIR       HTTP worker 共用的指標目錄（未設定時自動建立暫存目錄）
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+INFERENCE_SERVER_SCRIPT = str(Path(__file__).resolve().parent / 'inference_server.py')
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('OCR_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('OCR_HTTP_WORKERS', 2))
+# 請求大多在等待推理，使用執行緒 worker；心跳不受長時間請求影響
+worker_class = 'gthread'
+threads = int(os.environ.get('OCR_HTTP_THREADS', 8))
+graceful_timeout = int(float(os.environ.get('OCR_DRAIN_TIMEOUT', 300)))
+timeout = 120
+preload_app = False
+
+_inference_process = None
+_metrics_dir = None
+
+
+def on_starting(server):
+    global _inference_process, _metrics_dir
+    # 每個 HTTP worker 的指標寫入同一個目錄，/metrics 合併全部 worker（重新啟動時從零開始）
+    if not os.environ.get('OCR_METRICS_DIR'):
+        _metrics_dir = tempfile.mkdtemp(prefix='ocr_metrics_')
+        os.environ['OCR_METRICS_DIR'] = _metrics_dir
+
+    if os.environ.get('OCR_INFERENCE_ADDRESS'):
+        server.log.info('Using external inference server at %s', os.environ['OCR_INFERENCE_ADDRESS'])
+        return
+
+    address = os.path.join(tempfile.mkdtemp(prefix='ocr_inference_'), 'inference.sock')
+    # HTTP worker 由 master fork 產生，會繼承這兩個環境變數
+    os.environ['OCR_INFERENCE_ADDRESS'] = address
+    os.environ['OCR_INFERENCE_AUTHKEY'] = os.urandom(32).hex()
+    # 獨立的進程群組：終端機的 Ctrl+C 只送給 gunicorn，由 on_exit 依序關閉
+    _inference_process = subprocess.Popen(
+        [sys.executable, INFERENCE_SERVER_SCRIPT, address], start_new_session=True
+    )
+    server.log.info('Started inference server (pid %s) at %s', _inference_process.pid, address)
+
+
+def on_exit(server):
+    if _metrics_dir is not None:
+        shutil.rmtree(_metrics_dir, ignore_errors=True)
+    if _inference_process is None or _inference_process.poll() is not None:
+        return
+    server.log.info('Stopping inference server (pid %s)', _inference_process.pid)
+    _inference_process.terminate()
+    try:
+        _inference_process.wait(timeout=graceful_timeout + 30)
+    except subprocess.TimeoutExpired:
+        _inference_process.kill()
+        _inference_process.wait()
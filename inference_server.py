@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""共用推理服務：准入控制 + worker pool，可在本進程使用或經由 socket 供多個 HTTP worker / 機器共用
+
+    InferenceService  本進程內執行（開發伺服器 / inference server 進程內部）
+    InferenceServer   以 multiprocessing.connection 對外提供 InferenceService
+    InferenceClient   HTTP worker 端，介面與 InferenceService 相同
+    create_inference_service()  依環境變數建立 worker pool + 准入控制（不匯入 Flask 應用程式）
+
+獨立執行（gunicorn.conf.py 未設定 OCR_INFERENCE_ADDRESS 時會自動啟動一個）：
+    python inference_server.py                                  # 預設 Unix socket（見 DEFAULT_ADDRESS）
+    OCR_INFERENCE_AUTHKEY=<hex> python inference_server.py 0.0.0.0:7070
+    python inference_server.py /tmp/ocr.sock --stub             # 替身模型，測試用
+網頁端以 OCR_INFERENCE_ADDRESS（與相同的 OCR_INFERENCE_AUTHKEY）指向它。
+位址格式：Unix socket 路徑（可加 unix: 前綴）或 host:port / tcp://host:port；TCP 必須設定驗證金鑰。
+
+請求：{'op': 'run', 'job', 'priority', 'cost', 'bucket', 'timeout'} / {'op': 'status'}
+回應：worker 結果 dict，或 {'error_type', 'message'}（AdmissionRejected 另附 'rejection'）
+status 另附 worker 的模型載入 / 暖機 / canary 指標（metrics.Registry.state()），由網頁端併入 /metrics。
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+import metrics
+import tracing
+from admission import AdmissionController, AdmissionRejected
+from worker_pool import WorkerCrashed, WorkerPool
+
+# 回應中的錯誤類型 → 客戶端重新拋出的例外
+_ERROR_TYPES = {'TimeoutError': TimeoutError, 'WorkerCrashed': WorkerCrashed, 'ValueError': ValueError}
+
+DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), 'mlx_ocr_inference.sock')
+
+STATUS_TIMEOUT = 5.0  # status 回應的最長等待秒數
+
+UNAVAILABLE_POOL = {'size': 0, 'ready': 0, 'health': 'unavailable', 'canary_baseline_seconds': None, 'workers': []}
+
+# 每個推理名額對應一個載入完整模型的常駐 worker 進程，必須限制同時執行的數量
+MAX_CONCURRENT_INFERENCES = int(os.environ.get('OCR_MAX_CONCURRENT_INFERENCES', 2))
+MAX_INFERENCE_QUEUE = int(os.environ.get('OCR_MAX_QUEUE', 8))              # 每個優先級的等待上限
+INFERENCE_QUEUE_TIMEOUT = float(os.environ.get('OCR_QUEUE_TIMEOUT', 300))  # 排隊最長秒數
+# 只給互動式請求的保留名額（只有一個名額時無法保留）
+INTERACTIVE_RESERVED = int(os.environ.get('OCR_INTERACTIVE_RESERVED', 1 if MAX_CONCURRENT_INFERENCES > 1 else 0))
+INFERENCE_PRIORITY_WEIGHTS = {'interactive': 8, 'bulk': 2, 'background': 1}
+
+# 同一優先級內的排序：sjf（最短工作優先 + 老化）或 fifo
+QUEUE_ORDERING = os.environ.get('OCR_QUEUE_ORDERING', 'sjf')
+QUEUE_AGING_RATE = 10.0          # 每等待一秒，有效成本減少的 token 數（見 bench/simulate_scheduling.py）
+QUEUE_BUCKET_AFFINITY = 256.0    # 與上一個工作同形狀時的成本折扣（token）
+
+OCR_WORKER_STARTUP_TIMEOUT = 600   # 模型下載 / 載入 / 暖機的最長秒數
+OCR_WORKER_MAX_JOBS = int(os.environ.get('OCR_WORKER_MAX_JOBS', 500))  # 處理此數量後回收 worker
+OCR_WORKER_RETRY_BACKOFF = float(os.environ.get('OCR_WORKER_RETRY_BACKOFF', 5))   # 啟動失敗後首次重試的等待秒數，連續失敗加倍
+OCR_WORKER_RETRY_BACKOFF_MAX = float(os.environ.get('OCR_WORKER_RETRY_BACKOFF_MAX', 300))
+
+# 健康探測：空閒 worker 定期跑一次極小的 canary 推理，失敗或耗時退化到基準的
+# OCR_CANARY_REGRESSION 倍（連續兩次）即重啟該 worker；間隔設為 0 停用
+OCR_CANARY_INTERVAL = float(os.environ.get('OCR_CANARY_INTERVAL', 60))
+OCR_CANARY_TIMEOUT = float(os.environ.get('OCR_CANARY_TIMEOUT', 30))
+OCR_CANARY_REGRESSION = float(os.environ.get('OCR_CANARY_REGRESSION', 3.0))
+
+OCR_DRAIN_TIMEOUT = float(os.environ.get('OCR_DRAIN_TIMEOUT', 300))  # 結束時等待進行中推理的最長秒數
+
+# worker pool 所在進程的指標（gunicorn 模式下在 inference server 進程中，經 status 返回網頁端）
+POOL_METRICS = metrics.Registry()
+OCR_WORKER_STAGE_SECONDS = metrics.Histogram(
+    'ocr_stage_seconds', 'Latency of OCR worker startup stages (model_load, warmup)',
+    ('stage', 'endpoint', 'complexity'), registry=POOL_METRICS
+)
+OCR_CANARY_SECONDS = metrics.Gauge('ocr_worker_canary_seconds', 'Latency of the most recent canary inference per OCR worker', ('worker',), registry=POOL_METRICS)
+OCR_CANARY_FAILURES = metrics.Counter('ocr_worker_canary_failures_total', 'Canary inferences that failed or regressed against the baseline', ('worker',), registry=POOL_METRICS)
+
+
+def _on_worker_ready(worker):
+    labels = {'endpoint': 'background', 'complexity': 'none'}
+    OCR_WORKER_STAGE_SECONDS.observe(worker.model_load_seconds, stage='model_load', **labels)
+    OCR_WORKER_STAGE_SECONDS.observe(worker.warmup_seconds, stage='warmup', **labels)
+
+
+def _on_worker_canary(worker, seconds, healthy):
+    if seconds is not None:
+        OCR_CANARY_SECONDS.set(seconds, worker=worker.worker_id)
+    if not healthy:
+        OCR_CANARY_FAILURES.inc(worker=worker.worker_id)
+
+
+def authkey_from_env():
+    value = os.environ.get('OCR_INFERENCE_AUTHKEY')
+    return bytes.fromhex(value) if value else None
+
+
+def parse_address(value):
+    """'host:port' / 'tcp://host:port' → (host, port)；其他視為 Unix socket 路徑"""
+    if value.startswith('unix:'):
+        return value[len('unix:'):]
+    if value.startswith('tcp://'):
+        value = value[len('tcp://'):]
+    elif os.sep in value or ':' not in value:
+        return value
+    host, _, port = value.rpartition(':')
+    if not port.isdigit():
+        raise ValueError(f'Invalid inference server address: {value}')
+    return (host or '127.0.0.1', int(port))
+
+
+def _remove_stale_socket(path):
+    """上次未正常結束留下的 socket 檔案；仍有進程在監聽時拋出例外"""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f'Another inference server is already listening on {path}')
+
+
+class InferenceService:
+    """取得准入名額後交給 worker pool 執行；shutdown 時先等待進行中的工作完成
+
+    registry：worker pool 相關指標，status() 中以 'metrics' 返回
+    """
+
+    def __init__(self, pool, admission, registry=None):
+        self.pool = pool
+        self.admission = admission
+        self.registry = registry
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._draining = False
+
+    def start(self):
+        self.pool.start()
+
+    def run(self, job, priority, cost, bucket, timeout):
+        """返回 worker 結果 dict（附 admission_wait 秒數與 spans）"""
+        with self._cond:
+            if self._draining:
+                raise AdmissionRejected('Server shutting down', priority, 5, 0, 0)
+            self._inflight += 1
+        try:
+            # 追蹤上下文來自呼叫端（本進程或遠端 HTTP worker），span 隨結果返回
+            trace_context = job.get('trace_context')
+            with (tracing.collect() if trace_context else nullcontext([])) as spans, tracing.attach(trace_context):
+                t_start = time.monotonic()
+                with tracing.span('admission_wait', priority=priority):
+                    ticket = self.admission.acquire(priority, cost=cost, bucket=bucket)
+                admission_wait = time.monotonic() - t_start
+                t_run = time.time()
+                try:
+                    result = self.pool.run(job, timeout)
+                finally:
+                    self.admission.release(ticket)
+            result['admission_wait'] = admission_wait
+            # 等待空閒 worker 的時間在本機計算（HTTP worker 可能在另一台機器，時鐘不同）
+            if 'started_at' in result.get('timing', {}):
+                result['queue_wait'] = max(0.0, result['timing']['started_at'] - t_run)
+            result['spans'] = spans + (result.get('spans') or [])
+            return result
+        finally:
+            with self._cond:
+                self._inflight -= 1
+                self._cond.notify_all()
+
+    def status(self):
+        return {
+            'pool': self.pool.snapshot(),
+            'admission': self.admission.snapshot(),
+            'draining': self._draining,
+            'metrics': self.registry.state() if self.registry is not None else {}
+        }
+
+    def drain(self, timeout):
+        """拒絕新工作並等待進行中（含排隊中）的工作完成；返回是否全部完成"""
+        with self._cond:
+            self._draining = True
+            if self._inflight:
+                print(f"⏳ Draining {self._inflight} in-flight inference job(s)...")
+            return self._cond.wait_for(lambda: self._inflight == 0, timeout)
+
+    def shutdown(self, drain_timeout=0):
+        if not self.drain(drain_timeout):
+            print(f"⚠️ {self._inflight} inference job(s) still running after {drain_timeout}s; stopping workers")
+        self.pool.shutdown()
+
+
+def create_inference_service():
+    """依上面的設定建立 InferenceService（尚未啟動 worker），worker 指標記錄在 POOL_METRICS"""
+    admission = AdmissionController(
+        max_concurrent=MAX_CONCURRENT_INFERENCES,
+        max_queue=MAX_INFERENCE_QUEUE,
+        weights=INFERENCE_PRIORITY_WEIGHTS,
+        queue_timeout=INFERENCE_QUEUE_TIMEOUT,
+        reserved_interactive=INTERACTIVE_RESERVED,
+        ordering=QUEUE_ORDERING,
+        aging_rate=QUEUE_AGING_RATE,
+        bucket_affinity=QUEUE_BUCKET_AFFINITY
+    )
+    pool = WorkerPool(
+        size=MAX_CONCURRENT_INFERENCES,
+        startup_timeout=OCR_WORKER_STARTUP_TIMEOUT,
+        max_jobs=OCR_WORKER_MAX_JOBS,
+        on_ready=_on_worker_ready,
+        canary_interval=OCR_CANARY_INTERVAL or None,
+        canary_timeout=OCR_CANARY_TIMEOUT,
+        canary_regression=OCR_CANARY_REGRESSION,
+        on_canary=_on_worker_canary,
+        retry_backoff=OCR_WORKER_RETRY_BACKOFF,
+        retry_backoff_max=OCR_WORKER_RETRY_BACKOFF_MAX
+    )
+    return InferenceService(pool, admission, registry=POOL_METRICS)
+
+
+class InferenceServer:
+    """每個客戶端連線一個執行緒；一條連線同時只處理一個請求"""
+
+    def __init__(self, service, address, authkey=None):
+        self.service = service
+        self.address = address
+        self.authkey = authkey
+        self._listener = None
+        self._closed = threading.Event()
+
+    def listen(self):
+        if isinstance(self.address, tuple) and self.authkey is None:
+            raise ValueError('A TCP inference server requires OCR_INFERENCE_AUTHKEY')
+        if isinstance(self.address, str):
+            _remove_stale_socket(self.address)
+        self._listener = Listener(self.address, authkey=self.authkey)
+        if isinstance(self.address, str):
+            os.chmod(self.address, 0o600)
+        print(f"🔌 Inference server listening on {self.address}")
+
+    def serve_forever(self):
+        if self._listener is None:
+            self.listen()
+        while not self._closed.is_set():
+            try:
+                conn = self._listener.accept()
+            except (AuthenticationError, EOFError) as e:
+                # 金鑰錯誤或握手中斷的客戶端，不影響其他連線
+                print(f"⚠️ Rejected inference client: {e}")
+                continue
+            except OSError:
+                if self._closed.is_set():
+                    break
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def close(self):
+        """停止接受新連線（已連線的客戶端仍可完成目前的請求）"""
+        self._closed.set()
+        if self._listener is not None:
+            self._listener.close()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(self._dispatch(message))
+                except OSError:
+                    return
+
+    def _dispatch(self, message):
+        op = message.get('op')
+        try:
+            if op == 'run':
+                return self.service.run(
+                    message['job'], message['priority'], message['cost'], message['bucket'], message['timeout']
+                )
+            if op == 'status':
+                return self.service.status()
+            raise ValueError(f'Unknown op: {op}')
+        except AdmissionRejected as e:
+            return {'error_type': 'AdmissionRejected', 'message': str(e), 'rejection': e.to_dict()}
+        except Exception as e:
+            return {'error_type': type(e).__name__, 'message': str(e)}
+
+
+class InferenceClient:
+    """連線到 InferenceServer；每個執行緒各自借用一條連線，用完放回
+
+    run 等待回應最多 timeout + reply_margin 秒（涵蓋 inference server 端的排隊時間），逾時拋出 TimeoutError。
+    """
+
+    def __init__(self, address, authkey=None, connect_timeout=30.0, reply_margin=330.0):
+        self.address = address
+        self.authkey = authkey
+        self.connect_timeout = connect_timeout
+        self.reply_margin = reply_margin
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        print(f"🔌 Using shared inference server at {self.address}")
+
+    def _connect(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except AuthenticationError:
+                raise ConnectionError(f'Authentication with the inference server at {self.address} failed')
+            except (FileNotFoundError, ConnectionRefusedError):
+                # inference server 可能仍在啟動
+                if time.monotonic() > deadline:
+                    raise ConnectionError(f'Inference server at {self.address} is not reachable')
+                time.sleep(0.1)
+
+    def _idle_connection(self):
+        """取出一條閒置連線；對端已關閉（inference server 重啟）的連線直接丟棄"""
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return None
+            try:
+                if not conn.poll(0):
+                    return conn
+            except (EOFError, OSError):
+                pass
+            conn.close()
+
+    def _call(self, message, reply_timeout, connect_timeout=None):
+        conn = self._idle_connection()
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = self._connect(self.connect_timeout if connect_timeout is None else connect_timeout)
+            try:
+                conn.send(message)
+                break
+            except OSError as e:
+                conn.close()
+                conn = None
+                # 請求尚未送出：閒置連線可能在 inference server 重啟後失效，換新連線重試一次
+                if not reused:
+                    raise WorkerCrashed(f'inference server connection lost: {e}')
+                reused = False
+        # 請求已送出後不再重送，避免 inference server 中途重啟時同一頁推理兩次
+        try:
+            ready = conn.poll(reply_timeout)
+            reply = conn.recv() if ready else None
+        except (EOFError, OSError) as e:
+            conn.close()
+            raise WorkerCrashed(f'inference server connection lost: {e}')
+        if not ready:
+            # 回應可能稍後才到，這條連線不再使用
+            conn.close()
+            raise TimeoutError(f'No reply from inference server within {reply_timeout:.0f}s')
+        with self._lock:
+            self._idle.append(conn)
+
+        error_type = reply.get('error_type')
+        if error_type == 'AdmissionRejected':
+            rejection = reply['rejection']
+            raise AdmissionRejected(
+                rejection['error'], rejection['priority'], rejection['retry_after'],
+                rejection['queue_position'], rejection['queue_length']
+            )
+        if error_type:
+            raise _ERROR_TYPES.get(error_type, RuntimeError)(reply['message'])
+        return reply
+
+    def run(self, job, priority, cost, bucket, timeout):
+        message = {'op': 'run', 'job': job, 'priority': priority, 'cost': cost, 'bucket': bucket, 'timeout': timeout}
+        return self._call(message, reply_timeout=timeout + self.reply_margin)
+
+    def status(self):
+        try:
+            return self._call({'op': 'status'}, reply_timeout=STATUS_TIMEOUT, connect_timeout=1.0)
+        except (ConnectionError, WorkerCrashed, TimeoutError) as e:
+            return {'pool': dict(UNAVAILABLE_POOL), 'admission': None, 'draining': False, 'metrics': {}, 'error': str(e)}
+
+    def shutdown(self, drain_timeout=0):
+        """只關閉本進程的連線；共用的 worker pool 由 inference server 自己結束"""
+        with self._lock:
+            connections, self._idle = self._idle, []
+        for conn in connections:
+            conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Shared OCR inference server (worker pool + admission queue)')
+    parser.add_argument('address', nargs='?', default=DEFAULT_ADDRESS,
+                        help='Unix socket 路徑或 host:port（預設 %(default)s）')
+    parser.add_argument('--authkey-file', help='讀取 hex 驗證金鑰的檔案（取代 OCR_INFERENCE_AUTHKEY）')
+    parser.add_argument('--stub', action='store_true', help='使用 bench/stub_model.py 的替身模型（測試用，不需要 MLX）')
+    args = parser.parse_args(argv)
+
+    if args.authkey_file:
+        os.environ['OCR_INFERENCE_AUTHKEY'] = Path(args.authkey_file).read_text(encoding='utf-8').strip()
+    if args.stub:
+        os.environ['OCR_MODEL_BACKEND'] = 'stub'
+    # 只建立 worker pool 與准入控制；任務儲存與 janitor 屬於網頁端
+    service = create_inference_service()
+    server = InferenceServer(service, parse_address(args.address), authkey_from_env())
+    try:
+        server.listen()
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    print("🔧 Starting OCR workers (model loads and warms up in the background)...")
+    service.start()
+    threading.Thread(target=server.serve_forever, daemon=True, name='inference-server').start()
+    while not stop.wait(1.0):
+        pass
+
+    print("🛑 Inference server stopping: draining in-flight jobs...")
+    server.close()
+    service.shutdown(drain_timeout=OCR_DRAIN_TIMEOUT)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""版面區塊：解析 DeepSeek-OCR grounding 輸出，保留座標供區域查詢與搜尋，不必重新推理
+
+grounding prompt 的輸出為連續的
+    <|ref|>類型<|/ref|><|det|>[[x0, y0, x1, y1], ...]<|/det|>
+    區塊文字
+座標以 0–999 表示圖像比例。每個區塊轉為 {'type', 'bbox', 'text'}，bbox 為 [x, y, w, h]
+（0–1 的頁面比例，與 video_roi 的區域相同）；沒有 grounding 標記的輸出視為一個整頁的 text 區塊。
+"""
+
+import re
+
+COORDINATE_SCALE = 999
+FULL_PAGE = [0.0, 0.0, 1.0, 1.0]
+
+_BLOCK_RE = re.compile(r'<\|ref\|>(.*?)<\|/ref\|>\s*<\|det\|>(.*?)<\|/det\|>', re.S)
+_BOX_RE = re.compile(r'\[\s*(-?[\d.]+)\s*,\s*(-?[\d.]+)\s*,\s*(-?[\d.]+)\s*,\s*(-?[\d.]+)\s*\]')
+
+
+def _bbox(det):
+    """<|det|> 中的一或多個框合併為一個 [x, y, w, h]；沒有座標時為 None"""
+    boxes = [[min(max(float(v), 0.0), COORDINATE_SCALE) / COORDINATE_SCALE for v in box] for box in _BOX_RE.findall(det)]
+    if not boxes:
+        return None
+    x0, y0 = min(b[0] for b in boxes), min(b[1] for b in boxes)
+    x1, y1 = max(b[2] for b in boxes), max(b[3] for b in boxes)
+    return [round(x0, 4), round(y0, 4), round(max(x1 - x0, 0.0), 4), round(max(y1 - y0, 0.0), 4)]
+
+
+def parse(raw):
+    """grounding 輸出 → 區塊列表（依模型輸出順序，即閱讀順序）"""
+    raw = (raw or '').replace('<|grounding|>', '')
+    matches = list(_BLOCK_RE.finditer(raw))
+    if not matches:
+        text = raw.strip()
+        return [{'type': 'text', 'bbox': list(FULL_PAGE), 'text': text}] if text else []
+
+    blocks = []
+    leading = raw[:matches[0].start()].strip()
+    if leading:
+        blocks.append({'type': 'text', 'bbox': list(FULL_PAGE), 'text': leading})
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(raw)
+        blocks.append({
+            'type': match.group(1).strip() or 'text',
+            'bbox': _bbox(match.group(2)),
+            'text': raw[match.end():end].strip()
+        })
+    return blocks
+
+
+def to_text(blocks):
+    """區塊文字依順序以空行連接（不含標記與座標）"""
+    return '\n\n'.join(block['text'] for block in blocks if block['text'])
+
+
+def offset(blocks, box, size):
+    """切塊內的區塊座標換算為整頁比例；box 為切塊在頁面中的 (left, top, right, bottom) 像素，size 為頁面 (寬, 高)"""
+    left, top, right, bottom = box
+    width, height = size
+    scale_x, scale_y = (right - left) / width, (bottom - top) / height
+    moved = []
+    for block in blocks:
+        bbox = block['bbox']
+        if bbox is not None:
+            x, y, w, h = bbox
+            bbox = [round(left / width + x * scale_x, 4), round(top / height + y * scale_y, 4),
+                    round(w * scale_x, 4), round(h * scale_y, 4)]
+        moved.append(dict(block, bbox=bbox))
+    return moved
+
+
+def _intersection(a, b):
+    w = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    h = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    return w * h if w > 0 and h > 0 else 0.0
+
+
+def _normalize(text):
+    return re.sub(r'\s+', ' ', text or '').strip().lower()
+
+
+def _is_duplicate(block, other):
+    """切塊重疊區域中重複辨識的區塊：文字相同且位置重疊；沒有文字（如圖片）時類型相同且大部分重疊"""
+    if block['bbox'] is None or other['bbox'] is None:
+        return False
+    key = _normalize(block['text'])
+    if key != _normalize(other['text']):
+        return False
+    inside = _intersection(block['bbox'], other['bbox'])
+    if key:
+        return inside > 0
+    smaller = min(block['bbox'][2] * block['bbox'][3], other['bbox'][2] * other['bbox'][3])
+    return block['type'] == other['type'] and smaller > 0 and inside / smaller > 0.5
+
+
+def merge_tiles(tile_blocks):
+    """依切塊順序合併區塊，去除重複的區塊"""
+    merged = []
+    for blocks in tile_blocks:
+        for block in blocks:
+            if not any(_is_duplicate(block, other) for other in merged):
+                merged.append(block)
+    return merged
+
+
+def select(blocks, region=None, types=None, min_overlap=0.5):
+    """區域內（區塊面積至少 min_overlap 落在 region [x, y, w, h] 中）且類型符合的區塊"""
+    selected = []
+    for block in blocks:
+        if types and block['type'] not in types:
+            continue
+        if region is not None:
+            bbox = block['bbox']
+            if bbox is None:
+                continue
+            area = bbox[2] * bbox[3]
+            if area > 0:
+                if _intersection(bbox, region) / area < min_overlap:
+                    continue
+            elif not (region[0] <= bbox[0] <= region[0] + region[2] and region[1] <= bbox[1] <= region[1] + region[3]):
+                continue  # 零面積的框以左上角判斷
+        selected.append(block)
+    return selected
+
+
+def lines(text):
+    """沒有版面資訊的頁面以非空白行作為搜尋單位"""
+    return [{'type': 'line', 'bbox': None, 'text': line.strip()} for line in (text or '').splitlines() if line.strip()]
+
+
+def search(blocks, query):
+    """文字包含 query（不分大小寫、忽略空白差異）的區塊"""
+    needle = _normalize(query)
+    if not needle:
+        return []
+    return [block for block in blocks if needle in _normalize(block['text'])]
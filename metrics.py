@@ -0,0 +1,247 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""輕量 Prometheus 文字格式指標（Counter / Gauge / Histogram），不依賴 prometheus_client
+
+各進程的 registry 以 state() 匯出可序列化的目前值，merge() 合併多個進程（Counter / Histogram 相加，
+Gauge 取最後一個），render_state() 輸出文字格式。MultiprocessCollector 讓多個 gunicorn HTTP worker
+把各自的值寫入共用目錄，任何一個 worker 收到 /metrics 時都返回全部進程的合計。
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def state(self):
+        with self._lock:
+            samples = [[list(key), _copy(value)] for key, value in sorted(self._values.items())]
+        return {'kind': self.kind, 'documentation': self.documentation, 'labelnames': list(self.labelnames), 'samples': samples}
+
+
+def _copy(value):
+    return dict(value, counts=list(value['counts'])) if isinstance(value, dict) else value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """以 with 區塊計時並記錄"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels):
+        """返回 {'count', 'sum'}，沒有觀測值時為 0"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return {'count': state['count'], 'sum': state['sum']} if state else {'count': 0, 'sum': 0.0}
+
+    def state(self):
+        return dict(super().state(), buckets=list(self.buckets[:-1]))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f'Duplicate metric: {metric.name}')
+            self._metrics.append(metric)
+
+    def state(self):
+        """{name: 指標狀態}（JSON 可序列化）"""
+        with self._lock:
+            metrics = list(self._metrics)
+        return {metric.name: metric.state() for metric in metrics}
+
+    def render(self):
+        return render_state(self.state())
+
+
+def merge(states):
+    """合併多個 registry 的 state()；同名但類型或 bucket 不同的指標以先出現者為準"""
+    merged = {}
+    for state in states:
+        for name, family in state.items():
+            current = merged.get(name)
+            if current is None:
+                merged[name] = dict(family, samples={tuple(key): _copy(value) for key, value in family['samples']})
+                continue
+            if (current['kind'], current['labelnames'], current.get('buckets')) != (family['kind'], family['labelnames'], family.get('buckets')):
+                continue
+            samples = current['samples']
+            for key, value in family['samples']:
+                key = tuple(key)
+                if key not in samples or family['kind'] == 'gauge':
+                    samples[key] = _copy(value)
+                elif family['kind'] == 'histogram':
+                    total = samples[key]
+                    total['counts'] = [a + b for a, b in zip(total['counts'], value['counts'])]
+                    total['sum'] += value['sum']
+                    total['count'] += value['count']
+                else:
+                    samples[key] += value
+    return {name: dict(family, samples=sorted(family['samples'].items())) for name, family in merged.items()}
+
+
+def render_state(state):
+    """state() / merge() 的結果 → Prometheus 文字格式"""
+    blocks = []
+    for name, family in state.items():
+        lines = [f'# HELP {name} {family["documentation"]}', f'# TYPE {name} {family["kind"]}']
+        labelnames = family['labelnames']
+        for key, value in family['samples']:
+            if family['kind'] != 'histogram':
+                lines.append(f'{name}{_format_labels(labelnames, key)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(list(family['buckets']) + [float('inf')], value['counts']):
+                cumulative += count
+                labels = _format_labels(labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{name}_bucket{labels} {cumulative}')
+            labels = _format_labels(labelnames, key)
+            lines.append(f'{name}_sum{labels} {_format_value(value["sum"])}')
+            lines.append(f'{name}_count{labels} {value["count"]}')
+        blocks.append('\n'.join(lines))
+    return '\n'.join(blocks) + '\n'
+
+
+class MultiprocessCollector:
+    """每個進程每 interval 秒把 registry 的 state() 寫入 directory/<pid>.json；states() 返回全部進程（含已結束的）的值
+
+    已結束進程的檔案保留，Counter / Histogram 的合計不會因 HTTP worker 重啟而倒退。
+    """
+
+    def __init__(self, directory, registry=None, interval=1.0):
+        self.directory = directory
+        self.registry = registry if registry is not None else REGISTRY
+        self.interval = interval
+        self.path = os.path.join(directory, f'{os.getpid()}.json')
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.write()
+        threading.Thread(target=self._loop, daemon=True, name='metrics-writer').start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as e:
+                print(f"⚠️ Failed to write metrics snapshot: {e}")
+
+    def write(self):
+        tmp = f'{self.path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.registry.state(), f)
+        os.replace(tmp, self.path)
+
+    def states(self):
+        self.write()
+        states = []
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.json'))):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    states.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # 其他進程正在取代的檔案
+        return states
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""無介面的批次 OCR：處理目錄樹或檔案清單中的圖片、PDF 與影片
+
+用法：
+    python ocr_cli.py scans/ -o out/
+    python ocr_cli.py a.pdf b.mp4 -o out/ --complexity Auto --format both --jobs 4
+    find . -name '*.pdf' | python ocr_cli.py --file-list - -o out/
+
+直接呼叫 app.py 的 PDF 渲染、iter_video_frames、preprocess_single_image 與
+OCR 函數（不經過 HTTP / base64），推理走同一個 worker pool（設定 OCR_INFERENCE_ADDRESS
+時改用共用的 inference server）。主執行緒依序渲染頁面 / 截取幀，最多 --jobs 個頁面同時推理。
+
+輸出目錄：
+    results.jsonl     每頁一行，完成即寫入
+    manifest.jsonl    每個完成的檔案一行；再次執行時跳過相同內容與配置的檔案
+    <相對路徑>.md     每個檔案完成時寫入的 Markdown（--format markdown / both）
+    <相對路徑>.srt    影片合併為時間區段的字幕（--subtitles srt / vtt / json）
+中途中斷後再次執行，已成功的頁面直接沿用 results.jsonl 中的結果。
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+import app as ocr_app
+import transcript
+import video_roi
+from admission import AdmissionRejected
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+PDF_EXTENSIONS = {'pdf'}
+VIDEO_EXTENSIONS = set(ocr_app.ALLOWED_VIDEO_EXTENSIONS)
+
+
+def file_kind(path):
+    ext = path.suffix.lower().lstrip('.')
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    if ext in PDF_EXTENSIONS:
+        return 'pdf'
+    if ext in VIDEO_EXTENSIONS:
+        return 'video'
+    return None
+
+
+def collect_inputs(paths, file_list=None):
+    """展開目錄（遞迴）與檔案清單，返回 [(path, 相對路徑)]，依路徑排序去重"""
+    entries = [Path(p) for p in paths]
+    if file_list:
+        stream = sys.stdin if file_list == '-' else open(file_list, encoding='utf-8')
+        with stream:
+            entries.extend(Path(line.strip()) for line in stream if line.strip())
+
+    found = {}
+    for entry in entries:
+        if entry.is_dir():
+            for path in sorted(entry.rglob('*')):
+                if path.is_file() and file_kind(path):
+                    found.setdefault(path.resolve(), path.relative_to(entry))
+        elif entry.is_file() and file_kind(entry):
+            found.setdefault(entry.resolve(), Path(entry.name))
+        else:
+            print(f"⚠️ Skipping unsupported or missing input: {entry}")
+    return sorted(found.items())
+
+
+class OutputWriter:
+    """results.jsonl / manifest.jsonl / Markdown 輸出，並讀取上次執行的結果以便續跑"""
+
+    def __init__(self, output_dir, formats, subtitles=None):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.formats = formats
+        self.subtitles = subtitles
+        self.results_path = self.output_dir / 'results.jsonl'
+        self.manifest_path = self.output_dir / 'manifest.jsonl'
+        self._lock = threading.Lock()
+        self.done_pages = {}      # (source, config_id) → {page: record}
+        self.done_files = {}      # source → manifest 記錄
+        for record in self._read(self.results_path):
+            if 'text' in record:
+                self.done_pages.setdefault((record['source'], record['config_id']), {})[record['page']] = record
+        for record in self._read(self.manifest_path):
+            self.done_files[record['source']] = record
+        self._results = open(self.results_path, 'a', encoding='utf-8')
+        self._manifest = open(self.manifest_path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def _read(path):
+        if not path.exists():
+            return []
+        records = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass    # 中斷時寫了一半的最後一行
+        return records
+
+    def is_file_done(self, source, fingerprint):
+        record = self.done_files.get(source)
+        return record is not None and record['fingerprint'] == fingerprint
+
+    def page_result(self, source, config_id, page):
+        return self.done_pages.get((source, config_id), {}).get(page)
+
+    def write_page(self, record):
+        with self._lock:
+            self._results.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._results.flush()
+
+    def write_file(self, job):
+        pages = [job.records[page] for page in sorted(job.records)]
+        if 'markdown' in self.formats:
+            md_path = self.output_dir / job.rel_path.with_name(job.rel_path.name + '.md')
+            md_path.parent.mkdir(parents=True, exist_ok=True)
+            label = 'Frame' if job.kind == 'video' else 'Page'
+            with open(md_path, 'w', encoding='utf-8') as f:
+                f.write(f"# {job.rel_path}\n\n")
+                for record in pages:
+                    if job.kind != 'image':
+                        f.write(f"## {label} {record['page']}\n\n")
+                    f.write(record['text'].strip() + '\n\n')
+        if self.subtitles and job.kind == 'video':
+            self.write_subtitles(job)
+        with self._lock:
+            self._manifest.write(json.dumps({
+                'source': job.source,
+                'kind': job.kind,
+                'fingerprint': job.fingerprint,
+                'pages': len(pages),
+                'completed_at': time.time()
+            }, ensure_ascii=False) + '\n')
+            self._manifest.flush()
+
+    def write_subtitles(self, job):
+        """影片逐幀結果合併為時間區段，寫入 <檔名>.<srt|vtt|json>"""
+        segments = transcript.merge_segments(list(job.records.values()))
+        path = self.output_dir / job.rel_path.with_name(f"{job.rel_path.name}.{self.subtitles}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(transcript.render(segments, self.subtitles), encoding='utf-8')
+
+    def close(self):
+        self._results.close()
+        self._manifest.close()
+
+
+class FileJob:
+    """一個輸入檔案；全部頁面完成（且已全部送出）時寫入 Markdown 與 manifest"""
+
+    def __init__(self, source, rel_path, kind, fingerprint):
+        self.source = source
+        self.rel_path = rel_path
+        self.kind = kind
+        self.fingerprint = fingerprint
+        self.records = {}
+        self.pending = 0
+        self.failed = 0
+        self.submitted_all = False
+        self.lock = threading.Lock()
+
+
+class BatchOCR:
+    def __init__(self, args):
+        self.args = args
+        self.config = ocr_app.get_preprocessing_config(args.content_type, args.subcategory, args.complexity)
+        if not self.config:
+            raise ValueError(f'Invalid configuration: {args.content_type}/{args.subcategory}/{args.complexity}')
+        self.signature = ocr_app.pdf_checkpoint_signature(
+            args.content_type, args.subcategory, args.complexity, args.tiling, args.skip_blank
+        )
+        self.signature.update(
+            preprocess=args.preprocess, video=[args.video_method, args.video_frames, args.video_interval], roi=args.roi
+        )
+        self.config_id = hashlib.sha1(json.dumps(self.signature, sort_keys=True).encode()).hexdigest()[:12]
+        self.regions = parse_roi(args.roi) if args.roi and args.roi != 'auto' else None
+        self.prompt = ocr_app.prompts['basic']
+        self.labels = {'endpoint': 'cli', 'complexity': args.complexity}
+        self.tile_size = ocr_app.tiling_reference_size(self.config, args.content_type, args.subcategory)
+        self.writer = OutputWriter(
+            args.output, {'jsonl', 'markdown'} if args.format == 'both' else {args.format}, subtitles=args.subtitles
+        )
+        self.executor = ThreadPoolExecutor(max_workers=args.jobs, thread_name_prefix='ocr-cli')
+        # 最多 2 × jobs 個已渲染的頁面在記憶體中等待推理
+        self.slots = threading.BoundedSemaphore(args.jobs * 2)
+        self.stats = {'files': 0, 'files_skipped': 0, 'pages': 0, 'pages_reused': 0, 'pages_blank': 0, 'errors': 0}
+        self.stats_lock = threading.Lock()
+        self.started = time.time()
+
+    # ---------------------------------------------------------------- 單頁
+
+    def _count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def _ocr_page(self, job, page, image, timestamp=None):
+        ocr_app.set_inference_priority(self.args.priority)
+        t_start = time.time()
+        record = {'source': job.source, 'kind': job.kind, 'page': page, 'config_id': self.config_id}
+        if timestamp is not None:
+            record['timestamp'] = timestamp
+        try:
+            if self.args.preprocess:
+                processed = ocr_app.preprocess_single_image(image, ocr_app.PREPROCESS_PRESETS[self.args.preprocess])
+                image.close()
+                image = processed.convert('RGB') if processed.mode != 'RGB' else processed
+
+            blank = False
+            if self.args.skip_blank:
+                blank, _ = ocr_app.detect_blank_page(image)
+            if blank:
+                record.update(text='', skipped='blank')
+                self._count('pages_blank')
+            else:
+                page_config, auto_choice = ocr_app.resolve_page_config(
+                    self.config, self.args.content_type, self.args.subcategory, image
+                )
+                record['text'] = self._infer(image, page_config)
+                if auto_choice:
+                    record['auto_complexity'] = auto_choice
+            record['seconds'] = round(time.time() - t_start, 3)
+            self._count('pages')
+        except Exception as e:
+            record['error'] = f'{type(e).__name__}: {e}'
+            self._count('errors')
+        finally:
+            image.close()
+            self.slots.release()
+        self._finish_page(job, record)
+
+    def _infer(self, image, page_config):
+        while True:
+            try:
+                return ocr_app.ocr_image_with_config(
+                    image, self.prompt, page_config, tiling=self.args.tiling,
+                    timeout=self.args.timeout, labels=self.labels
+                )
+            except AdmissionRejected as e:
+                # --jobs 大於准入佇列容量時，依建議時間重試
+                time.sleep(e.retry_after)
+
+    def _finish_page(self, job, record):
+        if 'text' in record or 'error' in record:
+            self.writer.write_page(record)
+        with job.lock:
+            job.pending -= 1
+            if 'error' in record:
+                job.failed += 1
+            else:
+                job.records[record['page']] = record
+            done = job.submitted_all and job.pending == 0
+        if done:
+            self._finish_file(job)
+
+    def _finish_file(self, job):
+        if job.failed:
+            print(f"❌ {job.rel_path}: {job.failed} page(s) failed, will retry on the next run")
+            return
+        self.writer.write_file(job)
+        self._count('files')
+        elapsed = time.time() - self.started
+        print(f"✅ {job.rel_path}: {len(job.records)} page(s) | total {self.stats['pages']} pages, "
+              f"{self.stats['pages'] / elapsed * 60:.1f} pages/min")
+
+    # ---------------------------------------------------------------- 單檔
+
+    def _submit(self, job, page, image, timestamp=None):
+        reused = self.writer.page_result(job.source, self.config_id, page)
+        if reused is not None:
+            image.close()
+            with job.lock:
+                job.records[page] = reused
+            self._count('pages_reused')
+            return
+        with job.lock:
+            job.pending += 1
+        self.slots.acquire()
+        self.executor.submit(self._ocr_page, job, page, image, timestamp)
+
+    def _pages(self, path, kind):
+        """依序產生 (page, PIL.Image, 影片時間戳秒數或 None)；PDF 與影片在主執行緒渲染，與推理重疊進行"""
+        if kind == 'image':
+            yield 1, Image.open(path).convert('RGB'), None
+        elif kind == 'pdf':
+            import fitz
+            with fitz.open(path) as doc:
+                for index, page in enumerate(doc):
+                    if self.args.skip_blank and ocr_app.is_pdf_page_empty(page):
+                        continue
+                    scale = ocr_app.pdf_page_render_scale(page, self.tile_size, self.args.tiling)
+                    yield index + 1, ocr_app.render_pdf_page(page, None, index + 1, scale), None
+        else:
+            import cv2
+            regions = ocr_app.detect_video_roi(str(path)) if self.args.roi == 'auto' else self.regions
+            frames = ocr_app.iter_video_frames(
+                str(path), method=self.args.video_method,
+                interval=self.args.video_interval, total_frames=self.args.video_frames, regions=regions
+            )
+            for index, (_, position_ms, frame) in enumerate(frames):
+                image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                yield index + 1, image, round(position_ms / 1000.0, 3)
+
+    def process_file(self, path, rel_path):
+        kind = file_kind(path)
+        stat = path.stat()
+        fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime, 'config_id': self.config_id}
+        if not self.args.force and self.writer.is_file_done(str(path), fingerprint):
+            self._count('files_skipped')
+            return
+
+        job = FileJob(str(path), rel_path, kind, fingerprint)
+        try:
+            for page, image, timestamp in self._pages(path, kind):
+                self._submit(job, page, image, timestamp)
+        except Exception as e:
+            print(f"❌ {rel_path}: {type(e).__name__}: {e}")
+            job.failed += 1
+            self._count('errors')
+        with job.lock:
+            job.submitted_all = True
+            done = job.pending == 0
+        if done:
+            self._finish_file(job)
+
+    def run(self, inputs):
+        try:
+            for path, rel_path in inputs:
+                self.process_file(path, rel_path)
+            self.executor.shutdown(wait=True)
+        finally:
+            self.writer.close()
+        elapsed = time.time() - self.started
+        return dict(
+            self.stats,
+            seconds=round(elapsed, 1),
+            pages_per_minute=round(self.stats['pages'] / elapsed * 60, 2) if elapsed > 0 else 0.0
+        )
+
+
+def parse_roi(value):
+    """'x,y,w,h;x,y,w,h'（畫面比例）→ 區域列表，不合法時拋出 ValueError"""
+    regions = [part.split(',') for part in value.split(';') if part.strip()]
+    return video_roi.parse_regions(regions)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Headless batch OCR for image, PDF and video files')
+    parser.add_argument('inputs', nargs='*', help='檔案或目錄（遞迴）')
+    parser.add_argument('--file-list', help='每行一個路徑的清單檔（- 為 stdin）')
+    parser.add_argument('-o', '--output', default='ocr_output', help='輸出目錄（預設 %(default)s）')
+    parser.add_argument('--format', choices=('jsonl', 'markdown', 'both'), default='both')
+    parser.add_argument('--content-type', default='Document')
+    parser.add_argument('--subcategory', default='Academic')
+    parser.add_argument('--complexity', default='Medium', help='Tiny / Small / Medium / Large / Gundam / Auto')
+    parser.add_argument('--tiling', choices=ocr_app.TILING_MODES, default='off')
+    parser.add_argument('--preprocess', choices=sorted(ocr_app.PREPROCESS_PRESETS), help='推理前套用的前處理預設')
+    parser.add_argument('--no-skip-blank', dest='skip_blank', action='store_false', help='空白頁也送去推理')
+    parser.add_argument('--video-method', choices=('fixed_count', 'fixed_interval', 'scene_change'), default='fixed_count')
+    parser.add_argument('--video-frames', type=int, default=100, help='每支影片最多截取的幀數')
+    parser.add_argument('--video-interval', type=float, default=1, help='fixed_interval 模式每秒截取張數')
+    parser.add_argument('--roi', help="影片只辨識文字區域：auto 自動偵測，或 'x,y,w,h;...'（畫面比例）")
+    parser.add_argument('--subtitles', choices=transcript.FORMATS, help='影片另外輸出合併時間區段後的字幕檔')
+    parser.add_argument('--jobs', type=int, default=ocr_app.MAX_CONCURRENT_INFERENCES, help='同時推理的頁數')
+    parser.add_argument('--priority', choices=ocr_app.BATCH_PRIORITIES, default='bulk')
+    parser.add_argument('--timeout', type=float, default=160, help='單次推理逾時秒數')
+    parser.add_argument('--force', action='store_true', help='忽略先前的結果，全部重新辨識')
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.file_list:
+        parser.error('no inputs given')
+    if args.jobs < 1:
+        parser.error('--jobs must be >= 1')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    inputs = collect_inputs(args.inputs, args.file_list)
+    if not inputs:
+        print("❌ No supported files found")
+        return 1
+
+    try:
+        batch = BatchOCR(args)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    if args.force:
+        batch.writer.done_pages.clear()
+
+    if not ocr_app.preload_model_main_process():
+        return 1
+    print(f"📂 {len(inputs)} file(s) → {batch.writer.output_dir} (jobs={args.jobs}, config {batch.config_id})")
+    summary = batch.run(inputs)
+    print(f"📊 Done: {summary['pages']} pages OCR'd ({summary['pages_reused']} reused, {summary['pages_blank']} blank), "
+          f"{summary['files']} files completed, {summary['files_skipped']} skipped, {summary['errors']} errors "
+          f"in {summary['seconds']}s → {summary['pages_per_minute']} pages/min")
+    print(json.dumps(summary))
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""常駐 OCR 推理 worker：只匯入推理需要的模組，模型載入一次後持續處理工作
+
+由 worker_pool 以獨立進程啟動（python ocr_worker.py <socket>），不會重新匯入 app.py
+（Flask 路由、OpenCV、PyMuPDF 都不需要）。通訊使用 multiprocessing.connection：
+    worker → 父進程：{'event': 'loaded'} → {'event': 'ready'}（或 {'event': 'failed'}）
+    父進程 → worker：{'op': 'ocr', ...}，worker 回傳結果 dict；{'op': 'canary'} 健康探測；{'op': 'shutdown'} 結束
+
+環境變數：
+    OCR_WORKER_AUTHKEY    連線驗證金鑰（hex，由 worker_pool 產生）
+    OCR_MODEL_BACKEND     mlx（預設）或 stub（bench/stub_model.py 的確定性替身模型）
+"""
+
+import gc
+import io
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Listener
+from pathlib import Path
+
+from PIL import Image
+
+import tracing
+
+os.environ.setdefault("HF_HOME", str(Path.home() / "hf_cache"))
+
+MODEL_PATH = "mlx-community/DeepSeek-OCR-8bit"
+WARMUP_PROMPT = '<image>\nFree OCR.'
+WARMUP_MAX_TOKENS = 16
+
+_model_instance = None
+_processor_instance = None
+_generate = None
+
+
+def _log(message):
+    print(f"[{os.getpid()}] {message}", flush=True)
+
+
+def load_model():
+    """載入模型（mlx 在此才匯入）；失敗時拋出例外"""
+    global _model_instance, _processor_instance, _generate
+    if _model_instance is not None:
+        return
+
+    if os.environ.get('OCR_MODEL_BACKEND', 'mlx') == 'stub':
+        sys.path.insert(0, str(Path(__file__).resolve().parent))
+        from bench import stub_model
+        stub_model.install()
+
+    import mlx.core as mx
+    from mlx_vlm import load, generate
+
+    _log("🚀 Loading MLX DeepSeek-OCR model in worker...")
+    _model_instance, _processor_instance = load(MODEL_PATH)
+    _generate = generate
+    _log("✅ Model loaded successfully in worker!")
+
+    # 確保設備設置正確
+    if mx.metal.is_available():
+        _log("🔧 Metal available, using default device (GPU)")
+    else:
+        mx.set_default_device(mx.cpu)
+        _log("🔧 Set default device to CPU")
+
+
+def generate_with_retries(img, prompt, max_tokens, grounding=False):
+    """呼叫 generate()，返回 (text, retries)；grounding 時保留區塊類型與座標標記
+
+    修復 mlx-vlm 0.3.5 bug：stream_generate() 可能返回空生成器，導致 last_response 為 None
+    解決方案：使用較小的 max_tokens 值，並添加重試機制
+    """
+    max_retries = 3
+    retry_tokens = [min(max_tokens, 2048), min(max_tokens, 512), min(max_tokens, 256)]
+    res = None
+    retries = 0
+
+    for attempt in range(max_retries):
+        try:
+            retries = attempt
+            current_max_tokens = retry_tokens[attempt]
+            _log(f"🔍 嘗試 {attempt + 1}/{max_retries}: max_tokens={current_max_tokens}")
+
+            with tracing.span('worker.generate', attempt=attempt + 1, max_tokens=current_max_tokens):
+                res = _generate(
+                    model=_model_instance,
+                    processor=_processor_instance,
+                    image=img,
+                    prompt=prompt,
+                    max_tokens=current_max_tokens,
+                    temperature=0.0,
+                    use_cache=False
+                )
+
+            # 如果成功，跳出循環
+            if res is not None:
+                break
+
+        except AttributeError as e:
+            if "'NoneType' object has no attribute 'token'" in str(e):
+                _log(f"⚠️ 嘗試 {attempt + 1} 失敗: mlx-vlm bug (last_response=None)")
+                if attempt < max_retries - 1:
+                    time.sleep(1)
+                    continue
+                raise RuntimeError("mlx-vlm generate() 失敗：stream_generate() 沒有產生響應。這可能是 CPU 模式下的已知問題。")
+            raise
+        except Exception as e:
+            _log(f"⚠️ 嘗試 {attempt + 1} 失敗: {type(e).__name__}: {str(e)[:100]}")
+            if attempt < max_retries - 1:
+                time.sleep(1)
+                continue
+            raise
+
+    # 檢查結果是否有效
+    if res is None:
+        raise RuntimeError("generate() 在所有重試後仍返回 None")
+
+    text = res.text if hasattr(res, 'text') else str(res)
+    if grounding:
+        return text.strip(), retries
+    text = re.sub(r'<\|grounding\|>|\[\[.*?\]\]', '', text).strip()
+    return text, retries
+
+
+def warm_up():
+    """以極小的空白圖片跑一次推理，讓第一個真實請求不必承擔初始化開銷"""
+    img = Image.new('RGB', (64, 64), 'white')
+    try:
+        generate_with_retries(img, WARMUP_PROMPT, WARMUP_MAX_TOKENS)
+    finally:
+        img.close()
+
+
+def run_canary():
+    """健康探測：與暖機相同的極小推理，返回耗時"""
+    t_start = time.time()
+    try:
+        warm_up()
+    except Exception as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+    return {'success': True, 'canary': time.time() - t_start}
+
+
+def run_job(image_bytes, prompt, max_tokens, grounding=False):
+    """執行一次 OCR，返回結果 dict（成功時含 text 與 timing，失敗時含 error）"""
+    t_started = time.time()
+    img = None
+    try:
+        t_load_start = time.time()
+        with tracing.span('worker.image_decode', bytes=len(image_bytes)):
+            img = Image.open(io.BytesIO(image_bytes))
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+        t_load_end = time.time()
+        _log(f"📸 Image loaded: {img.size}, mode: {img.mode}, time: {t_load_end - t_load_start:.2f}s")
+        _log(f"🔍 Prompt: {prompt[:100]}... Max tokens: {max_tokens}")
+
+        t_ocr_start = time.time()
+        text, retries = generate_with_retries(img, prompt, max_tokens, grounding)
+        t_ocr_end = time.time()
+
+        _log(f"✅ OCR completed in {t_ocr_end - t_ocr_start:.2f}s, text length: {len(text)}")
+        return {'success': True, 'text': text, 'timing': {
+            'started_at': t_started,
+            'load': t_load_end - t_load_start,
+            'inference': t_ocr_end - t_ocr_start,
+            'retries': retries
+        }}
+    except Exception as e:
+        traceback.print_exc()
+        return {'error': f'OCR processing failed in worker: {str(e)}'}
+    finally:
+        if img is not None:
+            img.close()
+        gc.collect()
+
+
+def handle_job(job):
+    # 父進程啟用追蹤時收集 worker 端 span，隨結果一起返回
+    trace_context = job.get('trace_context')
+    grounding = job.get('grounding', False)
+    if trace_context is None:
+        return run_job(job['image'], job['prompt'], job['max_tokens'], grounding)
+    with tracing.collect() as spans, tracing.attach(trace_context):
+        result = run_job(job['image'], job['prompt'], job['max_tokens'], grounding)
+    result['spans'] = spans
+    return result
+
+
+def serve(address, authkey):
+    """接受父進程的連線，載入並暖機模型後逐一處理工作"""
+    with Listener(address, family='AF_UNIX', authkey=authkey) as listener:
+        conn = listener.accept()
+
+    with conn:
+        try:
+            t_start = time.time()
+            load_model()
+            t_loaded = time.time()
+            conn.send({'event': 'loaded', 'model_load': t_loaded - t_start})
+            warm_up()
+            conn.send({'event': 'ready', 'warmup': time.time() - t_loaded})
+        except Exception as e:
+            traceback.print_exc()
+            conn.send({'event': 'failed', 'error': f'{type(e).__name__}: {e}'})
+            return 1
+
+        while True:
+            try:
+                job = conn.recv()
+            except EOFError:
+                return 0
+            if job.get('op') == 'shutdown':
+                return 0
+            if job.get('op') == 'canary':
+                conn.send(run_canary())
+                continue
+            conn.send(handle_job(job))
+
+
+def _exit_with_parent(parent_pid, interval=1.0):
+    """父進程結束（包括尚未連線就被終止）時跟著結束，避免留下孤兒 worker"""
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(interval)
+        os._exit(1)
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print('usage: ocr_worker.py <socket-path>', file=sys.stderr)
+        return 2
+    _exit_with_parent(os.getppid())
+    authkey = bytes.fromhex(os.environ.get('OCR_WORKER_AUTHKEY', ''))
+    return serve(argv[0], authkey)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""多階段管線：每個階段一條執行緒，階段之間以有界佇列連接
+
+    with Pipeline([('rasterize', render), ('preprocess', prepare), ('inference', infer)], depth=2) as pipe:
+        for output in pipe.run(items):
+            ...
+
+- 輸出順序與輸入相同；階段函數返回 Done(value) 時略過後續階段，直接輸出 value
+- 任一階段拋出例外時停止接收新項目，先輸出之前的結果，再於該項目的位置重新拋出原例外
+- depth=0 時在呼叫端執行緒中依序執行（不重疊），用於比較與除錯
+- 每條執行緒複製呼叫端的 contextvars（追蹤 span、推理優先級）
+- source 指定名稱時，讀取輸入迭代器（例如影片解碼）也計入一個階段的統計
+"""
+
+import contextvars
+import queue
+import threading
+import time
+
+_END = object()
+
+
+class Done:
+    """階段函數的提前結束標記（例如空白頁、已有檢查點）"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0       # 執行階段函數的時間
+        self.starved = 0.0    # 等待上游項目的時間
+        self.blocked = 0.0    # 下游佇列已滿、等待放入的時間
+
+    def as_dict(self, wall):
+        return {
+            'items': self.items,
+            'busy_seconds': round(self.busy, 4),
+            'starved_seconds': round(self.starved, 4),
+            'blocked_seconds': round(self.blocked, 4),
+            'utilization': round(self.busy / wall, 3) if wall > 0 else 0.0
+        }
+
+
+class Pipeline:
+    def __init__(self, stages, depth=2, source=None):
+        self.stages = list(stages)
+        self.depth = depth
+        self.stats = [StageStats(name) for name, _ in self.stages]
+        self.source_stats = StageStats(source) if source else None
+        self.wall = 0.0
+        self._closed = threading.Event()
+        self._halt_at = None   # 第一個失敗的階段；其上游停止處理新項目
+        self._threads = []
+        self._started = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def run(self, items):
+        """依序產生每個項目的最終輸出"""
+        self._started = time.perf_counter()
+        try:
+            if self.depth <= 0:
+                yield from self._run_inline(items)
+            else:
+                yield from self._run_threaded(items)
+        finally:
+            self.wall = time.perf_counter() - self._started
+
+    def _call(self, index, item):
+        stats = self.stats[index]
+        start = time.perf_counter()
+        try:
+            return self.stages[index][1](item)
+        finally:
+            stats.busy += time.perf_counter() - start
+            stats.items += 1
+
+    def _iterate(self, items):
+        """逐一取出輸入項目，source 有名稱時計時"""
+        items = iter(items)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    if self.source_stats is not None:
+                        self.source_stats.busy += time.perf_counter() - start
+                if self.source_stats is not None:
+                    self.source_stats.items += 1
+                yield item
+        finally:
+            # 提前停止時關閉來源生成器（例如釋放影片解碼器）
+            if hasattr(items, 'close'):
+                items.close()
+
+    def _run_inline(self, items):
+        source = self._iterate(items)
+        try:
+            yield from self._inline_items(source)
+        finally:
+            source.close()
+
+    def _inline_items(self, source):
+        for item in source:
+            for index in range(len(self.stages)):
+                item = self._call(index, item)
+                if isinstance(item, Done):
+                    break
+            yield item.value if isinstance(item, Done) else item
+
+    def _run_threaded(self, items):
+        queues = [queue.Queue(maxsize=self.depth) for _ in range(len(self.stages) + 1)]
+        self._threads.append(threading.Thread(
+            target=contextvars.copy_context().run, args=(self._feed, self._iterate(items), queues[0]), name='pipeline-feed', daemon=True
+        ))
+        for index, (name, _) in enumerate(self.stages):
+            context = contextvars.copy_context()
+            self._threads.append(threading.Thread(
+                target=context.run, args=(self._work, index, queues[index], queues[index + 1]),
+                name=f'pipeline-{name}', daemon=True
+            ))
+        for thread in self._threads:
+            thread.start()
+
+        while True:
+            item = queues[-1].get()
+            if item is _END:
+                return
+            if isinstance(item, _Failed):
+                raise item.error
+            yield item.value if isinstance(item, Done) else item
+
+    def _halted(self, index):
+        return self._halt_at is not None and index < self._halt_at
+
+    def _put(self, target, item):
+        """放入下游佇列；管線關閉後放棄（下游已不再讀取）"""
+        while not self._closed.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source):
+        while not self._closed.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _feed(self, items, target):
+        try:
+            for item in items:
+                if self._halted(-1) or not self._put(target, item):
+                    break
+        except Exception as e:
+            self._halt_at = -1
+            self._put(target, _Failed(e))
+        finally:
+            items.close()
+        self._put(target, _END)
+
+    def _work(self, index, source, target):
+        stats = self.stats[index]
+        failed = False
+        while True:
+            start = time.perf_counter()
+            item = self._get(source)
+            stats.starved += time.perf_counter() - start
+            if item is _END:
+                self._put(target, item)
+                return
+            if isinstance(item, (_Failed, Done)):
+                # 提前結束的項目與上游的錯誤直接往下傳
+                self._put(target, item)
+                continue
+            if failed or self._halted(index):
+                # 本階段或下游已失敗，丟棄之後的項目
+                continue
+            try:
+                result = self._call(index, item)
+            except Exception as e:
+                failed = True
+                if self._halt_at is None or index < self._halt_at:
+                    self._halt_at = index
+                self._put(target, _Failed(e))
+                continue
+            start = time.perf_counter()
+            self._put(target, result)
+            stats.blocked += time.perf_counter() - start
+
+    def close(self):
+        """停止所有階段並等待執行緒結束（進行中的階段函數會執行完畢）"""
+        self._closed.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def wait_closed(self, timeout):
+        """等待管線關閉，最多 timeout 秒；已關閉時回傳 True（供階段函數中斷重試等待）"""
+        return self._closed.wait(timeout)
+    
+    def report(self):
+        """各階段忙碌時間與利用率（忙碌時間 / 管線總時間）"""
+        wall = self.wall or (time.perf_counter() - self._started if self._started else 0.0)
+        stats = ([self.source_stats] if self.source_stats is not None else []) + self.stats
+        return {
+            'depth': self.depth,
+            'wall_seconds': round(wall, 4),
+            'stages': {stage.name: stage.as_dict(wall) for stage in stats}
+        }
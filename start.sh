@@ -43,6 +43,15 @@ else
     echo "依賴已安裝"
 fi
 
+# 正式部署模式：gunicorn 多個 HTTP worker 共用一個 inference server，不清理端口
+# 用法：./start.sh --production（監聽位址等設定見 gunicorn.conf.py）
+if [ "$1" = "--production" ]; then
+    python3 -c "import gunicorn" 2>/dev/null || pip install -r requirements.txt
+    echo ""
+    echo "以 gunicorn 正式部署模式啟動（SIGTERM 會等待進行中的請求完成後再關閉）"
+    exec gunicorn -c gunicorn.conf.py
+fi
+
 # 自動尋找可用端口 + 強制殺掉殭屍進程
 PORT=5000
 MAX_PORT=5010
@@ -25,6 +25,7 @@ let currentPreprocessTaskId = null; // 保存當前前處理任務ID
 let videoFile = null;
 let extractedFrames = [];
 let currentVideoTaskId = null; // 保存當前視頻任務ID
+let extractPollTimer = null; // 背景截圖進度輪詢
 // 前處理狀態變數（新增）
 let imagePreprocessed = false;
 let pdfPreprocessed = false;
@@ -33,6 +34,9 @@ let processedPdfThumbnails = []; // 處理後的PDF縮圖
 let isPdfPreprocessMode = false; // PDF前處理模式標記（新增：用於狀態檢測）
 let isVideoPreprocessMode = false; // 視頻截圖前處理模式標記（新增：用於狀態檢測）
 let processedVideoFrames = []; // 處理後的視頻截圖（類似 processedPdfThumbnails）
+let videoFrameTimestamps = {}; // 截圖編號 → 影片時間（秒），用於字幕
+let videoOcrResults = []; // 截圖批次 OCR 的逐幀結果（含 timestamp）
+let transcriptTaskId = null; // 直接辨識影片的任務ID（結果保存在伺服器）
 
 // ===== DOM 元素获取 =====
 const fileInput = document.getElementById('fileInput');
@@ -47,6 +51,8 @@ const resultDiv = document.getElementById('result');
 const successDiv = document.getElementById('success');
 const copyBtn = document.getElementById('copyBtn');
 const downloadBtn = document.getElementById('downloadBtn');
+const transcriptControls = document.getElementById('transcriptControls');
+const downloadTranscriptBtn = document.getElementById('downloadTranscriptBtn');
 
 // OCR 相關元素
 const modeSelect = document.getElementById('modeSelect');
@@ -99,6 +105,7 @@ const videoDropZone = document.getElementById('videoDropZone');
 const extractFramesBtn = document.getElementById('extractFramesBtn');
 const downloadFramesBtn = document.getElementById('downloadFramesBtn');
 const sendFramesToOcrBtn = document.getElementById('sendFramesToOcrBtn');
+const streamVideoOcrBtn = document.getElementById('streamVideoOcrBtn');
 const framesPreview = document.getElementById('framesPreview');
 
 // OCR Tab 前處理選項元素（新增）
@@ -129,7 +136,7 @@ const complexityMap = {
     'Gundam': 800
 };
 
-const complexityNames = ['Tiny', 'Small', 'Medium', 'Large', 'Gundam'];
+const complexityNames = ['Tiny', 'Small', 'Medium', 'Large', 'Gundam', 'Auto'];
 
 // ===== 分類選擇事件監聽 =====
 modeSelect.addEventListener('change', (e) => {
@@ -166,6 +173,10 @@ function updateSubcategoryOptions() {
 
 // ===== 更新配置顯示 =====
 function updateConfigDisplay() {
+    if (currentComplexity === 'Auto') {
+        complexityLabel.textContent = 'Auto (依頁面內容自動選擇)';
+        return;
+    }
     const tokens = complexityMap[currentComplexity] || 256;
     const hint = currentComplexity === 'Medium' ? ' ⭐ 推薦' : '';
     complexityLabel.textContent = `${currentComplexity} (${tokens} tokens)${hint}`;
@@ -506,7 +517,9 @@ async function initPDFPages(file) {
         
         thumbnailsContainer.classList.remove('hidden');
         selectPage(1);
-        batchBtnText.innerText = `開始批次處理 (共 ${totalPages} 頁)`;
+        // 先前上傳過的相同頁面（修訂版中未改動的頁面）會直接沿用辨識結果
+        const unchangedHint = data.unchanged_pages ? `，${data.unchanged_pages} 頁未改變` : '';
+        batchBtnText.innerText = `開始批次處理 (共 ${totalPages} 頁${unchangedHint})`;
         processBatchBtn.disabled = false;
         processSingleBtn.disabled = false;
 
@@ -564,6 +577,8 @@ processImageBtn.addEventListener('click', async () => {
 processBatchBtn.addEventListener('click', () => {
     currentBatchIndex = 0;
     stopProcessing = false;
+    videoOcrResults = [];
+    transcriptTaskId = null;
     resetResults();
     processBatch();
 });
@@ -646,6 +661,7 @@ async function processBatch() {
                 processedImagesMap[String(item.frame)] = item.processed_path;
             });
             requestBody.processed_images = processedImagesMap;
+            requestBody.timestamps = videoFrameTimestamps;
             // 視頻截圖需要傳遞配置參數
             requestBody.content_type = currentMode;
             requestBody.subcategory = currentSubcategory;
@@ -695,6 +711,9 @@ async function processBatch() {
         data.results.forEach(r => {
             displayPageResult(r.page, r.text);
         });
+        if (isVideoMode) {
+            videoOcrResults.push(...data.results);
+        }
 
         const processed = data.processed_pages;
         
@@ -810,6 +829,7 @@ function finishBatch() {
     successDiv.classList.remove('hidden');
     copyBtn.classList.remove('hidden');
     downloadBtn.classList.remove('hidden');
+    showTranscriptControls();
     batchControls.classList.add('hidden');
     batchBtnText.innerText = '批次完成';
     processBatchBtn.disabled = false;
@@ -829,6 +849,41 @@ stopBtn.addEventListener('click', () => {
     batchBtnText.innerText = '已停止';
     processBatchBtn.disabled = false;
     downloadBtn.classList.remove('hidden');
+    showTranscriptControls();
+});
+
+// ===== 影片字幕下載（SRT / WebVTT / JSON） =====
+function showTranscriptControls() {
+    const hasTimestamps = videoOcrResults.some(r => r.timestamp !== undefined && r.timestamp !== null);
+    transcriptControls.classList.toggle('hidden', !(transcriptTaskId || hasTimestamps));
+}
+
+downloadTranscriptBtn.addEventListener('click', async () => {
+    const format = document.getElementById('transcriptFormat').value;
+    // 直接辨識的結果保存在伺服器；截圖批次 OCR 的結果由瀏覽器送出
+    const body = transcriptTaskId
+        ? { task_id: transcriptTaskId, format: format }
+        : { results: videoOcrResults, format: format };
+    
+    try {
+        const response = await fetch('/api/video/transcript', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(body)
+        });
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({ error: `HTTP ${response.status}` }));
+            throw new Error(errorData.error || '字幕產生失敗');
+        }
+        const blob = await response.blob();
+        const a = document.createElement('a');
+        a.href = URL.createObjectURL(blob);
+        a.download = `字幕_${new Date().toISOString().slice(0, 19).replace(/:/g, '-')}.${format}`;
+        a.click();
+        URL.revokeObjectURL(a.href);
+    } catch (error) {
+        showError('字幕下載失敗: ' + error.message);
+    }
 });
 
 // ===== 複製結果 =====
@@ -889,7 +944,7 @@ function resetState() {
         pdfModeSection.classList.add('hidden');
     }
     
-    [successDiv, errorDiv, progressInfo, batchControls, copyBtn, downloadBtn]
+    [successDiv, errorDiv, progressInfo, batchControls, copyBtn, downloadBtn, transcriptControls]
         .forEach(el => el.classList.add('hidden'));
     
     processBatchBtn.disabled = true;
@@ -902,7 +957,7 @@ function resetState() {
 // ===== 重置結果 =====
 function resetResults() {
     resultDiv.innerHTML = '<p class="text-gray-400 text-center mt-20">辨識結果將顯示在這裡</p>';
-    [successDiv, errorDiv, progressInfo, batchControls, copyBtn, downloadBtn]
+    [successDiv, errorDiv, progressInfo, batchControls, copyBtn, downloadBtn, transcriptControls]
         .forEach(el => el.classList.add('hidden'));
 }
 
@@ -1104,6 +1159,8 @@ function switchToVideoTab() {
     videoFile = null;
     extractedFrames = [];
     currentVideoTaskId = null;
+    finishExtraction();
+    document.getElementById('extractProgress').classList.add('hidden');
     // 重置影片相關按鈕狀態
     if (videoFileInput) {
         videoFileInput.value = '';
@@ -1111,6 +1168,10 @@ function switchToVideoTab() {
     if (extractFramesBtn) {
         extractFramesBtn.classList.add('hidden');
     }
+    if (streamVideoOcrBtn) {
+        streamVideoOcrBtn.classList.add('hidden');
+        document.getElementById('keepFramesOption').classList.add('hidden');
+    }
     if (downloadFramesBtn) {
         downloadFramesBtn.classList.add('hidden');
     }
@@ -2502,6 +2563,8 @@ function handleVideoFile(file) {
         document.getElementById('videoInfo').classList.remove('hidden');
         document.getElementById('videoSettings').classList.remove('hidden');
         extractFramesBtn.classList.remove('hidden');
+        streamVideoOcrBtn.classList.remove('hidden');
+        document.getElementById('keepFramesOption').classList.remove('hidden');
         
         document.getElementById('videoInfoContent').innerHTML = `
             <p>🎬 檔名: ${file.name}</p>
@@ -2526,6 +2589,11 @@ document.getElementById('extractionMethod').addEventListener('change', function(
     }
 });
 
+// ===== 文字區域（ROI）切換 =====
+document.getElementById('roiMode').addEventListener('change', function() {
+    document.getElementById('roiRegionsSetting').classList.toggle('hidden', this.value !== 'manual');
+});
+
 // ===== 場景敏感度滑塊顯示（修正 1） =====
 document.getElementById('sceneSensitivity').addEventListener('input', function() {
     const labels = ['低 (更多幀)', '中 (0.5)', '高 (更少幀)'];
@@ -2534,12 +2602,12 @@ document.getElementById('sceneSensitivity').addEventListener('input', function()
     document.getElementById('sensitivityLabel').textContent = `${labels[Math.min(2, Math.max(0, index))]} (${value})`;
 });
 
-// ===== 執行截圖 =====
+// ===== 執行截圖（背景執行，截圖完成一張即顯示一張） =====
 extractFramesBtn.addEventListener('click', async () => {
     if (!videoFile) return;
     
     const settings = getVideoSettings();
-    showLoading('影片截圖中...', '根據影片長度可能需要一些時間');
+    showLoading('上傳影片中...', '根據影片大小可能需要一些時間');
     
     try {
         // 步骤1：上传视频，获取task_id
@@ -2562,35 +2630,223 @@ extractFramesBtn.addEventListener('click', async () => {
         const taskId = uploadData.task_id;
         currentVideoTaskId = taskId; // 保存任務ID
         
-        // 步骤2：提取帧
+        // 步骤2：在背景提取帧，立即返回
         const extractResponse = await fetch('/api/video/extract', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 task_id: taskId,
-                settings: settings
+                settings: settings,
+                background: true
             })
         });
         
         const extractData = await extractResponse.json();
         hideLoading();
         
-        if (extractData.success) {
-            extractedFrames = extractData.frames;
-            displayExtractedFrames(extractData.frames);
-            downloadFramesBtn.classList.remove('hidden');
-            if (sendFramesToOcrBtn) {
-                sendFramesToOcrBtn.classList.remove('hidden');
-            }
-        } else {
+        if (!extractData.success) {
             showError(extractData.error || '截圖失敗');
+            return;
         }
+        
+        extractedFrames = [];
+        displayExtractedFrames(extractedFrames);
+        extractFramesBtn.disabled = true;
+        streamVideoOcrBtn.disabled = true;
+        updateExtractProgress({ status: 'queued', progress: 0, frames_kept: 0 });
+        document.getElementById('extractProgress').classList.remove('hidden');
+        document.getElementById('cancelExtractBtn').classList.remove('hidden');
+        pollExtractStatus(taskId);
     } catch (error) {
         hideLoading();
         showError('截圖失敗: ' + error.message);
     }
 });
 
+// ===== 背景截圖進度：每秒查詢一次，只取回新完成的幀 =====
+async function pollExtractStatus(taskId) {
+    clearTimeout(extractPollTimer);
+    if (taskId !== currentVideoTaskId) return;
+    
+    let data;
+    try {
+        const response = await fetch('/api/video/extract-status', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ task_id: taskId, since: extractedFrames.length })
+        });
+        data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || `HTTP ${response.status}`);
+        }
+    } catch (error) {
+        finishExtraction();
+        showError('截圖失敗: ' + error.message);
+        return;
+    }
+    if (taskId !== currentVideoTaskId) return;
+    
+    if (data.frames.length > 0) {
+        // 保留使用者在截圖進行中已取消勾選的幀
+        document.querySelectorAll('.frame-checkbox').forEach(cb => {
+            const frame = extractedFrames[parseInt(cb.dataset.index)];
+            if (frame) frame.selected = cb.checked;
+        });
+        extractedFrames = extractedFrames.concat(data.frames);
+        displayExtractedFrames(extractedFrames);
+    }
+    updateExtractProgress(data);
+    
+    if (data.status === 'queued' || data.status === 'running') {
+        extractPollTimer = setTimeout(() => pollExtractStatus(taskId), 1000);
+        return;
+    }
+    
+    finishExtraction();
+    if (data.status === 'failed') {
+        showError(data.error || '截圖失敗');
+    }
+    if (extractedFrames.length > 0) {
+        downloadFramesBtn.classList.remove('hidden');
+    }
+}
+
+function updateExtractProgress(data) {
+    const percent = Math.round((data.progress || 0) * 100);
+    document.getElementById('extractProgressBar').style.width = `${percent}%`;
+    let text;
+    if (data.status === 'queued') {
+        text = '排隊中...';
+    } else if (data.status === 'running') {
+        const eta = data.eta_seconds != null ? `，預估剩餘 ${Math.ceil(data.eta_seconds)} 秒` : '';
+        text = `截圖中 ${percent}%（已解碼 ${data.frames_decoded} / ${data.video_frames} 幀，保留 ${data.frames_kept} 張${eta}）`;
+    } else if (data.status === 'cancelled') {
+        text = `已取消，保留 ${data.frames_kept} 張截圖`;
+    } else if (data.status === 'completed') {
+        text = `截圖完成，共 ${data.frames_kept} 張`;
+    } else {
+        text = '截圖失敗';
+    }
+    document.getElementById('extractProgressText').textContent = text;
+}
+
+function finishExtraction() {
+    clearTimeout(extractPollTimer);
+    extractPollTimer = null;
+    extractFramesBtn.disabled = false;
+    streamVideoOcrBtn.disabled = false;
+    document.getElementById('cancelExtractBtn').classList.add('hidden');
+}
+
+document.getElementById('cancelExtractBtn').addEventListener('click', async () => {
+    if (!currentVideoTaskId) return;
+    try {
+        await fetch('/api/video/extract-cancel', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ task_id: currentVideoTaskId })
+        });
+    } catch (error) {
+        showError('取消失敗: ' + error.message);
+    }
+});
+
+// ===== 影片直接 OCR（串流）：幀在伺服器記憶體中去重、前處理並辨識，逐幀返回 =====
+streamVideoOcrBtn.addEventListener('click', async () => {
+    if (!videoFile) return;
+    
+    const keepFrames = document.getElementById('keepFramesCheckbox').checked;
+    transcriptTaskId = null;
+    videoOcrResults = [];
+    resetResults();
+    resultDiv.innerHTML = '';
+    // 串流模式沒有截圖預覽，下載時包含所有保存的截圖
+    extractedFrames = [];
+    framesGrid.innerHTML = '';
+    framesPreview.classList.add('hidden');
+    downloadFramesBtn.classList.add('hidden');
+    document.getElementById('extractProgress').classList.add('hidden');
+    streamVideoOcrBtn.disabled = true;
+    showLoading('上傳影片中...');
+    
+    try {
+        const uploadFormData = new FormData();
+        uploadFormData.append('file', videoFile);
+        const uploadResponse = await fetch('/api/video/upload', {
+            method: 'POST',
+            body: uploadFormData
+        });
+        const uploadData = await uploadResponse.json();
+        if (!uploadData.success) {
+            throw new Error(uploadData.error || '上傳失敗');
+        }
+        currentVideoTaskId = uploadData.task_id;
+        
+        showLoading('影片辨識中...', '結果會逐張顯示');
+        const response = await fetch('/api/video/ocr-stream', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                task_id: currentVideoTaskId,
+                settings: getVideoSettings(),
+                content_type: currentMode,
+                subcategory: currentSubcategory,
+                complexity: currentComplexity,
+                keep_frames: keepFrames
+            })
+        });
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({ error: `HTTP ${response.status}` }));
+            throw new Error(errorData.error || `辨識失敗: HTTP ${response.status}`);
+        }
+        
+        // 逐行解析 NDJSON
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let done = null;
+        while (true) {
+            const { value, done: streamDone } = await reader.read();
+            if (streamDone) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const record = JSON.parse(line);
+                if (record.type === 'frame') {
+                    loadingText.innerText = `影片辨識中... (第 ${record.page} 張，${record.timestamp.toFixed(1)} 秒)`;
+                    if (record.text) {
+                        displayPageResult(`${record.page}（${record.timestamp.toFixed(1)} 秒）`, record.text);
+                    }
+                } else if (record.type === 'error') {
+                    throw new Error(record.error);
+                } else if (record.type === 'done') {
+                    done = record;
+                }
+            }
+        }
+        
+        hideLoading();
+        if (done) {
+            successMessage.textContent = `全部完成！共 ${done.frames} 張截圖，辨識 ${done.ocr} 張（略過重複 ${done.duplicate}、空白 ${done.blank}）`;
+            successDiv.classList.remove('hidden');
+            copyBtn.classList.remove('hidden');
+            downloadBtn.classList.remove('hidden');
+            if (done.kept_frames > 0) {
+                downloadFramesBtn.classList.remove('hidden');
+            }
+            transcriptTaskId = currentVideoTaskId;
+            showTranscriptControls();
+        }
+    } catch (error) {
+        hideLoading();
+        showError('影片辨識失敗: ' + error.message);
+    } finally {
+        streamVideoOcrBtn.disabled = false;
+    }
+});
+
 // === 修正 1 & 11：獲取視頻設定 ===
 function getVideoSettings() {
     const method = document.getElementById('extractionMethod').value;
@@ -2606,10 +2862,25 @@ function getVideoSettings() {
         sensitivity: method === 'scene_change' 
             ? parseFloat(document.getElementById('sceneSensitivity').value) 
             : 0.5,
-        format: document.getElementById('outputFormat').value
+        format: document.getElementById('outputFormat').value,
+        roi: getVideoRoi()
     };
 }
 
+// 文字區域：「x,y,寬,高; ...」（畫面比例），由伺服器驗證
+function getVideoRoi() {
+    const mode = document.getElementById('roiMode').value;
+    if (mode !== 'manual') {
+        return { mode: mode };
+    }
+    const regions = document.getElementById('roiRegions').value
+        .split(';')
+        .map(part => part.trim())
+        .filter(part => part)
+        .map(part => part.split(',').map(v => parseFloat(v)));
+    return { mode: mode, regions: regions };
+}
+
 // ===== 顯示提取的幀 =====
 function displayExtractedFrames(frames) {
     // ===== 修正：確保 framesPreview 元素存在 =====
@@ -2717,7 +2988,8 @@ downloadFramesBtn.addEventListener('click', async () => {
     const selectedIndices = Array.from(document.querySelectorAll('.frame-checkbox:checked'))
         .map(cb => parseInt(cb.dataset.index));
     
-    if (selectedIndices.length === 0) {
+    // 串流模式沒有截圖預覽，空列表表示全部
+    if (selectedIndices.length === 0 && extractedFrames.length > 0) {
         showError('請選擇至少一個幀');
         return;
     }
@@ -2802,6 +3074,7 @@ if (sendFramesToOcrBtn) {
         }
         
         showLoading(`載入截圖中... (${selectedIndices.length} 張)`, '正在從服務器下載圖片');
+        videoFrameTimestamps = {};
         
         try {
             // ===== 修正：載入所有選中的截圖，而不只是第一張 =====
@@ -2849,8 +3122,11 @@ if (sendFramesToOcrBtn) {
                 const blob = await response.blob();
                 
                 // 轉換為File對象
-                const fileName = `frame_${frame.index || index + 1}.jpg`;
-                const file = new File([blob], fileName, { type: 'image/jpeg' });
+                // 截圖可能儲存為 JPEG 或 WebP（伺服器的 OCR_VIDEO_FRAME_FORMAT）
+                const extension = frame.path.toLowerCase().endsWith('.webp') ? 'webp' : 'jpg';
+                const fileName = `frame_${frame.index || index + 1}.${extension}`;
+                videoFrameTimestamps[String(frame.index || index + 1)] = frame.timestamp;
+                const file = new File([blob], fileName, { type: blob.type || 'image/jpeg' });
                 imageFiles.push(file);
             }
             
@@ -0,0 +1,288 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""SQLite（WAL 模式）任務儲存，取代記憶體中的任務 dict，可跨重啟與多個 worker 進程共用"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id    TEXT PRIMARY KEY,
+    kind       TEXT NOT NULL,
+    data       TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_kind_updated ON tasks (kind, updated_at);
+
+CREATE TABLE IF NOT EXISTS task_pages (
+    task_id    TEXT NOT NULL,
+    page       INTEGER NOT NULL,
+    status     TEXT NOT NULL,
+    result     TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (task_id, page)
+);
+CREATE INDEX IF NOT EXISTS idx_task_pages_status ON task_pages (task_id, status);
+
+CREATE TABLE IF NOT EXISTS page_cache (
+    fingerprint TEXT NOT NULL,
+    config      TEXT NOT NULL,
+    result      TEXT NOT NULL,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (fingerprint, config)
+);
+CREATE INDEX IF NOT EXISTS idx_page_cache_updated ON page_cache (updated_at);
+"""
+
+
+class TaskStore:
+    """以 SQLite 保存任務資料與逐頁狀態；每個執行緒使用獨立連線"""
+
+    def __init__(self, db_path, busy_timeout=30.0):
+        self.db_path = str(db_path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def _transaction(self):
+        """BEGIN IMMEDIATE 交易：讀改寫期間鎖住寫入，保證跨進程原子性"""
+        conn = self._conn()
+        return _Transaction(conn)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---------------------------------------------------------------- 任務
+
+    @staticmethod
+    def _encode(task):
+        data = dict(task)
+        created_at = data.pop('created_at', None)
+        if isinstance(created_at, datetime):
+            created_at = created_at.timestamp()
+        return json.dumps(data, ensure_ascii=False), created_at or time.time()
+
+    @staticmethod
+    def _decode(data, created_at):
+        task = json.loads(data)
+        task['created_at'] = datetime.fromtimestamp(created_at)
+        return task
+
+    def get(self, task_id, kind=None):
+        if kind is None:
+            row = self._conn().execute(
+                'SELECT data, created_at FROM tasks WHERE task_id = ?', (task_id,)
+            ).fetchone()
+        else:
+            row = self._conn().execute(
+                'SELECT data, created_at FROM tasks WHERE task_id = ? AND kind = ?', (task_id, kind)
+            ).fetchone()
+        return self._decode(*row) if row else None
+
+    def exists(self, task_id, kind):
+        row = self._conn().execute(
+            'SELECT 1 FROM tasks WHERE task_id = ? AND kind = ?', (task_id, kind)
+        ).fetchone()
+        return row is not None
+
+    def put(self, task_id, kind, task):
+        data, created_at = self._encode(task)
+        self._conn().execute(
+            'INSERT INTO tasks (task_id, kind, data, created_at, updated_at) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(task_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+            (task_id, kind, data, created_at, time.time())
+        )
+
+    def update_fields(self, task_id, **fields):
+        """原子地合併更新任務欄位，返回更新後的任務；任務不存在時返回 None"""
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data, created_at FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+            if row is None:
+                return None
+            task = json.loads(row[0])
+            task.update(fields)
+            conn.execute(
+                'UPDATE tasks SET data = ?, updated_at = ? WHERE task_id = ?',
+                (json.dumps(task, ensure_ascii=False), time.time(), task_id)
+            )
+        task['created_at'] = datetime.fromtimestamp(row[1])
+        return task
+
+    def touch(self, task_id):
+        self._conn().execute('UPDATE tasks SET updated_at = ? WHERE task_id = ?', (time.time(), task_id))
+
+    def delete(self, task_id):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM task_pages WHERE task_id = ?', (task_id,))
+            conn.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+
+    def count(self, kind):
+        return self._conn().execute('SELECT COUNT(*) FROM tasks WHERE kind = ?', (kind,)).fetchone()[0]
+
+    def items(self, kind):
+        rows = self._conn().execute(
+            'SELECT task_id, data, created_at FROM tasks WHERE kind = ?', (kind,)
+        ).fetchall()
+        return [(task_id, self._decode(data, created_at)) for task_id, data, created_at in rows]
+
+    def pop_expired(self, kind, idle_seconds):
+        """取出並刪除閒置超過 idle_seconds 的任務；多進程同時執行時每個任務只會被取出一次"""
+        cutoff = time.time() - idle_seconds
+        with self._transaction() as conn:
+            rows = conn.execute(
+                'SELECT task_id, data, created_at FROM tasks WHERE kind = ? AND updated_at < ?', (kind, cutoff)
+            ).fetchall()
+            for task_id, _, _ in rows:
+                conn.execute('DELETE FROM task_pages WHERE task_id = ?', (task_id,))
+                conn.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+        return [(task_id, self._decode(data, created_at)) for task_id, data, created_at in rows]
+
+    # ---------------------------------------------------------------- 逐頁狀態
+
+    def set_page(self, task_id, page, status, result=None):
+        """原子地寫入單頁狀態（pending / processing / completed / failed）"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO task_pages (task_id, page, status, result, updated_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(task_id, page) DO UPDATE SET status = excluded.status, '
+                'result = excluded.result, updated_at = excluded.updated_at',
+                (task_id, page, status, json.dumps(result, ensure_ascii=False) if result is not None else None, now)
+            )
+            conn.execute('UPDATE tasks SET updated_at = ? WHERE task_id = ?', (now, task_id))
+
+    def get_pages(self, task_id, status=None):
+        """返回 {page: {'status': ..., 'result': ...}}，可按狀態過濾"""
+        if status is None:
+            rows = self._conn().execute(
+                'SELECT page, status, result FROM task_pages WHERE task_id = ? ORDER BY page', (task_id,)
+            ).fetchall()
+        else:
+            rows = self._conn().execute(
+                'SELECT page, status, result FROM task_pages WHERE task_id = ? AND status = ? ORDER BY page',
+                (task_id, status)
+            ).fetchall()
+        return {
+            page: {'status': page_status, 'result': json.loads(result) if result else None}
+            for page, page_status, result in rows
+        }
+
+    # ---------------------------------------------------------------- 頁面結果快取（依內容指紋跨任務共用）
+
+    def get_cached_page(self, fingerprint, config):
+        """相同內容指紋與設定的頁面結果；命中時更新使用時間"""
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT result FROM page_cache WHERE fingerprint = ? AND config = ?', (fingerprint, config)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            'UPDATE page_cache SET updated_at = ? WHERE fingerprint = ? AND config = ?', (time.time(), fingerprint, config)
+        )
+        return json.loads(row[0])
+
+    def put_cached_page(self, fingerprint, config, result):
+        self._conn().execute(
+            'INSERT INTO page_cache (fingerprint, config, result, updated_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(fingerprint, config) DO UPDATE SET result = excluded.result, updated_at = excluded.updated_at',
+            (fingerprint, config, json.dumps(result, ensure_ascii=False), time.time())
+        )
+
+    def cached_fingerprints(self, fingerprints):
+        """fingerprints 中已有快取結果（不分設定）的指紋集合"""
+        unique = list(set(fingerprints))
+        cached = set()
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            cached.update(row[0] for row in self._conn().execute(
+                f"SELECT DISTINCT fingerprint FROM page_cache WHERE fingerprint IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        return cached
+
+    def prune_page_cache(self, idle_seconds):
+        """刪除超過 idle_seconds 未使用的快取，返回刪除筆數"""
+        cursor = self._conn().execute('DELETE FROM page_cache WHERE updated_at < ?', (time.time() - idle_seconds,))
+        return cursor.rowcount
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+class TaskTable:
+    """以 dict 介面包裝單一種類的任務，沿用原本 pdf_tasks[task_id] 的寫法；
+    取出的任務是副本，修改後須寫回（tasks[task_id] = task 或 update_fields）"""
+
+    def __init__(self, store, kind):
+        self.store = store
+        self.kind = kind
+
+    def __contains__(self, task_id):
+        return bool(task_id) and self.store.exists(task_id, self.kind)
+
+    def __getitem__(self, task_id):
+        task = self.store.get(task_id, self.kind)
+        if task is None:
+            raise KeyError(task_id)
+        return task
+
+    def get(self, task_id, default=None):
+        task = self.store.get(task_id, self.kind) if task_id else None
+        return default if task is None else task
+
+    def __setitem__(self, task_id, task):
+        self.store.put(task_id, self.kind, task)
+
+    def __delitem__(self, task_id):
+        self.store.delete(task_id)
+
+    def __len__(self):
+        return self.store.count(self.kind)
+
+    def items(self):
+        return self.store.items(self.kind)
+
+    def keys(self):
+        return [task_id for task_id, _ in self.items()]
+
+    def update_fields(self, task_id, **fields):
+        return self.store.update_fields(task_id, **fields)
+
+    def pop_expired(self, idle_seconds):
+        return self.store.pop_expired(self.kind, idle_seconds)
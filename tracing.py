@@ -0,0 +1,173 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""輕量追蹤：巢狀 span、跨進程傳遞 trace id，輸出 JSON lines 或 Chrome trace 格式
+
+啟用方式（環境變數）：
+    OCR_TRACE_FILE=/tmp/ocr_trace.jsonl      輸出檔案（未設定時追蹤關閉，span 幾乎零開銷）
+    OCR_TRACE_FORMAT=jsonl | chrome          chrome 格式可直接載入 chrome://tracing 或 Perfetto
+
+worker 進程不直接寫檔：以 collect() 收集 span，隨結果返回父進程後由 export() 寫出。
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# (trace_id, span_id)
+_current = contextvars.ContextVar('ocr_trace_current', default=None)
+# worker 端收集 span 的列表
+_collector = contextvars.ContextVar('ocr_trace_collector', default=None)
+
+_writer_lock = threading.Lock()
+_trace_path = None
+_trace_format = 'jsonl'
+
+
+def configure(path, fmt='jsonl'):
+    """設定輸出檔案與格式；path 為 None 時關閉追蹤"""
+    global _trace_path, _trace_format
+    if fmt not in ('jsonl', 'chrome'):
+        raise ValueError(f'Unknown trace format: {fmt}')
+    _trace_path = path
+    _trace_format = fmt
+
+
+def enabled():
+    return _trace_path is not None or _collector.get() is not None
+
+
+def new_id():
+    return os.urandom(8).hex()
+
+
+def current_context():
+    """目前的追蹤上下文，用於傳給 worker；未啟用時返回 None"""
+    current = _current.get()
+    if current is None or not enabled():
+        return None
+    return {'trace_id': current[0], 'span_id': current[1]}
+
+
+def current_trace_id():
+    current = _current.get()
+    return current[0] if current else None
+
+
+@contextmanager
+def attach(context):
+    """在 worker 中接續父進程傳來的追蹤上下文"""
+    if not context:
+        yield
+        return
+    token = _current.set((context['trace_id'], context['span_id']))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def collect():
+    """收集此區塊內產生的 span（worker 端使用），返回 span 列表"""
+    spans = []
+    token = _collector.set(spans)
+    try:
+        yield spans
+    finally:
+        _collector.reset(token)
+
+
+@contextmanager
+def span(name, **attrs):
+    """記錄一個巢狀 span；沒有上層 span 時開啟新的 trace"""
+    if not enabled():
+        yield None
+        return
+
+    parent = _current.get()
+    trace_id = parent[0] if parent else new_id()
+    record = {
+        'trace_id': trace_id,
+        'span_id': new_id(),
+        'parent_id': parent[1] if parent else None,
+        'name': name,
+        'start': time.time(),
+        'duration': None,
+        'pid': os.getpid(),
+        'tid': threading.get_ident(),
+        'attrs': attrs
+    }
+    token = _current.set((trace_id, record['span_id']))
+    try:
+        yield record
+    except BaseException as e:
+        record['attrs']['error'] = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        record['duration'] = time.time() - record['start']
+        _current.reset(token)
+        _emit(record)
+
+
+def start_span(name, **attrs):
+    """手動開始 span（跨越 before/after request 等無法用 with 的情況），以 finish_span 結束"""
+    manager = span(name, **attrs)
+    record = manager.__enter__()
+    return manager, record
+
+
+def finish_span(handle, error=None):
+    manager, _ = handle
+    if error is not None:
+        manager.__exit__(type(error), error, error.__traceback__)
+    else:
+        manager.__exit__(None, None, None)
+
+
+def _emit(record):
+    spans = _collector.get()
+    if spans is not None:
+        spans.append(record)
+        return
+    export([record])
+
+
+def _to_chrome_event(record):
+    return {
+        'name': record['name'],
+        'cat': 'ocr',
+        'ph': 'X',
+        'ts': int(record['start'] * 1e6),
+        'dur': int((record['duration'] or 0) * 1e6),
+        'pid': record['pid'],
+        'tid': record['tid'],
+        'args': dict(record['attrs'], trace_id=record['trace_id'], span_id=record['span_id'], parent_id=record['parent_id'])
+    }
+
+
+def export(records):
+    """把 span 追加寫入輸出檔案（多進程以 append 模式寫入整行）"""
+    if not records or _trace_path is None:
+        return
+    if _trace_format == 'chrome':
+        lines = [json.dumps(_to_chrome_event(r), ensure_ascii=False) + ',\n' for r in records]
+    else:
+        lines = [json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in records]
+    with _writer_lock:
+        # Chrome trace 的 JSON 陣列格式允許省略結尾的 ]，只需在新檔案開頭寫入 [
+        new_file = _trace_format == 'chrome' and not os.path.exists(_trace_path)
+        with open(_trace_path, 'a', encoding='utf-8') as f:
+            if new_file:
+                f.write('[\n')
+            f.write(''.join(lines))
+
+
+configure(os.environ.get('OCR_TRACE_FILE') or None, os.environ.get('OCR_TRACE_FORMAT', 'jsonl'))
@@ -0,0 +1,135 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""影片 OCR 結果轉字幕：相同或幾乎相同的連續幀合併為時間區段，輸出 SRT / WebVTT / JSON
+
+輸入為逐幀結果 {'page', 'timestamp'（秒）, 'text'}，可帶 'skipped'（'duplicate' / 'blank'）
+或 'error'：
+    - 重複幀延續目前的區段，空白幀結束區段，失敗的幀忽略
+    - 區段結束時間為下一張幀的時間戳；最後一段結束於 duration（未提供時加上平均取樣間隔）
+"""
+
+import json
+import re
+from collections import Counter
+from difflib import SequenceMatcher
+
+FORMATS = ('srt', 'vtt', 'json')
+MIME_TYPES = {
+    'srt': 'application/x-subrip',
+    'vtt': 'text/vtt',
+    'json': 'application/json'
+}
+DEFAULT_SIMILARITY = 0.9
+
+
+def normalize_text(text):
+    """比較用：合併空白、去除首尾空白"""
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+
+def text_similarity(a, b):
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def _representative(texts):
+    """區段內出現最多次的文字（只差空白視為相同，同次數取較早者），避免單幀辨識錯誤"""
+    counts = Counter(normalize_text(text) for text in texts)
+    best = max(counts.values())
+    return next(text for text in texts if counts[normalize_text(text)] == best)
+
+
+def merge_segments(frames, similarity=DEFAULT_SIMILARITY, duration=None):
+    """把逐幀結果合併為 [{'start', 'end', 'text', 'frames'}]"""
+    frames = sorted((f for f in frames if f.get('timestamp') is not None), key=lambda f: f['timestamp'])
+    segments = []
+    current = None
+
+    def close(end):
+        nonlocal current
+        if current is not None:
+            segments.append({
+                'start': current['start'],
+                'end': end,
+                'text': _representative(current['texts']),
+                'frames': current['frames']
+            })
+            current = None
+
+    for frame in frames:
+        if 'error' in frame:
+            continue
+        timestamp = frame['timestamp']
+        if frame.get('skipped') == 'duplicate':
+            if current is not None:
+                current['frames'].append(frame['page'])
+            continue
+        text = normalize_text(frame.get('text'))
+        if not text:
+            close(timestamp)
+            continue
+        if current is not None and text_similarity(text, current['key']) >= similarity:
+            current['texts'].append(frame['text'].strip())
+            current['frames'].append(frame['page'])
+            continue
+        close(timestamp)
+        current = {'start': timestamp, 'key': text, 'texts': [frame['text'].strip()], 'frames': [frame['page']]}
+
+    if current is not None:
+        if duration is None or duration <= current['start']:
+            timestamps = [f['timestamp'] for f in frames]
+            step = (timestamps[-1] - timestamps[0]) / (len(timestamps) - 1) if len(timestamps) > 1 else 1.0
+            duration = timestamps[-1] + step
+        close(duration)
+
+    return [dict(segment, start=round(segment['start'], 3), end=round(segment['end'], 3)) for segment in segments]
+
+
+def _timestamp(seconds, separator):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+
+def _cue_text(text):
+    # 字幕中的空行代表 cue 結束
+    return re.sub(r'\n\s*\n+', '\n', text)
+
+
+def to_srt(segments):
+    blocks = [
+        f"{i}\n{_timestamp(s['start'], ',')} --> {_timestamp(s['end'], ',')}\n{_cue_text(s['text'])}\n"
+        for i, s in enumerate(segments, 1)
+    ]
+    return '\n'.join(blocks)
+
+
+def to_vtt(segments):
+    blocks = [
+        f"{_timestamp(s['start'], '.')} --> {_timestamp(s['end'], '.')}\n{_cue_text(s['text'])}\n"
+        for s in segments
+    ]
+    return 'WEBVTT\n\n' + '\n'.join(blocks)
+
+
+def to_json(segments):
+    return json.dumps({'segments': segments}, ensure_ascii=False, indent=2)
+
+
+def render(segments, fmt):
+    """依格式輸出字幕文字"""
+    if fmt == 'srt':
+        return to_srt(segments)
+    if fmt == 'vtt':
+        return to_vtt(segments)
+    if fmt == 'json':
+        return to_json(segments)
+    raise ValueError(f'Unsupported transcript format: {fmt}')
@@ -0,0 +1,316 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""影片解碼：背景執行緒解碼並預取，選取的幀在執行緒池中編碼，長影片分段在多個進程中並行解碼
+
+    - 固定數量 / 固定間隔：先算出要截取的幀編號；相鄰兩張距離不超過 seek_gap 時以 grab() 依序跳過
+      （只解碼、不轉換色彩），距離較遠才 seek，避免每張都從關鍵幀重新解碼
+    - 場景變化：依序解碼每一幀並與前一幀比較
+    - 分段並行：時間軸切成數段，每個 spawn 進程各自開啟影片、解碼並寫入截圖；場景變化的分段
+      先讀入前一幀作為比較基準，合併後再套用數量上限，結果與依序解碼相同
+    - DecodeProgress 以共享記憶體累計已解碼的時間軸位置（分段進程也能回報）並提供取消旗標
+截圖以 frame_store 寫入（每張一個檔案，或單一容器檔）。
+只使用 OpenCV（FFmpeg）的軟體解碼，不依賴特定平台的硬體加速。
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import frame_store
+import video_roi
+from pipeline import Pipeline
+
+SEEK_GAP = 64         # 相鄰截取幀距離超過此幀數時 seek，否則依序 grab()
+JPEG_QUALITY = 95
+
+
+class DecodeProgress:
+    """已解碼的影片幀數（時間軸位置，跳過的幀也計入）與取消旗標，可在執行緒與分段進程之間共享"""
+
+    def __init__(self):
+        ctx = multiprocessing.get_context('spawn')
+        self._decoded = ctx.Value('q', 0)
+        self._cancel = ctx.Event()
+
+    @property
+    def decoded(self):
+        return self._decoded.value
+
+    def advance(self, frames):
+        with self._decoded.get_lock():
+            self._decoded.value += frames
+
+    def cancel(self):
+        self._cancel.set()
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+
+def open_video(video_path):
+    """開啟影片並返回 (cap, fps, 總幀數)"""
+    import cv2
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise Exception("無法開啟影片檔案")
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_video_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    duration = total_video_frames / fps if fps > 0 else 0
+
+    print(f"📹 影片資訊: {total_video_frames} 幀, {fps:.2f} FPS, {duration:.2f} 秒")
+    return cap, fps, total_video_frames
+
+
+def select_indices(method, fps, total_video_frames, interval, total_frames):
+    """固定間隔（每秒 N 張）/ 固定數量的截取幀編號"""
+    if method == 'fixed_interval':
+        frame_interval = max(1, int(fps / interval))
+    else:
+        frame_interval = max(1, total_video_frames // total_frames)
+    return range(0, total_video_frames, frame_interval)
+
+
+def scene_change_threshold(sensitivity):
+    # 將 sensitivity (0.1-1.0) 轉換為閾值：sensitivity越高，閾值越低，檢測更多變化
+    # sensitivity=0.1(低) → threshold≈0.73, sensitivity=1.0(高) → threshold≈0.40
+    # 閾值範圍：0.4~0.75（大幅提高範圍，增強鑑別度，每秒不超過5張）
+    return (1.0 - sensitivity) * 0.35 + 0.4
+
+
+def _read_selected(cap, indices, limit, regions, seek_gap, progress, start=0):
+    import cv2
+    count = 0
+    position = 0        # 下一次 read() 會讀到的幀編號
+    covered = start     # 已計入進度的時間軸位置（分段從 start 開始）
+    for frame_idx in indices:
+        if progress is not None:
+            if progress.cancelled():
+                return
+            progress.advance(frame_idx + 1 - covered)
+            covered = frame_idx + 1
+        if frame_idx < position or frame_idx - position > seek_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+        else:
+            for _ in range(frame_idx - position):
+                if not cap.grab():
+                    return
+        ret, frame = cap.read()
+        position = frame_idx + 1
+        if ret:
+            if regions:
+                frame = video_roi.crop_frame(frame, regions)
+            count += 1
+            yield frame_idx, cap.get(cv2.CAP_PROP_POS_MSEC), frame
+
+        if count >= limit:
+            break
+
+
+def _scan_scene_changes(cap, start, end, threshold, limit, regions, progress):
+    import cv2
+    count = 0
+    prev_frame = None
+    if start > 0:
+        # 分段解碼：以上一段的最後一幀作為比較基準
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start - 1)
+        ret, prev_frame = cap.read()
+        if ret and regions:
+            prev_frame = video_roi.crop_frame(prev_frame, regions)
+        elif not ret:
+            prev_frame = None
+
+    for frame_idx in range(start, end):
+        if progress is not None:
+            if progress.cancelled():
+                return
+            progress.advance(1)
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if regions:
+            frame = video_roi.crop_frame(frame, regions)
+
+        if prev_frame is not None:
+            # 計算幀間差異
+            diff = cv2.absdiff(prev_frame, frame)
+            change_ratio = np.count_nonzero(diff) / diff.size
+
+            if change_ratio > threshold:
+                count += 1
+                yield frame_idx, cap.get(cv2.CAP_PROP_POS_MSEC), frame
+
+        # cap.read() 每次返回新的陣列，不需要複製
+        prev_frame = frame
+
+        if count >= limit:
+            break
+
+
+def iter_frames(video_path, method='fixed_count', interval=5, total_frames=1000, sensitivity=0.5, regions=None,
+                segment=None, seek_gap=SEEK_GAP, progress=None):
+    """依截圖方式逐一產生 (幀編號, 時間戳毫秒, BGR 幀)；segment=(start, end) 時只處理該範圍內的幀
+
+    seek_gap=0 時每張都 seek（與逐張定位的舊做法相同，用於比較）；progress 取消時提前結束
+    """
+    cap, fps, total_video_frames = open_video(video_path)
+    start, end = segment or (0, total_video_frames)
+    try:
+        if method in ('fixed_interval', 'fixed_count'):
+            indices = [i for i in select_indices(method, fps, total_video_frames, interval, total_frames) if start <= i < end]
+            yield from _read_selected(cap, indices, total_frames, regions, seek_gap, progress, start=start)
+        elif method == 'scene_change':
+            threshold = scene_change_threshold(sensitivity)
+            print(f"🎬 場景變化檢測：敏感度={sensitivity:.2f}, 閾值={threshold:.3f}")
+            yield from _scan_scene_changes(cap, start, end, threshold, total_frames, regions, progress)
+    finally:
+        cap.release()
+
+
+def prefetch(frames, depth):
+    """在背景執行緒中解碼，最多領先 depth 幀；depth <= 0 時在呼叫端依序解碼"""
+    if depth <= 0:
+        yield from frames
+        return
+    with Pipeline([], depth=depth, source='decode') as pipe:
+        yield from pipe.run(frames)
+
+
+def decode_span(method, fps, total_video_frames, interval, total_frames):
+    """需要解碼到的時間軸長度（幀數），用於計算進度"""
+    if method in ('fixed_interval', 'fixed_count'):
+        indices = select_indices(method, fps, total_video_frames, interval, total_frames)[:total_frames]
+        return indices[-1] + 1 if len(indices) else 0
+    return total_video_frames
+
+
+def plan_segments(method, fps, total_video_frames, interval, total_frames, processes, segment_seconds):
+    """長影片切成 processes 段等長的幀範圍；不需分段時返回 None"""
+    duration = total_video_frames / fps if fps > 0 else 0
+    if processes <= 1 or duration < segment_seconds:
+        return None
+    # 固定數量 / 間隔只解碼到最後一張需要的幀
+    end = decode_span(method, fps, total_video_frames, interval, total_frames)
+    if end < processes:
+        return None
+    bounds = [end * i // processes for i in range(processes + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(processes) if bounds[i] < bounds[i + 1]]
+
+
+def _extract_sequential(video_path, output_dir, prefix, settings, regions, segment, prefetch_depth, encode_workers, store,
+                        progress=None, on_frame=None):
+    """解碼（背景執行緒）→ 編碼（執行緒池）→ [{'path', 'frame_index', 'timestamp'（秒）}]
+
+    store 為 frame_store.open_store 的參數；on_frame 在每張幀寫入後呼叫（依序），用於回報部分結果
+    """
+    frames = prefetch(iter_frames(video_path, regions=regions, segment=segment, progress=progress, **settings), prefetch_depth)
+    writer = frame_store.open_store(output_dir, prefix, **store)
+    results = []
+    pool = ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix='frame-encode') if encode_workers > 0 else None
+    pending = deque()
+
+    def written(future, record):
+        future.result()
+        if on_frame is not None:
+            on_frame(record)
+
+    try:
+        for frame_idx, timestamp_ms, frame in frames:
+            index = len(results)
+            record = {'path': writer.path(index), 'frame_index': frame_idx, 'timestamp': round(timestamp_ms / 1000, 3)}
+            results.append(record)
+            if pool is None:
+                writer.write(index, frame)
+                if on_frame is not None:
+                    on_frame(record)
+            else:
+                pending.append((pool.submit(writer.write, index, frame), record))
+                # 編碼跟不上時等待，限制記憶體中待編碼的幀數
+                while len(pending) > encode_workers * 2:
+                    written(*pending.popleft())
+        while pending:
+            written(*pending.popleft())
+    finally:
+        frames.close()
+        if pool is not None:
+            pool.shutdown(wait=True)
+        writer.close()
+    return results
+
+
+_segment_progress = None
+
+
+def _init_segment_worker(progress):
+    global _segment_progress
+    _segment_progress = progress
+
+
+def _extract_segment(job):
+    """分段進程（spawn）的進入點，返回 (幀列表, 是否因取消而中斷)"""
+    frames = _extract_sequential(progress=_segment_progress, **job)
+    return frames, _segment_progress is not None and _segment_progress.cancelled()
+
+
+def extract_frames(video_path, output_dir, method='fixed_count', interval=5, total_frames=1000, sensitivity=0.5,
+                   regions=None, prefetch_depth=8, encode_workers=2, processes=1, segment_seconds=600,
+                   storage='files', image_format='jpeg', quality=JPEG_QUALITY, seek_gap=SEEK_GAP, progress=None,
+                   on_frame=None):
+    """截取幀並寫入 output_dir（frame_NNNNNN.jpg 或 frame.pack），返回 [{'path', 'frame_index', 'timestamp'（秒）}]
+
+    storage / image_format / quality 見 frame_store；progress（DecodeProgress）回報解碼進度並可取消，取消時返回已完成的部分；
+    on_frame 依時間順序收到每張完成的幀（分段解碼時每段完成後一次回報該段）
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    settings = {
+        'method': method, 'interval': interval, 'total_frames': total_frames,
+        'sensitivity': sensitivity, 'seek_gap': seek_gap
+    }
+    store = {'storage': storage, 'image_format': image_format, 'quality': quality}
+    options = {'prefetch_depth': prefetch_depth, 'encode_workers': encode_workers, 'store': store}
+
+    segments = None
+    if processes > 1:
+        cap, fps, total_video_frames = open_video(video_path)
+        cap.release()
+        segments = plan_segments(method, fps, total_video_frames, interval, total_frames, processes, segment_seconds)
+    if not segments:
+        return _extract_sequential(video_path, output_dir, 'frame', settings, regions, None, progress=progress, on_frame=on_frame, **options)
+
+    print(f"🧩 分段並行解碼: {len(segments)} 段 {segments}")
+    jobs = [
+        dict(video_path=str(video_path), output_dir=output_dir, prefix=f'segment{i:02d}', settings=settings,
+             regions=regions, segment=segment, **options)
+        for i, segment in enumerate(segments)
+    ]
+    # 依時間順序合併並重新編號（每段完成即合併）；超過數量上限、或位於被取消的分段之後的幀捨棄
+    writer = frame_store.open_store(output_dir, 'frame', **store)
+    frames = []
+    contiguous = True
+    try:
+        with ProcessPoolExecutor(
+            max_workers=len(jobs), mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_segment_worker, initargs=(progress,)
+        ) as executor:
+            for job, (part, interrupted) in zip(jobs, executor.map(_extract_segment, jobs)):
+                for frame in part:
+                    if not contiguous or len(frames) >= total_frames:
+                        break
+                    writer.adopt(len(frames), frame['path'])
+                    frames.append(dict(frame, path=writer.path(len(frames))))
+                    if on_frame is not None:
+                        on_frame(frames[-1])
+                frame_store.remove_store(output_dir, job['prefix'], **store)
+                if interrupted:
+                    contiguous = False
+    finally:
+        writer.close()
+    return frames
@@ -0,0 +1,135 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""影片文字區域（ROI）：解碼時只保留字幕、跑馬燈、投影片等固定位置的文字區域
+
+區域以畫面比例表示 [x, y, w, h]（0–1），與影片解析度無關：
+    - 手動：請求中直接指定一個或多個矩形
+    - 自動：取樣數幀，找出在多數幀中都有文字行的位置
+多個區域依由上到下的順序垂直拼接成一張圖，每幀仍只推理一次；
+模型輸入只縮小不放大，裁切後的小圖保留原始解析度。
+"""
+
+import numpy as np
+
+ROI_MODES = ('off', 'manual', 'auto')
+
+ROI_CONFIG = {
+    'samples': 12,            # 自動偵測取樣的幀數
+    'analysis_width': 640,    # 偵測時縮放到的寬度
+    'min_gradient': 32,       # 形態學梯度低於此值不視為文字邊緣（Otsu 閾值的下限）
+    'min_presence': 0.3,      # 文字行出現在至少此比例的取樣幀中視為固定文字區域
+    'margin': 0.01,           # 區域向外擴展（畫面比例）
+    'min_area': 0.002,        # 小於畫面面積此比例的區域忽略
+    'max_regions': 4,
+    'max_coverage': 0.7,      # 區域合計超過畫面此比例時不裁切
+    'separator': 8            # 多個區域拼接時的間隔像素
+}
+
+
+def parse_regions(regions):
+    """驗證手動區域 [[x, y, w, h], ...] 或 [{'x', 'y', 'w', 'h'}, ...]，不合法時拋出 ValueError"""
+    if not isinstance(regions, (list, tuple)) or not regions:
+        raise ValueError('regions must be a non-empty list')
+    parsed = []
+    for region in regions:
+        if isinstance(region, dict):
+            region = [region.get(key) for key in ('x', 'y', 'w', 'h')]
+        try:
+            x, y, w, h = (float(v) for v in region)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid region: {region}')
+        if not (0 <= x < 1 and 0 <= y < 1 and w > 0 and h > 0):
+            raise ValueError(f'Region out of range (fractions of the frame): {region}')
+        parsed.append([round(x, 4), round(y, 4), round(min(w, 1 - x), 4), round(min(h, 1 - y), 4)])
+    return parsed
+
+
+def _pixel_boxes(regions, width, height):
+    boxes = []
+    for x, y, w, h in regions:
+        x0, y0 = int(x * width), int(y * height)
+        x1, y1 = max(x0 + 1, int(round((x + w) * width))), max(y0 + 1, int(round((y + h) * height)))
+        boxes.append((x0, y0, min(x1, width), min(y1, height)))
+    return boxes
+
+
+def crop_frame(frame, regions):
+    """裁切 BGR 幀中的區域；多個區域左對齊垂直拼接，間隔與空白處填黑"""
+    height, width = frame.shape[:2]
+    crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in _pixel_boxes(regions, width, height)]
+    if len(crops) == 1:
+        return np.ascontiguousarray(crops[0])
+    gap = ROI_CONFIG['separator']
+    canvas = np.zeros(
+        (sum(c.shape[0] for c in crops) + gap * (len(crops) - 1), max(c.shape[1] for c in crops), frame.shape[2]),
+        dtype=frame.dtype
+    )
+    top = 0
+    for crop in crops:
+        canvas[top:top + crop.shape[0], :crop.shape[1]] = crop
+        top += crop.shape[0] + gap
+    return canvas
+
+
+def _text_line_mask(frame, width):
+    """單幀中像文字行的矩形（形態學梯度 → 水平連接 → 依高度、長寬比、填滿率過濾）"""
+    import cv2
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    height = max(1, int(round(gray.shape[0] * width / gray.shape[1])))
+    gray = cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    otsu, _ = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    binary = (gradient > max(otsu, ROI_CONFIG['min_gradient'])).astype(np.uint8) * 255
+    connected = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, width // 40), 3)))
+
+    mask = np.zeros((height, width), dtype=np.uint8)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(connected)
+    for x, y, w, h, area in stats[1:]:
+        if h < 6 or h > height * 0.15 or w < h * 2 or area < w * h * 0.35:
+            continue
+        mask[y:y + h, x:x + w] = 1
+    return mask
+
+
+def detect_text_regions(frames):
+    """在取樣的 BGR 幀中找出固定位置的文字區域，返回 [[x, y, w, h], ...]（找不到或幾乎全畫面時為空列表）"""
+    import cv2
+    width = ROI_CONFIG['analysis_width']
+    presence = None
+    samples = 0
+    for frame in frames:
+        mask = _text_line_mask(frame, width)
+        presence = mask.astype(np.float32) if presence is None else presence + mask
+        samples += 1
+    if not samples:
+        return []
+    presence /= samples
+    height = presence.shape[0]
+
+    # 文字內容會變（字幕長短不同），以出現過文字的連通區域為範圍，只保留含穩定核心的區域
+    stable = presence >= ROI_CONFIG['min_presence']
+    _, labels, stats, _ = cv2.connectedComponentsWithStats((presence > 0).astype(np.uint8))
+    candidates = []
+    for label in np.unique(labels[stable]):
+        if label == 0:
+            continue
+        x, y, w, h, _ = stats[label]
+        if w * h < ROI_CONFIG['min_area'] * width * height:
+            continue
+        candidates.append((w * h, x, y, w, h))
+    candidates = sorted(candidates, reverse=True)[:ROI_CONFIG['max_regions']]
+
+    margin = ROI_CONFIG['margin']
+    regions = []
+    for _, x, y, w, h in sorted(candidates, key=lambda c: (c[2], c[1])):
+        x0, y0 = max(0.0, x / width - margin), max(0.0, y / height - margin)
+        x1, y1 = min(1.0, (x + w) / width + margin), min(1.0, (y + h) / height + margin)
+        regions.append([round(float(v), 4) for v in (x0, y0, x1 - x0, y1 - y0)])
+    if sum(w * h for _, _, w, h in regions) > ROI_CONFIG['max_coverage']:
+        return []
+    return regions
@@ -0,0 +1,403 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""常駐 OCR worker 進程池（父進程端）
+
+每個 worker 是一個獨立的 ocr_worker.py 進程，啟動後在背景載入並暖機模型；
+暖機完成前的請求會等待，逾時或崩潰的 worker 會被終止並在背景重新啟動；
+啟動失敗的 worker 依指數退避持續重試，直到成功或 pool 關閉。
+空閒的 worker 定期執行極小的 canary 推理，失敗或延遲明顯退化時同樣重新啟動。
+"""
+
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client
+from pathlib import Path
+
+WORKER_SCRIPT = str(Path(__file__).resolve().parent / 'ocr_worker.py')
+
+# worker 狀態
+STARTING = 'starting'     # 進程啟動中
+LOADING = 'loading'       # 載入模型
+WARMING = 'warming'       # 模型已載入，暖機推理中
+READY = 'ready'           # 可處理工作（包括正在處理中）
+FAILED = 'failed'         # 啟動失敗，等待退避後重試
+STOPPED = 'stopped'
+
+
+class WorkerCrashed(RuntimeError):
+    """worker 進程在處理工作時結束"""
+
+
+class WorkerHandle:
+    def __init__(self, worker_id, authkey):
+        self.worker_id = worker_id
+        self.authkey = authkey
+        self.state = STOPPED
+        self.process = None
+        self.conn = None
+        self.jobs = 0
+        self.error = None
+        self.model_load_seconds = None
+        self.warmup_seconds = None
+        self.started_at = None
+        self.ready_at = None
+        self.restarts = -1
+        self.last_restart_reason = None
+        self.canary_seconds = None
+        self.canary_at = None
+        self.canary_regressions = 0     # 連續退化次數
+        self.failures = 0               # 連續啟動失敗次數（就緒後歸零）
+        self.retry_at = None            # 下次重試啟動的時間（time.time()）
+        self.closed = False             # pool 已關閉，啟動中的進程要立即終止
+        self._socket_dir = None
+        self._process_lock = threading.Lock()
+
+    def start(self, startup_timeout):
+        """啟動 worker 並等待暖機完成；失敗時拋出例外"""
+        self.restarts += 1
+        self.state = STARTING
+        self.error = None
+        self.jobs = 0
+        self.canary_seconds = None
+        self.canary_at = None
+        self.canary_regressions = 0
+        self.started_at = time.time()
+        self._socket_dir = tempfile.mkdtemp(prefix='ocr_worker_')
+        address = os.path.join(self._socket_dir, 'worker.sock')
+        env = dict(os.environ, OCR_WORKER_AUTHKEY=self.authkey.hex())
+        with self._process_lock:
+            if self.closed:
+                raise RuntimeError('worker pool is shut down')
+            self.process = subprocess.Popen([sys.executable, WORKER_SCRIPT, address], env=env)
+
+        deadline = time.monotonic() + startup_timeout
+        while self.conn is None:
+            if self.closed:
+                raise RuntimeError('worker pool is shut down')
+            if self.process.poll() is not None:
+                raise WorkerCrashed(f'worker exited during startup (code {self.process.returncode})')
+            if time.monotonic() > deadline:
+                raise TimeoutError('worker startup timed out')
+            try:
+                self.conn = Client(address, family='AF_UNIX', authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                time.sleep(0.05)
+        self.state = LOADING
+
+        while self.state != READY:
+            event = self._recv(deadline - time.monotonic())
+            if event.get('event') == 'loaded':
+                self.model_load_seconds = event['model_load']
+                self.state = WARMING
+            elif event.get('event') == 'ready':
+                self.warmup_seconds = event['warmup']
+                self.ready_at = time.time()
+                self.state = READY
+            elif event.get('event') == 'failed':
+                raise RuntimeError(event.get('error', 'worker failed to load the model'))
+
+    def _recv(self, timeout):
+        if timeout <= 0 or not self.conn.poll(timeout):
+            raise TimeoutError('worker did not respond in time')
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerCrashed(f'worker connection lost: {e}')
+
+    def request(self, message, timeout):
+        try:
+            self.conn.send(message)
+        except OSError as e:
+            raise WorkerCrashed(f'worker connection lost: {e}')
+        return self._recv(timeout)
+
+    def run(self, job, timeout):
+        result = self.request(job, timeout)
+        self.jobs += 1
+        return result
+
+    def stop(self, timeout=5):
+        with self._process_lock:
+            self.closed = True
+        if self.state != READY:
+            # 仍在啟動 / 載入中，無法經由連線要求結束
+            self.kill()
+            return
+        if self.conn is not None:
+            try:
+                self.conn.send({'op': 'shutdown'})
+            except OSError:
+                pass
+            self.conn.close()
+            self.conn = None
+        if self.process is not None and self.process.poll() is None:
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self._remove_socket_dir()
+
+    def kill(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self._remove_socket_dir()
+
+    def _remove_socket_dir(self):
+        # socket 檔案由 worker 在連線後移除，這裡只清掉暫存目錄
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+    def snapshot(self):
+        return {
+            'id': self.worker_id,
+            'state': self.state,
+            'pid': self.process.pid if self.process is not None else None,
+            'jobs': self.jobs,
+            'restarts': max(0, self.restarts),
+            'failures': self.failures,
+            'retry_in_seconds': round(max(0.0, self.retry_at - time.time()), 1) if self.retry_at is not None else None,
+            'last_restart_reason': self.last_restart_reason,
+            'model_load_seconds': round(self.model_load_seconds, 3) if self.model_load_seconds is not None else None,
+            'warmup_seconds': round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            'canary_seconds': round(self.canary_seconds, 3) if self.canary_seconds is not None else None,
+            'canary_age_seconds': round(time.time() - self.canary_at, 1) if self.canary_at is not None else None,
+            'error': self.error
+        }
+
+
+class WorkerPool:
+    """size 個常駐 worker；同時執行的工作數由呼叫端（准入控制）限制在 size 以內
+
+    canary_interval：每個空閒 worker 執行 canary 的間隔秒數（None 停用）
+    canary_regression：canary 耗時超過基準的倍數視為退化，連續 canary_max_regressions 次即重啟
+    canary_min_regression：耗時至少比基準多出的秒數才算退化，避免極短推理的抖動誤判
+    on_canary(worker, seconds, healthy)：每次 canary 完成後呼叫（seconds 為 None 表示失敗）
+    retry_backoff / retry_backoff_max：啟動失敗後第一次重試的等待秒數與上限，每次連續失敗加倍
+    """
+
+    def __init__(self, size, startup_timeout=600.0, max_jobs=None, on_ready=None,
+                 canary_interval=None, canary_timeout=30.0, canary_regression=3.0,
+                 canary_min_regression=1.0, canary_max_regressions=2, on_canary=None,
+                 retry_backoff=5.0, retry_backoff_max=300.0):
+        self.size = size
+        self.startup_timeout = startup_timeout
+        self.max_jobs = max_jobs
+        self.on_ready = on_ready
+        self.canary_interval = canary_interval
+        self.canary_timeout = canary_timeout
+        self.canary_regression = canary_regression
+        self.canary_min_regression = canary_min_regression
+        self.canary_max_regressions = canary_max_regressions
+        self.on_canary = on_canary
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.canary_baseline = None     # 健康 canary 耗時的 EWMA（全部 worker 共用）
+        self._authkey = os.urandom(32)
+        self._workers = [WorkerHandle(i, self._authkey) for i in range(size)]
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started = False
+        self._closed = False
+
+    def start(self):
+        """在背景啟動全部 worker（不阻塞）"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for worker in self._workers:
+            self._start_in_background(worker)
+        if self.canary_interval:
+            threading.Thread(target=self._canary_loop, daemon=True, name='ocr-worker-canary').start()
+
+    def _start_in_background(self, worker):
+        threading.Thread(target=self._start_worker, args=(worker,), daemon=True, name=f'ocr-worker-{worker.worker_id}').start()
+
+    def _start_worker(self, worker):
+        try:
+            worker.start(self.startup_timeout)
+        except Exception as e:
+            worker.kill()
+            if self._closed:
+                worker.state = STOPPED
+                return
+            worker.state = FAILED
+            worker.error = f'{type(e).__name__}: {e}'
+            self._schedule_retry(worker)
+            return
+        worker.failures = 0
+        print(f"✅ OCR worker {worker.worker_id} ready (pid {worker.process.pid}, load {worker.model_load_seconds:.2f}s, warm-up {worker.warmup_seconds:.2f}s)")
+        if self.on_ready:
+            self.on_ready(worker)
+        if self._closed:
+            worker.stop()
+            return
+        self._idle.put(worker)
+
+    def _schedule_retry(self, worker):
+        """啟動失敗後依指數退避重試；等待期間維持 FAILED，不計入可用 worker"""
+        worker.failures += 1
+        delay = min(self.retry_backoff * 2 ** (worker.failures - 1), self.retry_backoff_max)
+        worker.retry_at = time.time() + delay
+        print(f"❌ OCR worker {worker.worker_id} failed to start: {worker.error} (retry {worker.failures} in {delay:g}s)")
+
+        def retry():
+            if self._stop.wait(delay) or self._closed:
+                return
+            worker.retry_at = None
+            self._restart(worker, f'retry after startup failure: {worker.error}')
+
+        threading.Thread(target=retry, daemon=True, name=f'ocr-worker-{worker.worker_id}-retry').start()
+
+    def _restart(self, worker, reason):
+        print(f"🔄 Restarting OCR worker {worker.worker_id}: {reason}")
+        worker.last_restart_reason = reason
+        worker.kill()
+        worker.state = STARTING
+        if not self._closed:
+            self._start_in_background(worker)
+
+    def _checkout(self, wait_timeout):
+        deadline = time.monotonic() + wait_timeout
+        while True:
+            try:
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
+                pass
+            if not any(self._usable(worker) for worker in self._workers):
+                errors = '; '.join(w.error or w.last_restart_reason for w in self._workers if w.error or w.last_restart_reason)
+                raise RuntimeError(f'No OCR worker available: {errors or "pool not started"}')
+            if time.monotonic() > deadline:
+                raise TimeoutError('Timed out waiting for an OCR worker to become ready')
+
+    def run(self, job, timeout, wait_timeout=None):
+        """把工作交給一個空閒 worker 並等待結果；逾時或崩潰時重啟該 worker 後拋出例外"""
+        worker = self._checkout(self.startup_timeout if wait_timeout is None else wait_timeout)
+        try:
+            result = worker.run(job, timeout)
+        except TimeoutError:
+            self._restart(worker, 'job timed out')
+            raise
+        except WorkerCrashed as e:
+            self._restart(worker, str(e))
+            raise
+
+        if self.max_jobs and worker.jobs >= self.max_jobs:
+            # 定期回收 worker，避免長時間執行的記憶體累積
+            self._restart(worker, f'recycled after {worker.jobs} jobs')
+        else:
+            self._idle.put(worker)
+        return result
+
+    # ---------------------------------------------------------------- canary
+
+    def _canary_loop(self):
+        while not self._stop.wait(min(self.canary_interval, 5.0)):
+            # 依序取出目前空閒的 worker；未到期的放回佇列尾端，不阻塞真實請求
+            for _ in range(self.size):
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                due = worker.canary_at is None or time.time() - worker.canary_at >= self.canary_interval
+                if not due or self._closed:
+                    self._idle.put(worker)
+                    continue
+                if self._run_canary(worker):
+                    self._idle.put(worker)
+
+    def _run_canary(self, worker):
+        """執行一次 canary；worker 仍可用時返回 True，已安排重啟時返回 False"""
+        try:
+            result = worker.request({'op': 'canary'}, self.canary_timeout)
+        except (TimeoutError, WorkerCrashed) as e:
+            result = {'error': f'{type(e).__name__}: {e}'}
+        worker.canary_at = time.time()
+
+        if 'success' not in result:
+            worker.canary_seconds = None
+            worker.error = f"canary failed: {result.get('error')}"
+            self._notify_canary(worker, None, False)
+            self._restart(worker, worker.error)
+            return False
+
+        seconds = result['canary']
+        worker.canary_seconds = seconds
+        baseline = self.canary_baseline
+        regressed = (
+            baseline is not None
+            and seconds > baseline * self.canary_regression
+            and seconds - baseline > self.canary_min_regression
+        )
+        self._notify_canary(worker, seconds, not regressed)
+        if not regressed:
+            worker.canary_regressions = 0
+            self.canary_baseline = seconds if baseline is None else 0.8 * baseline + 0.2 * seconds
+            return True
+
+        worker.canary_regressions += 1
+        print(f"⚠️ OCR worker {worker.worker_id} canary regressed: {seconds:.2f}s (baseline {baseline:.2f}s)")
+        if worker.canary_regressions >= self.canary_max_regressions:
+            worker.error = f'canary regressed: {seconds:.2f}s vs baseline {baseline:.2f}s'
+            self._restart(worker, worker.error)
+            return False
+        return True
+
+    def _notify_canary(self, worker, seconds, healthy):
+        if self.on_canary:
+            self.on_canary(worker, seconds, healthy)
+
+    # ---------------------------------------------------------------- 狀態
+
+    @staticmethod
+    def _usable(worker):
+        """已就緒，或首次啟動 / 正常重啟中；啟動失敗後的重試不算，請求不必等待"""
+        if worker.state == READY:
+            return True
+        return worker.state in (STARTING, LOADING, WARMING) and not worker.failures
+
+    def is_ready(self):
+        return any(worker.state == READY for worker in self._workers)
+
+    def health(self):
+        """ready：至少一個 worker 可處理工作；starting：仍在啟動 / 載入 / 暖機；unavailable：全部失敗（重試中）或已停止"""
+        if any(worker.state == READY for worker in self._workers):
+            return 'ready'
+        if any(self._usable(worker) for worker in self._workers):
+            return 'starting'
+        return 'unavailable'
+
+    def snapshot(self):
+        workers = [worker.snapshot() for worker in self._workers]
+        return {
+            'size': self.size,
+            'ready': sum(1 for w in workers if w['state'] == READY),
+            'health': self.health(),
+            'canary_baseline_seconds': round(self.canary_baseline, 3) if self.canary_baseline is not None else None,
+            'workers': workers
+        }
+
+    def shutdown(self):
+        self._closed = True
+        self._stop.set()
+        for worker in self._workers:
+            worker.stop()
+            worker.state = STOPPED
@@ -0,0 +1,29 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# This file is part of MLX DeepSeek-OCR.
+# Copyright (C) 2025 MLX DeepSeek-OCR contributors
+# Licensed under the GNU Affero General Public License v3.0 (AGPL-3.0).
+# See the LICENSE file in the project root for full license text:
+# https://www.gnu.org/licenses/agpl-3.0.en.html
+
+"""WSGI 進入點（正式部署）：gunicorn -c gunicorn.conf.py
+
+gunicorn.conf.py 會先啟動共用的 inference_server.py 並設定 OCR_INFERENCE_ADDRESS，
+每個 HTTP worker 只連線到它；未設定時（例如直接 gunicorn wsgi:app）每個 HTTP worker
+會各自啟動 worker pool，模型記憶體隨 HTTP worker 數量倍增。
+任務儲存與上傳檔案屬於網頁端：每個 HTTP worker 都啟動 janitor，以檔案鎖確保只有一個實際清理。
+設定 OCR_METRICS_DIR 時各 HTTP worker 的指標寫入該目錄，/metrics 返回全部 worker 的合計。
+"""
+
+from app import app, INFERENCE_ADDRESS, metrics_collector, preload_model_main_process, start_task_janitor
+
+if not preload_model_main_process():
+    raise RuntimeError('Failed to start the inference backend')
+
+if not INFERENCE_ADDRESS:
+    print("⚠️ OCR_INFERENCE_ADDRESS not set: this HTTP worker loads its own copy of the model")
+
+start_task_janitor()
+if metrics_collector:
+    metrics_collector.start()
+
+application = app